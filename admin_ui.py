@@ -0,0 +1,22 @@
+"""Streamlit widgets shared by the admin panels of both apps."""
+import streamlit as st
+
+
+def keyset_cursors(name, filters, start):
+    """Cursor stack of the paged view ``name``; back to ``[start]`` whenever ``filters`` change.
+
+    The last cursor is the one the current page starts after.
+    """
+    key = f"cursor_{name}"
+    if st.session_state.get(f"{key}_filter") != filters:
+        st.session_state[key] = [start]
+        st.session_state[f"{key}_filter"] = filters
+    return st.session_state[key]
+
+
+def keyset_nav(name, cursors, next_cursor):
+    """Previous/next buttons; ``next_cursor`` is None on the last page."""
+    col1, col2 = st.columns(2)
+    col1.button("⬅️ Sebelumnya", key=f"prev_{name}", disabled=len(cursors) == 1, on_click=cursors.pop)
+    col2.button("Berikutnya ➡️", key=f"next_{name}", disabled=next_cursor is None,
+                on_click=cursors.append, args=(next_cursor,))
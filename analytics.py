@@ -0,0 +1,299 @@
+"""Answer events and their incremental aggregates.
+
+Every answered or missed question becomes one compact JSON line in
+``CHATBOT_EVENTS_FILE`` (default ``chat_events.jsonl``); ``CHATBOT_ANALYTICS=0``
+turns this off::
+
+    {"t": 1760000000.1, "q": "cuti tahunan pns", "score": 0.41, "faq_id": 12, "ok": true, "ms": 3.2}
+
+``faq_id`` is the ``faq`` table id, or ``faq_index.faq_key`` of the question
+for the CSV FAQ.
+
+:func:`emit` only puts the event on a queue; a background thread appends
+queued events in batches (under a file lock, so the app and faq_service can
+share the file) and drops events when the queue is full instead of slowing
+down answers.
+
+:class:`Aggregator` folds new lines into running totals -- top unanswered
+queries, hits per FAQ, a histogram of best scores and latency -- and keeps
+them with the byte offset it has read up to in ``<events>.checkpoint.json``,
+so each refresh only reads what was appended since.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+import tracing
+
+try:
+    import fcntl
+except ImportError:  # Windows: hanya satu proses penulis
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("CHATBOT_ANALYTICS", "1").lower() not in ("0", "false", "no", "off")
+EVENTS_FILE = os.environ.get("CHATBOT_EVENTS_FILE", "chat_events.jsonl")
+# Event yang belum tertulis; bila penuh event baru dibuang, jawaban tidak pernah menunggu
+MAX_PENDING = 10000
+# Lebar bucket histogram skor (0.05 -> 20 bucket antara 0 dan 1)
+SCORE_BIN = 0.05
+N_SCORE_BINS = int(round(1 / SCORE_BIN))
+# Jumlah pertanyaan tak terjawab berbeda yang disimpan; yang paling jarang dipangkas
+MAX_TRACKED_QUERIES = 5000
+
+_sinks = {}
+_aggregators = {}
+_lock = threading.Lock()
+
+
+class EventSink:
+    """Queue plus one writer thread appending JSON lines to ``path``."""
+
+    def __init__(self, path, max_pending=MAX_PENDING):
+        self.path = path
+        self.dropped = 0
+        self._queue = queue.Queue(max_pending)
+        self._submitted = 0
+        self._written = 0
+        self._done = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            tracing.incr("analytics.dropped")
+            return
+        with self._done:
+            self._submitted += 1
+
+    def _run(self):
+        while True:
+            events = [self._queue.get()]
+            while True:
+                try:
+                    events.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(events)
+            except Exception:
+                logger.exception(f"Gagal menulis event ke {self.path}")
+            with self._done:
+                self._written += len(events)
+                self._done.notify_all()
+
+    def _write(self, events):
+        data = "".join(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+                       for event in events).encode("utf-8")
+        with open(self.path, "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(data)
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        tracing.incr("analytics.written", len(events))
+
+    def flush(self, timeout=1.0):
+        """Wait (at most ``timeout`` seconds) until everything emitted so far is written."""
+        with self._done:
+            target = self._submitted
+            return self._done.wait_for(lambda: self._written >= target, timeout)
+
+
+def open_sink(path=EVENTS_FILE):
+    with _lock:
+        sink = _sinks.get(path)
+        if sink is None:
+            sink = _sinks[path] = EventSink(path)
+        return sink
+
+
+def emit(query, score, faq_id, answered, latency_ms, path=EVENTS_FILE, **extra):
+    """Record one answer attempt; returns immediately."""
+    if not ENABLED:
+        return
+    event = {"t": round(time.time(), 3), "q": query, "score": round(float(score), 4),
+             "faq_id": faq_id, "ok": bool(answered), "ms": round(latency_ms, 3)}
+    event.update(extra)
+    open_sink(path).emit(event)
+
+
+@atexit.register
+def _flush_at_exit():
+    for sink in list(_sinks.values()):
+        sink.flush(timeout=2.0)
+
+
+def _score_bin(score):
+    # Epsilon agar 0.3 / 0.05 masuk bucket 6, bukan 5.999 -> 5
+    return min(max(int(score / SCORE_BIN + 1e-9), 0), N_SCORE_BINS - 1)
+
+
+class Aggregator:
+    """Running totals over an events file, advanced by :meth:`update` from a checkpointed offset."""
+
+    def __init__(self, path=EVENTS_FILE, checkpoint_path=None, max_tracked=MAX_TRACKED_QUERIES):
+        self.path = path
+        self.checkpoint_path = checkpoint_path or f"{path}.checkpoint.json"
+        self.max_tracked = max_tracked
+        self._lock = threading.Lock()
+        self.reset()
+        self._load_checkpoint()
+
+    def reset(self):
+        self.offset = 0
+        self.inode = None
+        self.total = 0
+        self.answered = 0
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+        self.unanswered = Counter()
+        self.faq_hits = Counter()
+        self.score_bins = [0] * N_SCORE_BINS
+
+    def _state(self):
+        return {
+            "offset": self.offset, "inode": self.inode, "total": self.total, "answered": self.answered,
+            "latency_ms_total": self.latency_ms_total, "latency_ms_max": self.latency_ms_max,
+            "unanswered": dict(self.unanswered), "faq_hits": dict(self.faq_hits),
+            "score_bins": self.score_bins,
+        }
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Checkpoint analitik {self.checkpoint_path} diabaikan: {e}")
+            return
+        if len(state.get("score_bins", ())) != N_SCORE_BINS:
+            return
+        self.offset = state["offset"]
+        self.inode = state["inode"]
+        self.total = state["total"]
+        self.answered = state["answered"]
+        self.latency_ms_total = state["latency_ms_total"]
+        self.latency_ms_max = state["latency_ms_max"]
+        self.unanswered = Counter(state["unanswered"])
+        self.faq_hits = Counter(state["faq_hits"])
+        self.score_bins = state["score_bins"]
+
+    def _save_checkpoint(self):
+        tmp_path = f"{self.checkpoint_path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state(), f, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _add(self, event):
+        self.total += 1
+        latency = float(event.get("ms") or 0.0)
+        self.latency_ms_total += latency
+        self.latency_ms_max = max(self.latency_ms_max, latency)
+        score = float(event.get("score") or 0.0)
+        self.score_bins[_score_bin(score)] += 1
+        if event.get("ok"):
+            self.answered += 1
+            self.faq_hits[str(event.get("faq_id"))] += 1
+        elif event.get("q"):
+            self.unanswered[event["q"]] += 1
+
+    def _prune(self):
+        # Hanya pertanyaan tak terjawab yang paling sering yang disimpan agar checkpoint tetap kecil
+        if len(self.unanswered) > 2 * self.max_tracked:
+            self.unanswered = Counter(dict(self.unanswered.most_common(self.max_tracked)))
+
+    @tracing.traced("analytics.update")
+    def update(self):
+        """Read lines appended since the last call; returns how many events were added."""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return 0
+            # File diganti atau dipotong: hitung ulang dari awal
+            if stat.st_ino != self.inode or stat.st_size < self.offset:
+                self.reset()
+                self.inode = stat.st_ino
+            if stat.st_size == self.offset:
+                return 0
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read(stat.st_size - self.offset)
+            # Baris terakhir yang belum lengkap dibaca pada update berikutnya
+            end = data.rfind(b"\n") + 1
+            added = 0
+            for line in data[:end].splitlines():
+                try:
+                    self._add(json.loads(line))
+                    added += 1
+                except ValueError:
+                    logger.warning("Baris event analitik rusak dilewati")
+            self.offset += end
+            self._prune()
+            try:
+                self._save_checkpoint()
+            except OSError as e:
+                logger.warning(f"Gagal menyimpan checkpoint analitik: {e}")
+            return added
+
+    def summary(self):
+        with self._lock:
+            return {
+                "total": self.total,
+                "answered": self.answered,
+                "answer_rate": self.answered / self.total if self.total else 0.0,
+                "avg_latency_ms": self.latency_ms_total / self.total if self.total else 0.0,
+                "max_latency_ms": self.latency_ms_max,
+            }
+
+    def top_unanswered(self, n=20):
+        with self._lock:
+            return self.unanswered.most_common(n)
+
+    def top_faqs(self, n=20):
+        with self._lock:
+            return self.faq_hits.most_common(n)
+
+    def score_histogram(self):
+        """``[(lower bound, count), ...]`` of best scores, answered or not."""
+        with self._lock:
+            return [(round(i * SCORE_BIN, 2), count) for i, count in enumerate(self.score_bins)]
+
+    def answer_rate_at(self, threshold):
+        """Share of events whose best score reaches ``threshold`` (rounded down to a bin)."""
+        with self._lock:
+            if not self.total:
+                return 0.0
+            return sum(self.score_bins[_score_bin(threshold):]) / self.total
+
+
+def open_aggregator(path=EVENTS_FILE):
+    with _lock:
+        aggregator = _aggregators.get(path)
+        if aggregator is None:
+            aggregator = _aggregators[path] = Aggregator(path)
+        return aggregator
+
+
+def refresh(path=EVENTS_FILE):
+    """Flush this process's pending events and fold new lines into the aggregate."""
+    sink = _sinks.get(path)
+    if sink is not None:
+        sink.flush()
+    aggregator = open_aggregator(path)
+    aggregator.update()
+    return aggregator
@@ -0,0 +1,123 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import semantic_rerank
+import tracing
+
+# Ukuran maksimum cache dan umur entri (detik)
+CACHE_SIZE = int(os.environ.get("FAQ_ANSWER_CACHE_SIZE", 2048))
+CACHE_TTL = float(os.environ.get("FAQ_ANSWER_CACHE_TTL", 600))
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_query(text):
+    # "Cuti  PNS?" dan "cuti pns" dianggap pertanyaan yang sama
+    text = unicodedata.normalize("NFKC", str(text)).casefold()
+    return " ".join(_PUNCTUATION.sub(" ", text).split())
+
+
+class AnswerCache:
+    """Bounded LRU + TTL cache of ``(answer, score, faq_id, semantic)`` per normalized query.
+
+    Entries belong to one index version; when a lookup arrives with a
+    different version the whole cache is dropped.
+    """
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+# Cache bersama untuk semua sesi Streamlit dalam satu proses
+answer_cache = AnswerCache()
+
+
+def _lookup(index, query, tag, classify, threshold):
+    # (jawaban, skor TF-IDF, faq_id, skor embedding atau None) dan apakah hasilnya boleh di-cache
+    reranker = semantic_rerank.reranker(index)
+    if reranker is None:
+        return index.lookup(query, tag, classify, threshold) + (None,), True
+    reranked, final = reranker.rerank(index, query, tag, classify)
+    if reranked is not None:
+        return reranked, final
+    return index.lookup(query, tag, classify, threshold) + (None,), final
+
+
+def cached_answer(index, user_input, threshold=None, cache=answer_cache, tag=None, classify=False):
+    """Return ``(answer, score, faq_id)``; ``answer`` is None under ``threshold`` (default ``index.threshold``).
+
+    The index is searched at ``threshold``; for a miss ``score`` is the best
+    candidate (for analytics), or 0.0 when nothing shares a term with it.
+    With semantic re-ranking enabled, an answer picked by the embedding stage
+    is always returned; ``score`` stays its TF-IDF score.
+    """
+    threshold = index.threshold if threshold is None else threshold
+    query = normalize_query(user_input)
+    key = (query, tag, classify, threshold)
+    version = index.cache_version
+    result = cache.get(key, version)
+    if result is None:
+        tracing.incr("answer_cache.miss")
+        result, final = _lookup(index, query, tag, classify, threshold)
+        # Jawaban leksikal karena budget habis tidak di-cache, agar tahap embedding dicoba lagi
+        if final:
+            cache.put(key, version, result)
+    else:
+        tracing.incr("answer_cache.hit")
+    answer, score, faq_id, rerank_score = result
+    return (answer if rerank_score is not None or score >= threshold else None), score, faq_id
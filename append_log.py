@@ -0,0 +1,374 @@
+import atexit
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+import tracing
+
+try:
+    import fcntl
+except ImportError:  # Windows: hanya dikunci antar-thread dalam satu proses
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Jumlah baris di buffer sebelum ditulis, dan batas waktu tunggu (detik)
+FLUSH_ROWS = 64
+FLUSH_INTERVAL = 1.0
+# Indeks offset jarang: posisi byte satu baris dari setiap INDEX_STRIDE baris
+INDEX_STRIDE = 256
+
+_LOGS = {}
+_LOGS_LOCK = threading.Lock()
+
+
+class AppendLog:
+    """Append-only CSV log shared by several threads and processes.
+
+    Rows are buffered and written in batches: each batch takes an exclusive
+    lock on ``<path>.lock``, appends, and is fsynced once. When
+    ``segment_bytes`` is set, a full ``<name>.csv`` is renamed to
+    ``<name>.00001.csv`` and so on; the row count of every sealed segment is
+    kept in ``<name>.segments.json`` so readers can jump straight to an
+    offset.
+
+    The active segment's row count and the byte offset of every
+    ``INDEX_STRIDE``-th row are kept in ``<name>.index.json``, updated by
+    each flush and moved into the manifest on rotation, so :meth:`count`
+    and :meth:`read_page` never parse the rows before the page they need.
+    """
+
+    def __init__(self, path, columns, segment_bytes=None,
+                 flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.columns = list(columns)
+        self.segment_bytes = segment_bytes
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        root, ext = os.path.splitext(path)
+        self._segment_pattern = f"{root}.{{:05d}}{ext or '.csv'}"
+        self._manifest_path = f"{root}.segments.json"
+        self._index_path = f"{root}.index.json"
+        # Indeks segmen aktif terakhir yang diketahui proses ini
+        self._index = None
+        self._lock_path = f"{path}.lock"
+        self._buffer = []
+        self._lock = threading.RLock()
+        self._flush_timer = None
+        # Untuk contains(): nilai yang sudah terlihat dan posisi baca terakhir di file aktif
+        self._seen = {}
+
+    # -- menulis -------------------------------------------------------------
+
+    @contextmanager
+    def _file_lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, row):
+        with self._lock:
+            self._buffer.append([row.get(col, "") for col in self.columns])
+            if len(self._buffer) >= self.flush_rows:
+                self.flush()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self._flush_in_background)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._buffer:
+                return
+            rows, self._buffer = self._buffer, []
+            try:
+                with tracing.span("append_log.flush"), self._file_lock():
+                    self._write(rows)
+                tracing.incr("append_log.rows", len(rows))
+            except OSError as e:
+                # Kembalikan ke buffer agar tidak hilang; dicoba lagi pada flush berikutnya
+                self._buffer = rows + self._buffer
+                logger.error(f"Gagal menulis log {self.path}: {e}")
+                raise
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except OSError:
+            pass  # sudah dicatat di flush(), baris tetap di buffer
+
+    def _write(self, rows):
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        with open(self.path, "ab+") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                writer.writerow(self.columns)
+            else:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    out.write("\n")
+            writer.writerows(rows)
+            f.seek(0, os.SEEK_END)
+            f.write(out.getvalue().encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        # Hanya byte yang baru ditulis yang dipindai untuk memperbarui indeks
+        self._save_index(self._active_index())
+        if self.segment_bytes and size >= self.segment_bytes:
+            self._rotate()
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _rotate(self):
+        # Dipanggil dengan file lock dipegang
+        segments = self._read_manifest()
+        index = self._active_index()
+        rows = index["rows"]
+        segment_path = self._segment_pattern.format(len(segments) + 1)
+        os.replace(self.path, segment_path)
+        segments.append({"file": os.path.basename(segment_path), "rows": rows,
+                         "data_start": index["data_start"], "offsets": index["offsets"]})
+        tmp_path = f"{self._manifest_path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(segments, f)
+        os.replace(tmp_path, self._manifest_path)
+        self._index = None
+        try:
+            os.remove(self._index_path)
+        except FileNotFoundError:
+            pass
+        self._seen.clear()
+        logger.info(f"Log {self.path} dirotasi ke {segment_path} ({rows} baris).")
+
+    # -- indeks offset -------------------------------------------------------
+
+    @staticmethod
+    def _scan(f, index):
+        """Extend ``index`` with the complete rows between ``index["size"]`` and the end of ``f``.
+
+        A newline only ends a row when the row has an even number of quote
+        characters so far, so quoted fields spanning lines are handled; an
+        unfinished last row (a writer in another process) is left for later.
+        """
+        f.seek(index["size"])
+        if index["data_start"] is None:
+            header = f.readline()
+            if not header.endswith(b"\n"):
+                return index
+            index["data_start"] = index["size"] = len(header)
+        position = record_start = index["size"]
+        quotes = 0
+        for line in f:
+            position += len(line)
+            quotes += line.count(b'"')
+            if not line.endswith(b"\n"):
+                break
+            if quotes % 2 == 0:
+                if index["rows"] % INDEX_STRIDE == 0:
+                    index["offsets"].append(record_start)
+                index["rows"] += 1
+                index["size"] = record_start = position
+                quotes = 0
+        return index
+
+    def _active_index(self):
+        """Row count and sparse offsets of the active segment, brought up to date with the file."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return {"inode": None, "size": 0, "rows": 0, "data_start": None, "offsets": []}
+        with f:
+            stat = os.fstat(f.fileno())
+            index = self._index
+            if index is None or index["inode"] != stat.st_ino or index["size"] > stat.st_size:
+                # Indeks proses lain (file lock ikut menjaga file indeks), atau baca ulang dari awal
+                try:
+                    with open(self._index_path, encoding="utf-8") as index_file:
+                        index = json.load(index_file)
+                except (OSError, ValueError):
+                    index = None
+                if index is None or index["inode"] != stat.st_ino or index["size"] > stat.st_size:
+                    index = {"inode": stat.st_ino, "size": 0, "rows": 0, "data_start": None, "offsets": []}
+            if index["size"] < stat.st_size:
+                index = self._scan(f, dict(index, offsets=list(index["offsets"])))
+            self._index = index
+            return index
+
+    def _save_index(self, index):
+        # Dipanggil dengan file lock dipegang
+        tmp_path = f"{self._index_path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def rewrite(self, rows):
+        """Replace the active segment with ``rows`` (for the rare non-append edit)."""
+        with self._lock:
+            self.flush()
+            with self._file_lock():
+                tmp_path = f"{self.path}.tmp{os.getpid()}"
+                with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+                    writer = csv.writer(f, lineterminator="\n")
+                    writer.writerow(self.columns)
+                    writer.writerows([row.get(col, "") for col in self.columns] for row in rows)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self._seen.clear()
+                self._index = None
+                self._save_index(self._active_index())
+
+    # -- membaca -------------------------------------------------------------
+
+    def _segments(self):
+        # (path, jumlah baris, indeks); segmen aktif terakhir, jumlah barisnya None
+        directory = os.path.dirname(self.path)
+        segments = [(os.path.join(directory, s["file"]), s["rows"], s) for s in self._read_manifest()]
+        return segments + [(self.path, None, None)]
+
+    def _read_segment(self, path, start, index):
+        """Rows of one segment from row ``start``, seeking to the nearest indexed offset."""
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            if index is None or not index.get("offsets") or (
+                    index.get("inode") is not None and os.fstat(f.fileno()).st_ino != index["inode"]):
+                # Manifest lama tanpa offset, atau file sudah dirotasi: baca berurutan
+                reader = csv.DictReader(io.TextIOWrapper(f, encoding="utf-8", newline=""))
+                yield from itertools.islice(reader, start, None)
+                return
+            header = next(csv.reader([f.readline().decode("utf-8")]), self.columns)
+            block = min(start // INDEX_STRIDE, len(index["offsets"]) - 1)
+            f.seek(index["offsets"][block])
+            reader = csv.DictReader(io.TextIOWrapper(f, encoding="utf-8", newline=""), fieldnames=header)
+            yield from itertools.islice(reader, start - block * INDEX_STRIDE, None)
+
+    def iter_rows(self, start=0):
+        """Stream rows as dicts starting at row ``start`` (0 = oldest)."""
+        self.flush()
+        for path, rows, index in self._segments():
+            if rows is None:
+                # Segmen aktif selalu dibaca sampai akhir: proses lain mungkin baru saja menambah baris
+                yield from self._read_segment(path, start, self._active_index())
+                return
+            if start >= rows:
+                start -= rows
+                continue
+            yield from self._read_segment(path, start, index)
+            start = 0
+
+    def read_since(self, cursor=None):
+        """Rows appended since ``cursor``, and the cursor to pass next time.
+
+        The cursor is the active segment's inode and the byte offset read up
+        to, so only new bytes are parsed. Returns ``(rows, cursor, restarted)``;
+        with no cursor, or when the active segment was replaced (rotation,
+        :meth:`rewrite`), every row from the oldest segment on is returned and
+        ``restarted`` is True.
+        """
+        self.flush()
+        # Dibaca di bawah file lock agar tidak ada baris yang setengah tertulis
+        with self._file_lock():
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                f = None
+            inode = os.fstat(f.fileno()).st_ino if f is not None else None
+            size = os.fstat(f.fileno()).st_size if f is not None else 0
+            restarted = cursor is None or cursor[0] != inode or cursor[1] > size
+            rows = []
+            if restarted:
+                for path, _, index in self._segments()[:-1]:
+                    rows.extend(self._read_segment(path, 0, index))
+            if f is None:
+                return rows, (None, 0), restarted
+            with f:
+                header_line = f.readline()
+                offset = len(header_line) if restarted else max(cursor[1], len(header_line))
+                f.seek(offset)
+                data = f.read()
+        header = next(csv.reader([header_line.decode("utf-8")]), self.columns)
+        reader = csv.DictReader(io.StringIO(data.decode("utf-8"), newline=""), fieldnames=header)
+        rows.extend(reader)
+        return rows, (inode, offset + len(data)), restarted
+
+    def read_page(self, offset, limit):
+        return list(itertools.islice(self.iter_rows(offset), limit))
+
+    def count(self):
+        # Segmen tersegel dari manifest, segmen aktif dari indeks offset
+        self.flush()
+        return sum(rows for _, rows, _ in self._segments()[:-1]) + self._active_index()["rows"]
+
+    def contains(self, column, value):
+        """Check whether any row has ``value`` in ``column`` without rereading the log."""
+        with self._lock:
+            self.flush()
+            seen = self._seen.get(column)
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return False
+            if seen is None or seen["inode"] != stat.st_ino or stat.st_size < seen["offset"]:
+                # Pertama kali, atau file diganti/dirotasi: baca ulang dari awal
+                seen = {"inode": stat.st_ino, "offset": 0, "values": set(), "header": None}
+                self._seen[column] = seen
+            if stat.st_size > seen["offset"]:
+                # Dibaca di bawah file lock agar tidak ada baris yang setengah tertulis
+                with self._file_lock(), open(self.path, "rb") as f:
+                    f.seek(seen["offset"])
+                    data = f.read()
+                end = len(data)
+                lines = io.StringIO(data.decode("utf-8"), newline="")
+                reader = csv.reader(lines)
+                if seen["header"] is None:
+                    seen["header"] = next(reader, None) or self.columns
+                position = seen["header"].index(column) if column in seen["header"] else None
+                for record in reader:
+                    if position is not None and position < len(record):
+                        seen["values"].add(record[position])
+                seen["offset"] += end
+            return str(value) in seen["values"]
+
+
+def open_log(path, columns, **kwargs):
+    """Return the process-wide AppendLog for ``path`` (created on first use)."""
+    with _LOGS_LOCK:
+        log = _LOGS.get(path)
+        if log is None:
+            log = _LOGS[path] = AppendLog(path, columns, **kwargs)
+        return log
+
+
+@atexit.register
+def _flush_all():
+    for log in list(_LOGS.values()):
+        try:
+            log.flush()
+        except OSError:
+            pass
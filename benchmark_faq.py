@@ -0,0 +1,422 @@
+"""Latency/throughput benchmark for the FAQ matching pipeline (offline, no Streamlit).
+
+Contoh:
+    python benchmark_faq.py --sizes 1000 10000 100000 --queries 2000
+    python benchmark_faq.py --compare bench_results/lama.json bench_results/baru.json
+
+Setiap kombinasi (ukuran korpus, strategi) dijalankan di proses terpisah agar
+peak RSS yang dilaporkan milik kasus itu sendiri. Hasil ditulis sebagai JSON
+(default bench_results/<commit>.json) untuk dibandingkan antar commit.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+STRATEGIES = ["refit", "dense", "inverted", "cached", "tag"]
+# Mode pencocokan yang dibandingkan pada query bersalah ketik
+MATCH_MODES = ["word", "char"]
+# Strategi lama (fit ulang per pertanyaan) dibatasi agar benchmark tetap selesai
+REFIT_MAX_QUERIES = 50
+
+_TOPICS = {
+    "Cuti PNS": ["cuti", "pns", "sakit", "tahunan", "besar", "melahirkan", "alasan", "penting", "hari"],
+    "Cuti PPPK": ["cuti", "pppk", "kontrak", "sakit", "tahunan", "melahirkan", "perjanjian", "kerja"],
+    "Aplikasi Ekinerja BKN": ["ekinerja", "bkn", "skp", "aplikasi", "login", "password", "target", "realisasi"],
+    "Aplikasi Ekinerja Sumut": ["ekinsu", "sumut", "android", "aktivitas", "harian", "atasan", "verifikasi"],
+    "Satyalancana Karya Satya SLKS": ["satyalancana", "karya", "satya", "slks", "tahun", "usul", "berkas"],
+    "Kepegawaian": ["gaji", "pensiun", "kenaikan", "pangkat", "golongan", "mutasi", "jabatan", "tunjangan"],
+}
+_STARTERS = ["bagaimana", "apa", "apakah", "kapan", "berapa", "dimana", "siapa", "mengapa"]
+_FILLERS = ["cara", "syarat", "ketentuan", "prosedur", "batas", "waktu", "lama", "dokumen", "untuk", "dan"]
+_AGENCIES = ["dinas", "badan", "kantor", "sekretariat", "biro", "bagian", "kabupaten", "kota", "provinsi"]
+
+
+# -- data sintetis ---------------------------------------------------------------
+
+def make_corpus(n_rows, seed=0):
+    """Synthetic Indonesian-style FAQ rows: tag, question, answer."""
+    rng = random.Random(seed)
+    tags = list(_TOPICS)
+    rows = []
+    for i in range(n_rows):
+        tag = rng.choice(tags)
+        words = [rng.choice(_STARTERS), rng.choice(_FILLERS)]
+        words += rng.sample(_TOPICS[tag], k=min(3, len(_TOPICS[tag])))
+        words += [rng.choice(_AGENCIES), f"{rng.choice(_AGENCIES)}{i % 997}", f"nomor{i}"]
+        rng.shuffle(words[1:])
+        rows.append({"tag": tag, "question": " ".join(words),
+                     "answer": f"jawaban untuk pertanyaan {i} tentang {tag.lower()}"})
+    return pd.DataFrame(rows)
+
+
+def _typo(word, rng):
+    i = rng.randrange(1, len(word) - 1)
+    op = rng.randrange(4)
+    if op == 0:
+        return word[:i] + word[i + 1:]  # huruf hilang: ekinerja -> ekinrja
+    if op == 1:
+        return word[:i] + word[i] + word[i:]  # huruf ganda: cuti -> cutii
+    if op == 2:
+        return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]  # huruf tertukar
+    return word[:i] + rng.choice("aiueo") + word[i + 1:]  # vokal salah
+
+
+def make_typo_queries(corpus, n_queries, rows=None, seed=2):
+    """``(query, source row)`` pairs: a few keywords of a FAQ question, one or two misspelled."""
+    rng = random.Random(seed)
+    rows = range(len(corpus)) if rows is None else rows
+    queries = []
+    for _ in range(n_queries):
+        row = rng.choice(rows)
+        # Pengguna biasanya hanya mengetik beberapa kata kunci, misalnya "cutii pns sakit"
+        words = [word for word in corpus["question"].iat[row].split()
+                 if len(word) >= 4 and word.lower() not in _STARTERS]
+        keep = sorted(rng.sample(range(len(words)), k=min(len(words), rng.randint(2, 3))))
+        words = [words[i] for i in keep]
+        for i in rng.sample(range(len(words)), k=min(len(words), rng.randint(1, 2))):
+            words[i] = _typo(words[i], rng)
+        queries.append((" ".join(words), row))
+    return queries
+
+
+def make_queries(corpus, n_queries, distinct=500, unknown_ratio=0.2, zipf_a=1.2, seed=1):
+    """Query workload with realistic repetition: a pool of distinct queries drawn Zipf-style."""
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    questions = corpus["question"].tolist()
+    pool = []
+    for _ in range(distinct):
+        if rng.random() < unknown_ratio:
+            pool.append(" ".join(rng.sample(_STARTERS + _FILLERS, 4)))
+            continue
+        words = rng.choice(questions).split()
+        # Pengguna mengetik sebagian kata, urutan acak, kadang huruf kapital
+        words = rng.sample(words, k=max(2, len(words) - rng.randint(1, 4)))
+        query = " ".join(words)
+        pool.append(query.upper() if rng.random() < 0.1 else query)
+    ranks = np.minimum(np_rng.zipf(zipf_a, n_queries), distinct) - 1
+    return [pool[r] for r in ranks]
+
+
+# -- pengukuran ------------------------------------------------------------------
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux melaporkan KB, macOS byte
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def _latency_stats(latencies):
+    latencies = np.asarray(latencies) * 1000
+    total = latencies.sum() / 1000
+    return {
+        "queries": int(len(latencies)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "mean_ms": float(latencies.mean()),
+        "qps": float(len(latencies) / total) if total else float("inf"),
+    }
+
+
+def _import_s(vectorizer_params, refit=False):
+    # sklearn diimpor lazily oleh faq_index (~1 detik, sekali per proses); dimuat di sini
+    # sebelum stopwatch dimulai agar tidak terhitung di build_s atau latensi query pertama
+    import faq_index
+
+    started = time.perf_counter()
+    faq_index._make_vectorizer(vectorizer_params)
+    if refit:
+        import sklearn.metrics.pairwise  # noqa: F401
+    return time.perf_counter() - started
+
+
+def _refit_answer(questions, user_input, vectorizer_params):
+    # Jalur lama: TfidfVectorizer di-fit ulang untuk setiap pertanyaan
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    tfidf_matrix = TfidfVectorizer(**vectorizer_params).fit_transform(questions + [user_input])
+    cosine_similarities = cosine_similarity(tfidf_matrix[-1], tfidf_matrix[:-1])
+    best_match_idx = cosine_similarities.argmax()
+    return best_match_idx, cosine_similarities[0, best_match_idx]
+
+
+def run_case(size, strategy, n_queries, vectorizer_params, seed):
+    import answer_cache
+    import faq_index
+
+    corpus = make_corpus(size, seed)
+    queries = make_queries(corpus, n_queries, seed=seed + 1)
+    result = {"size": size, "strategy": strategy}
+    result["import_s"] = _import_s(vectorizer_params, refit=strategy == "refit")
+
+    started = time.perf_counter()
+    if strategy == "refit":
+        questions = corpus["question"].tolist()
+        queries = queries[:REFIT_MAX_QUERIES]
+        answer = lambda q: _refit_answer(questions, q, vectorizer_params)  # noqa: E731
+    else:
+        index = faq_index.FaqIndex(corpus, **vectorizer_params)
+        index.strategy = "dense" if strategy == "dense" else "inverted"
+        if strategy == "cached":
+            cache = answer_cache.AnswerCache()
+            answer = lambda q: answer_cache.cached_answer(index, q, cache=cache)  # noqa: E731
+        elif strategy == "tag":
+            answer = lambda q: index.search(q, classify=True)  # noqa: E731
+        else:
+            answer = lambda q: index.search(q)  # noqa: E731
+    result["build_s"] = time.perf_counter() - started
+
+    latencies = []
+    answered = 0
+    for query in queries:
+        started = time.perf_counter()
+        found = answer(query)
+        latencies.append(time.perf_counter() - started)
+        if strategy == "refit":
+            answered += found[1] >= faq_index.SIMILARITY_THRESHOLD
+        elif strategy == "cached":
+            answered += found[0] is not None
+        else:
+            answered += bool(found)
+    result.update(_latency_stats(latencies))
+    result["answer_rate"] = answered / len(queries) if queries else 0.0
+    if strategy == "cached":
+        result["cache_hit_rate"] = cache.stats()["hit_rate"]
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def run_typo_case(size, mode, n_queries, seed, faq_file=None):
+    """Recall@1 and latency of one matching mode on misspelled queries.
+
+    Queries are taken from the real FAQ (``faq_file``) with typos added; the
+    synthetic rows filling the corpus up to ``size`` act as distractors.
+    """
+    import faq_index
+
+    vectorizer_params = faq_index.CHAR_MODE_PARAMS if mode == "char" else {"stop_words": "english"}
+    real = pd.read_csv(faq_file)[["tag", "question", "answer"]].dropna(subset=["question"]) \
+        if faq_file and os.path.exists(faq_file) else make_corpus(0)
+    corpus = pd.concat([real, make_corpus(max(size - len(real), 0), seed)], ignore_index=True)
+    queries = make_typo_queries(corpus, n_queries, rows=range(len(real)) if len(real) else None, seed=seed + 2)
+    # Pertanyaan di luar topik FAQ: seharusnya tidak dijawab
+    off_topic = [" ".join(random.Random(seed + i).sample(
+        ["resep", "nasi", "goreng", "cuaca", "besok", "harga", "tiket", "pesawat", "jadwal", "bola"], 4))
+        for i in range(200)]
+    result = {"size": size, "strategy": f"typo-{mode}"}
+    result["import_s"] = _import_s(vectorizer_params)
+
+    started = time.perf_counter()
+    index = faq_index.FaqIndex(corpus, **vectorizer_params)
+    result["build_s"] = time.perf_counter() - started
+    matrix = index._state.matrix
+    result["matrix_mb"] = (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 1024 / 1024
+
+    # Threshold yang dipakai aplikasi untuk mode ini (faq_index.THRESHOLDS)
+    result["threshold"] = threshold = index.threshold
+
+    latencies = []
+    hits = answered = answered_correct = 0
+    questions = index.columns["question"]
+    for query, row in queries:
+        started = time.perf_counter()
+        found = index.search(query, threshold=0.0)
+        latencies.append(time.perf_counter() - started)
+        if found:
+            correct = questions[found[0][0]] == questions[row]
+            hits += correct
+            if found[0][1] >= threshold:
+                answered += 1
+                answered_correct += correct
+    result.update(_latency_stats(latencies))
+    result["recall_at_1"] = hits / len(queries)
+    result["answer_rate"] = answered / len(queries)
+    # Dari yang dijawab (skor >= threshold), berapa yang menunjuk FAQ yang benar
+    result["answer_precision"] = answered_correct / answered if answered else 0.0
+    result["off_topic_answer_rate"] = sum(bool(index.search(q)) for q in off_topic) / len(off_topic)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def run_io_case(size, seed, log_events=200):
+    """Time load_faq (CSV vs snapshot) and save_log (rewrite vs append) at one size."""
+    import append_log
+    import faq_index
+
+    result = {"size": size, "strategy": "io"}
+    corpus = make_corpus(size, seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "faq_data.csv")
+        corpus.to_csv(data_file, index=False)
+
+        started = time.perf_counter()
+        pd.read_csv(data_file)
+        result["load_csv_s"] = time.perf_counter() - started
+
+        index = faq_index.FaqIndex(corpus)
+        snapshot = os.path.join(tmp, "faq_data.faqsnap")
+        started = time.perf_counter()
+        index.save(snapshot)
+        result["snapshot_write_s"] = time.perf_counter() - started
+        started = time.perf_counter()
+        faq_index.FaqIndex.load(snapshot, index.source_hash)
+        result["snapshot_load_s"] = time.perf_counter() - started
+
+        # Audit log yang sudah berisi `size` baris
+        log_rows = pd.DataFrame({"username": "admin", "action": "Login",
+                                 "details": [f"event {i}" for i in range(size)]})
+        legacy_file = os.path.join(tmp, "audit_legacy.csv")
+        log_rows.to_csv(legacy_file, index=False)
+        latencies = []
+        for i in range(log_events):
+            started = time.perf_counter()
+            log_df = pd.read_csv(legacy_file)
+            new_log = pd.DataFrame({"username": ["admin"], "action": ["Login"], "details": [f"baru {i}"]})
+            pd.concat([log_df, new_log], ignore_index=True).to_csv(legacy_file, index=False)
+            latencies.append(time.perf_counter() - started)
+        result["save_log_rewrite_p50_ms"] = float(np.percentile(np.asarray(latencies) * 1000, 50))
+
+        append_file = os.path.join(tmp, "audit_append.csv")
+        log_rows.to_csv(append_file, index=False)
+        log = append_log.AppendLog(append_file, ["username", "action", "details"])
+        latencies = []
+        for i in range(log_events):
+            started = time.perf_counter()
+            log.append({"username": "admin", "action": "Login", "details": f"baru {i}"})
+            latencies.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        log.flush()
+        result["save_log_append_p50_ms"] = float(np.percentile(np.asarray(latencies) * 1000, 50))
+        result["save_log_append_flush_ms"] = (time.perf_counter() - started) * 1000
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def _run_in_child(queue, func, args):
+    try:
+        queue.put(func(*args))
+    except Exception as e:  # dilaporkan ke proses utama
+        queue.put({"error": repr(e)})
+
+
+def run_isolated(func, *args):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_in_child, args=(queue, func, args))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+# -- laporan ---------------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_table(results):
+    for r in results:
+        if "error" in r:
+            print(f"{r.get('size', '?'):>7} {r.get('strategy', '?'):<9} ERROR {r['error']}")
+        elif r["strategy"] == "io":
+            print(f"{r['size']:>7} io        csv {r['load_csv_s'] * 1000:8.1f} ms | snapshot load "
+                  f"{r['snapshot_load_s'] * 1000:7.2f} ms | save_log rewrite {r['save_log_rewrite_p50_ms']:7.2f} ms"
+                  f" vs append {r['save_log_append_p50_ms']:.4f} ms")
+        elif r["strategy"].startswith("typo-"):
+            print(f"{r['size']:>7} {r['strategy']:<9} impor {r['import_s']:5.2f}s build {r['build_s']:7.2f}s | "
+                  f"p50 {r['p50_ms']:8.3f} p95 {r['p95_ms']:8.3f} ms | recall@1 {r['recall_at_1']:.1%} | "
+                  f"jawab @{r['threshold']:.2f} {r['answer_rate']:.0%} "
+                  f"(tepat {r['answer_precision']:.0%}) | "
+                  f"salah jawab (di luar topik) {r['off_topic_answer_rate']:.0%} | matriks {r['matrix_mb']:.1f} MB")
+        else:
+            print(f"{r['size']:>7} {r['strategy']:<9} impor {r['import_s']:5.2f}s build {r['build_s']:7.2f}s | "
+                  f"p50 {r['p50_ms']:8.3f} p95 {r['p95_ms']:8.3f} p99 {r['p99_ms']:8.3f} ms | {r['qps']:9.1f} qps | "
+                  f"rss {r['peak_rss_mb']:7.1f} MB | jawab {r['answer_rate']:.0%}")
+
+
+def compare(old_path, new_path, metrics=("p50_ms", "p95_ms", "p99_ms", "qps", "build_s", "peak_rss_mb",
+                                     "load_csv_s", "snapshot_load_s", "save_log_append_p50_ms", "recall_at_1")):
+    with open(old_path) as f:
+        old = {(r["size"], r["strategy"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+    for r in new:
+        base = old.get((r["size"], r["strategy"]))
+        if not base or "error" in r or "error" in base:
+            continue
+        changes = []
+        for metric in metrics:
+            if metric in r and metric in base and base[metric]:
+                changes.append(f"{metric} {(r[metric] - base[metric]) / base[metric]:+.1%}")
+        print(f"{r['size']:>7} {r['strategy']:<9} " + " | ".join(changes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pipeline pencocokan FAQ.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--strategies", nargs="+", default=STRATEGIES, choices=STRATEGIES)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-io", action="store_true", help="lewati pengukuran load_faq/save_log")
+    parser.add_argument("--faq", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "faq_data.csv"),
+                        help="FAQ asli sebagai sumber query bersalah ketik")
+    parser.add_argument("--typo-modes", nargs="*", default=MATCH_MODES, choices=MATCH_MODES,
+                        help="mode yang diuji dengan query bersalah ketik (kosong = lewati)")
+    parser.add_argument("-o", "--output", help="file JSON hasil (default: bench_results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("LAMA", "BARU"), help="bandingkan dua file hasil")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    # Sama dengan chatbot_with_faq.py
+    vectorizer_params = {"stop_words": "english"}
+    results = []
+    for size in args.sizes:
+        for strategy in args.strategies:
+            results.append(run_isolated(run_case, size, strategy, args.queries, vectorizer_params, args.seed))
+            print_table(results[-1:])
+        for mode in args.typo_modes:
+            results.append(run_isolated(run_typo_case, size, mode, args.queries, args.seed, args.faq))
+            print_table(results[-1:])
+        if not args.no_io:
+            results.append(run_isolated(run_io_case, size, args.seed))
+            print_table(results[-1:])
+
+    commit = git_commit()
+    output = args.output or os.path.join("bench_results", f"{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "queries": args.queries,
+            "results": results,
+        }, f, indent=2)
+    print(f"Hasil ditulis ke {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Once-per-process startup for the Streamlit apps, and its timings.
+
+Streamlit re-executes the app script for every session and every rerun, so
+anything at its top level is repeated. The apps wrap one-time work (file
+and DDL initialization, starting :func:`warm_up`) in ``st.cache_resource``;
+this module only holds the pieces that do not need Streamlit:
+
+- :func:`warm_up` loads the FAQ index in a background thread, so the page
+  renders while sklearn (and with it pandas and scipy, which the app
+  modules only import inside the functions that need them) is imported
+  and the snapshot is mapped;
+- :func:`mark` records how long after :data:`STARTED` an event (first
+  render, index ready, first answer) happened for the first time.
+
+``python bootstrap.py chatbot_with_faq.py -q "cuti tahunan"`` runs an app
+in a fresh interpreter and prints its cold time-to-first-answer.
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Titik nol pengukuran: modul ini diimpor pertama kali oleh skrip aplikasi
+STARTED = time.perf_counter()
+
+_marks = {}
+_lock = threading.Lock()
+
+
+def mark(event):
+    """Record the first time ``event`` happens in this process (ms since :data:`STARTED`)."""
+    if event in _marks:
+        return
+    elapsed = time.perf_counter() - STARTED
+    with _lock:
+        if event in _marks:
+            return
+        _marks[event] = round(elapsed * 1000, 1)
+    tracing.record(f"startup.{event}", elapsed)
+    logger.info(f"Startup: {event} setelah {_marks[event]} ms")
+
+
+def report():
+    with _lock:
+        return dict(_marks)
+
+
+def warm_up(name, func):
+    """Run ``func`` in a daemon thread and return a Future with its result; marks ``<name>_ready``."""
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(func())
+            mark(f"{name}_ready")
+        except Exception as e:
+            logger.exception(f"Warm-up {name} gagal")
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"warm-up-{name}", daemon=True).start()
+    return future
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ukur waktu hingga jawaban pertama sebuah aplikasi Streamlit.")
+    parser.add_argument("app", help="skrip aplikasi, mis. chatbot_with_faq.py")
+    parser.add_argument("-q", "--question", required=True, help="pertanyaan pertama yang diajukan")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(args.app, default_timeout=args.timeout).run()
+    first_render = time.perf_counter() - started
+    app.text_input[0].input(args.question).run()
+    first_answer = time.perf_counter() - started
+    if app.exception:
+        print(app.exception, file=sys.stderr)
+        return 1
+    # Modul "bootstrap" milik aplikasi, bukan __main__ ini
+    import bootstrap
+    print(json.dumps({
+        "first_render_ms": round(first_render * 1000, 1),
+        "first_answer_ms": round(first_answer * 1000, 1),
+        "app_marks_ms": bootstrap.report(),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
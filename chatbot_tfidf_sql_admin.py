@@ -1,156 +1,210 @@
+# Diimpor paling awal: titik nol pengukuran waktu startup
+import bootstrap
 import streamlit as st
-import mysql.connector
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import bcrypt
 import logging
+import time
+import faq_index
+import answer_cache
+import tracing
+import near_duplicates
+import storage
+import analytics
+import admin_ui
 
 # Setup logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Fungsi untuk menghubungkan ke database
-def connect_to_database():
-    try:
-        conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",  # Ganti dengan password MySQL Anda
-            database="chatbot_db"
-        )
-        logger.info("Koneksi ke database berhasil!")
-        return conn
-    except mysql.connector.Error as err:
-        logger.error(f"Error connecting to database: {err}")
-        return None
+# Snapshot indeks TF-IDF tabel faq, key berupa hash isi tabel
+FAQ_INDEX_FILE = "faq_db.faqsnap"
+# Mode kata memakai TfidfVectorizer bawaan; FAQ_MATCH_MODE=char untuk n-gram karakter
+FAQ_INDEX_PARAMS = faq_index.CHAR_MODE_PARAMS if faq_index.MATCH_MODE == "char" else {}
+
+# Skema database
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS faq (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        question TEXT UNIQUE,
+        answer TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS pending (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        question TEXT UNIQUE,
+        answer TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS admin (
+        username VARCHAR(255) PRIMARY KEY,
+        password VARCHAR(255)
+    )
+    """,
+]
+
+# Backend dipilih lewat CHATBOT_STORAGE: "mysql" (default, lewat db_pool) atau "sqlite:<path>"
+STORE = storage.open_sql_store()
+FAQ_TABLE = STORE.table("faq", ["id", "question", "answer"])
+PENDING_TABLE = STORE.table("pending", ["id", "question", "answer"])
+ADMIN_TABLE = STORE.table("admin", ["username", "password"])
 
-# Inisialisasi database
+# Inisialisasi database (DDL hanya dijalankan sekali per proses)
 def init_db():
-    conn = connect_to_database()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS faq (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                question TEXT UNIQUE,
-                answer TEXT
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS pending (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                question TEXT UNIQUE,
-                answer TEXT
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS admin (
-                username VARCHAR(255) PRIMARY KEY,
-                password VARCHAR(255)
-            )
-        """)
-        conn.commit()
-        conn.close()
-        logger.info("Database initialized successfully!")
-
-# Load FAQ data
-def load_faq():
-    conn = connect_to_database()
-    if conn:
-        df = pd.read_sql("SELECT * FROM faq", conn)
-        conn.close()
-        return df
-    return pd.DataFrame()
-
-# Load pending questions
-def load_pending():
-    conn = connect_to_database()
-    if conn:
-        df = pd.read_sql("SELECT * FROM pending", conn)
-        conn.close()
-        return df
-    return pd.DataFrame()
+    try:
+        STORE.ensure_schema(SCHEMA)
+    except storage.StorageError as err:
+        logger.error(f"Inisialisasi database gagal: {err}")
+
+# Jumlah baris per halaman pada tampilan admin
+PAGE_SIZE = 50
+CLUSTER_PAGE_SIZE = 10
+
+# Satu halaman keyset (id > after_id) dari tabel faq/pending, dengan pencarian di sisi server.
+# Tabel faq tidak punya kolom tag, jadi filter tag hanya ada di aplikasi CSV.
+def _load_page(table, after_id, limit, search):
+    try:
+        return table.page(after_id, limit, search)
+    except storage.StorageError:
+        import pandas as pd
+        return pd.DataFrame(), None
+
+@tracing.traced("load_faq_page")
+def load_faq_page(after_id=0, limit=PAGE_SIZE, search=""):
+    return _load_page(FAQ_TABLE, after_id, limit, search)
+
+@tracing.traced("load_pending_page")
+def load_pending_page(after_id=0, limit=PAGE_SIZE, search=""):
+    return _load_page(PENDING_TABLE, after_id, limit, search)
+
+# Klaster pertanyaan pending (kunci klaster = id pending terkecil); hanya baris dengan id baru
+# yang dibaca setiap rerun. None bila database tidak bisa dibaca.
+@tracing.traced("pending_clusters")
+def pending_clusters():
+    feed = near_duplicates.open_clusters(PENDING_TABLE.key)
+    with feed.lock:
+        try:
+            last_id = feed.cursor or 0
+            if PENDING_TABLE.count(upto_id=last_id) != feed.seen:
+                # Ada baris yang dimoderasi sejak terakhir dibaca: hitung ulang dari awal
+                feed.reset()
+                last_id = 0
+            rows = PENDING_TABLE.rows_after(last_id, ["id", "question"])
+        except storage.StorageError:
+            return None
+        feed.extend(rows, rows[-1][0] if rows else last_id)
+        return feed
+
+def load_pending_answers(questions):
+    try:
+        return dict(PENDING_TABLE.select(["question", "answer"], "question", questions))
+    except storage.StorageError:
+        return {}
 
 # Add pending question
+@tracing.traced("add_pending")
 def add_pending(question, answer):
-    conn = connect_to_database()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("INSERT IGNORE INTO pending (question, answer) VALUES (%s, %s)", (question, answer))
-        conn.commit()
-        conn.close()
+    try:
+        PENDING_TABLE.insert({"question": question, "answer": answer}, ignore=True)
         logger.info("Pertanyaan berhasil ditambahkan ke pending.")
+    except storage.StorageError as err:
+        logger.error(f"Gagal menambahkan pertanyaan ke pending: {err}")
+
+# Setujui dan/atau tolak banyak pertanyaan pending dalam satu transaksi
+@tracing.traced("moderate_questions")
+def moderate_questions(approve=(), reject=()):
+    approve = list(approve)
+    questions = [question for question, _ in approve] + list(reject)
+    if not questions:
+        return
+    try:
+        with STORE.transaction() as tx:
+            tx.insert_many("faq", [{"question": q, "answer": a} for q, a in approve], ignore=True)
+            tx.delete("pending", "question", questions)
+        logger.info(f"Moderasi selesai: {len(approve)} disetujui, {len(questions) - len(approve)} ditolak.")
+    except storage.StorageError as err:
+        logger.error(f"Moderasi gagal, transaksi dibatalkan: {err}")
 
 # Approve question to FAQ
 def approve_question(question, answer):
-    conn = connect_to_database()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("INSERT IGNORE INTO faq (question, answer) VALUES (%s, %s)", (question, answer))
-        cursor.execute("DELETE FROM pending WHERE question = %s", (question,))
-        conn.commit()
-        conn.close()
-        logger.info("Pertanyaan berhasil disetujui dan dipindahkan ke FAQ.")
+    moderate_questions(approve=[(question, answer)])
 
 # Reject question from pending
 def reject_question(question):
-    conn = connect_to_database()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM pending WHERE question = %s", (question,))
-        conn.commit()
-        conn.close()
-        logger.info("Pertanyaan berhasil ditolak dan dihapus dari pending.")
+    moderate_questions(reject=[question])
 
 # Authenticate admin
+@tracing.traced("authenticate")
 def authenticate(username, password):
-    conn = connect_to_database()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT password FROM admin WHERE username = %s", (username,))
-        stored_password = cursor.fetchone()
-        conn.close()
-        if stored_password and bcrypt.checkpw(password.encode('utf-8'), stored_password[0].encode('utf-8')):
-            logger.info("Admin login successful!")
-            return True
+    try:
+        stored_password = ADMIN_TABLE.select(["password"], "username", [username])
+    except storage.StorageError:
+        stored_password = []
+    if stored_password and bcrypt.checkpw(password.encode('utf-8'), stored_password[0][0].encode('utf-8')):
+        logger.info("Admin login successful!")
+        return True
     logger.warning("Admin login failed!")
     return False
 
+# Tabel faq hanya dibaca ulang bila versinya berubah; indeks hanya di-fit ulang bila isinya berubah
+@tracing.traced("load_faq_index")
+def load_faq_index():
+    try:
+        return faq_index.get_store_index(FAQ_TABLE, FAQ_INDEX_FILE, **FAQ_INDEX_PARAMS)
+    except storage.StorageError:
+        return faq_index.FaqIndex(**FAQ_INDEX_PARAMS)
+
+# Indeks mulai dimuat di latar belakang sekali per proses, jadi halaman tampil tanpa menunggu sklearn
+@st.cache_resource
+def warm_up_index():
+    return bootstrap.warm_up("faq_index", lambda: load_faq_index().prepare())
+
 # Chatbot response
-def chatbot_response(user_input, faq_data):
-    if faq_data.empty:
+@tracing.traced("chatbot_response", is_request=True)
+def chatbot_response(user_input, index):
+    if index.empty:
         st.warning("Database FAQ kosong. Admin perlu menambahkan pertanyaan dan jawaban.")
         return None
-    
-    vectorizer = TfidfVectorizer()
-    questions = faq_data['question'].tolist() + [user_input]
-    tfidf_matrix = vectorizer.fit_transform(questions)
-    cosine_similarities = cosine_similarity(tfidf_matrix[-1], tfidf_matrix[:-1])
-    best_match_idx = cosine_similarities.argmax()
-    highest_similarity = cosine_similarities[0, best_match_idx]
-    
-    if highest_similarity < 0.3:
-        return None
-    
-    return faq_data.iloc[best_match_idx]['answer']
+    started = time.perf_counter()
+    response, score, faq_id = answer_cache.cached_answer(index, user_input)
+    # Rerun Streamlit dengan input yang sama tidak dicatat dua kali
+    if st.session_state.get("analytics_last") != user_input:
+        st.session_state.analytics_last = user_input
+        analytics.emit(answer_cache.normalize_query(user_input), score, faq_id, response is not None,
+                       (time.perf_counter() - started) * 1000)
+    return response
+
+# Pertanyaan FAQ untuk daftar id (id tabel faq)
+def load_faq_questions(ids):
+    try:
+        return {str(faq_id): question for faq_id, question in FAQ_TABLE.select(["id", "question"], "id", ids)}
+    except storage.StorageError:
+        return {}
 
 # Streamlit UI
 st.title("Chatbot dengan MySQL dan Login Admin")
 st.write("Tanyakan sesuatu, dan jika tidak ada jawaban, admin bisa menambahkannya!")
 
-# Initialize database and load FAQ
+# Initialize database (DDL sekali per proses); indeks baru dibutuhkan saat ada pertanyaan
 init_db()
-faq_data = load_faq()
+warm_up_index()
 
 # User input
 user_input = st.text_input("You: ", "")
 if user_input:
-    response = chatbot_response(user_input, faq_data)
+    index = load_faq_index()
+    response = chatbot_response(user_input, index)
+    bootstrap.mark("first_answer")
     if response:
         st.write(f"Chatbot: {response}")
     else:
         st.write("Chatbot: Saya belum tahu jawabannya. Anda bisa menambahkannya.")
+        if not index.empty:
+            saran = index.suggestions(user_input)
+            if saran:
+                st.write("Mungkin maksud Anda: " + "; ".join(saran))
         new_answer = st.text_input("Tambahkan jawaban:")
         if new_answer:
             add_pending(user_input, new_answer)
@@ -173,9 +227,75 @@ if st.sidebar.button("Login"):
 
 # Admin moderation
 if st.session_state.logged_in:
+    # pandas hanya untuk tabel panel admin; halaman chat tidak perlu menunggu impornya
+    import pandas as pd
+    st.sidebar.caption(f"Cache jawaban: {answer_cache.answer_cache.stats()}")
+    with st.sidebar.expander("Analitik Pertanyaan"):
+        if analytics.ENABLED:
+            # Hanya event yang ditambahkan sejak pembaruan terakhir yang dibaca
+            agregat = analytics.refresh()
+            ringkasan = agregat.summary()
+            st.write(f"{ringkasan['total']} pertanyaan, {ringkasan['answer_rate']:.0%} terjawab, "
+                     f"rata-rata {ringkasan['avg_latency_ms']:.1f} ms")
+            st.write("Pertanyaan tak terjawab terbanyak:")
+            st.dataframe(pd.DataFrame(agregat.top_unanswered(20), columns=["pertanyaan", "jumlah"]))
+            st.write("FAQ paling sering menjawab:")
+            top_faq = agregat.top_faqs(20)
+            pertanyaan_faq = load_faq_questions([faq_id for faq_id, _ in top_faq if faq_id.isdigit()])
+            st.dataframe(pd.DataFrame([(faq_id, pertanyaan_faq.get(faq_id), jumlah) for faq_id, jumlah in top_faq],
+                                      columns=["id", "pertanyaan", "jumlah"]))
+            st.write("Sebaran skor terbaik:")
+            st.bar_chart(pd.DataFrame(agregat.score_histogram(), columns=["skor", "jumlah"]).set_index("skor"))
+            ambang = st.slider("Simulasi threshold", 0.0, 1.0, faq_index.THRESHOLDS[faq_index.MATCH_MODE],
+                               analytics.SCORE_BIN, key="simulasi_threshold")
+            st.write(f"Perkiraan pertanyaan terjawab pada threshold {ambang:.2f}: "
+                     f"{agregat.answer_rate_at(ambang):.0%}")
+        else:
+            st.caption("Analitik nonaktif (CHATBOT_ANALYTICS=0).")
+    with st.sidebar.expander("Tracing"):
+        if tracing.ENABLED:
+            st.dataframe(pd.DataFrame(tracing.stage_stats()))
+            st.json(tracing.counters())
+            st.write("Rincian request terakhir:")
+            st.json(tracing.recent_requests()[:10])
+            st.download_button("Unduh metrik (Prometheus)", tracing.render_prometheus(),
+                               file_name="chatbot_metrics.prom", key="unduh_metrik")
+        else:
+            st.caption("Tracing nonaktif. Jalankan dengan CHATBOT_TRACE=1 untuk mengaktifkan.")
+        st.write("Startup proses ini (ms):")
+        st.json(bootstrap.report())
     st.subheader("Moderasi Admin")
-    pending_data = load_pending()
+    # Pertanyaan pending yang mirip dikelompokkan agar cukup dijawab sekali
+    feed = pending_clusters()
+    jumlah_klaster = feed.cluster_count(min_members=2) if feed is not None else 0
+    if jumlah_klaster:
+        st.write(f"**{jumlah_klaster} klaster pertanyaan mirip**")
+        cursors = admin_ui.keyset_cursors("klaster", None, -1)
+        halaman, next_cursor = feed.page(cursors[-1], CLUSTER_PAGE_SIZE, min_members=2)
+        jawaban_pending = load_pending_answers([q for c in halaman for q in c.members])
+        for c in halaman:
+            with st.expander(f"{c.representative} ({c.count} pertanyaan)"):
+                for question in c.members:
+                    st.write(f"- {question}: {jawaban_pending.get(question)}")
+                jawaban = st.text_area("Jawaban untuk klaster", jawaban_pending.get(c.representative) or "",
+                                       key=f"jawaban_klaster_{c.representative}")
+                col1, col2 = st.columns([0.3, 0.7])
+                with col1:
+                    if st.button("✔️ Setujui klaster", key=f"approve_cluster_{c.representative}") and jawaban.strip():
+                        moderate_questions(approve=[(c.representative, jawaban)], reject=c.members[1:])
+                        st.experimental_rerun()
+                with col2:
+                    if st.button("❌ Tolak klaster", key=f"reject_cluster_{c.representative}"):
+                        moderate_questions(reject=c.members)
+                        st.experimental_rerun()
+        admin_ui.keyset_nav("klaster", cursors, next_cursor)
+
+    # Hanya satu halaman pending yang dimuat dan dirender
+    cari = st.text_input("Cari pertanyaan pending", key="cari_pending")
+    cursors = admin_ui.keyset_cursors("pending", cari, 0)
+    pending_data, next_id = load_pending_page(cursors[-1], PAGE_SIZE, cari)
     if not pending_data.empty:
+        st.caption(f"Halaman {len(cursors)}")
         for _, row in pending_data.iterrows():
             st.write(f"**Pertanyaan:** {row['question']}")
             st.write(f"**Jawaban:** {row['answer']}")
@@ -188,5 +308,29 @@ if st.session_state.logged_in:
                 if st.button(f"❌ Tolak {row['question']}", key=f"reject_{row['question']}"):
                     reject_question(row['question'])
                     st.experimental_rerun()
+
+        # Moderasi massal: semua pertanyaan terpilih diproses dalam satu transaksi
+        terpilih = st.multiselect("Pilih pertanyaan untuk moderasi massal", pending_data["question"].tolist())
+        col1, col2 = st.columns([0.3, 0.7])
+        with col1:
+            if st.button("✔️ Setujui terpilih", key="approve_selected") and terpilih:
+                rows = pending_data[pending_data["question"].isin(terpilih)]
+                moderate_questions(approve=list(zip(rows["question"], rows["answer"])))
+                st.experimental_rerun()
+        with col2:
+            if st.button("❌ Tolak terpilih", key="reject_selected") and terpilih:
+                moderate_questions(reject=terpilih)
+                st.experimental_rerun()
+        admin_ui.keyset_nav("pending", cursors, next_id)
     else:
-        st.write("Tidak ada pertanyaan yang menunggu moderasi.")
\ No newline at end of file
+        st.write("Tidak ada pertanyaan yang menunggu moderasi.")
+
+    st.subheader("Daftar FAQ")
+    cari_faq = st.text_input("Cari pertanyaan/jawaban FAQ", key="cari_faq")
+    cursors = admin_ui.keyset_cursors("faq", cari_faq, 0)
+    faq_page, next_id = load_faq_page(cursors[-1], PAGE_SIZE, cari_faq)
+    st.caption(f"Halaman {len(cursors)}, {len(faq_page)} baris")
+    st.dataframe(faq_page)
+    admin_ui.keyset_nav("faq", cursors, next_id)
+
+bootstrap.mark("first_render")
@@ -1,10 +1,19 @@
+# Diimpor paling awal: titik nol pengukuran waktu startup
+import bootstrap
 import streamlit as st
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from st_aggrid import AgGrid, GridOptionsBuilder, ColumnsAutoSizeMode, DataReturnMode, GridUpdateMode
 import os
+import time
 import bcrypt
+import faq_index
+import answer_cache
+import append_log
+import user_store
+import tracing
+import faq_service
+import near_duplicates
+import storage
+import analytics
+import admin_ui
 
 # File paths
 DATA_FILE = "faq_data.csv"
@@ -12,135 +21,189 @@ USER_FILE = "users.csv"
 LOG_FILE = "audit_log.csv"
 USER_QUESTIONS_FILE = "user_questions.csv"
 
-# Initialize files if they don't exist
-if not os.path.exists(DATA_FILE):
-    df = pd.DataFrame({"tag": [], "question": [], "answer": []})
-    df.to_csv(DATA_FILE, index=False)
+LOG_COLUMNS = ["username", "action", "details"]
+# Audit log dipecah per segmen ~16 MB; jumlah baris per halaman di tampilan log
+LOG_SEGMENT_BYTES = 16 * 1024 * 1024
+LOG_PAGE_SIZE = 100
+# Jumlah baris FAQ dan klaster pertanyaan user per halaman di panel admin
+FAQ_PAGE_SIZE = 50
+CLUSTER_PAGE_SIZE = 20
 
-if not os.path.exists(USER_FILE):
-    users_df = pd.DataFrame({"username": [], "password": [], "role": []})
-    users_df.to_csv(USER_FILE, index=False)
+# Parameter indeks FAQ: TF-IDF per kata, atau n-gram karakter bila FAQ_MATCH_MODE=char
+FAQ_INDEX_PARAMS = faq_index.CHAR_MODE_PARAMS if faq_index.MATCH_MODE == "char" else {"stop_words": "english"}
 
-if not os.path.exists(LOG_FILE):
-    log_df = pd.DataFrame({"username": [], "action": [], "details": []})
-    log_df.to_csv(LOG_FILE, index=False)
+# Bila diisi (mis. http://localhost:8080), jawaban diambil dari faq_service.py
+SERVICE_URL = os.environ.get("CHATBOT_SERVICE_URL")
 
-if not os.path.exists(USER_QUESTIONS_FILE):
-    user_questions_df = pd.DataFrame({"question": []})
-    user_questions_df.to_csv(USER_QUESTIONS_FILE, index=False)
+# Tabel CSV: tambah baris langsung di akhir file, perubahan lain ditulis atomik (file sementara + rename)
+FAQ_TABLE = storage.CsvTable(DATA_FILE, ["tag", "question", "answer"])
+USERS_TABLE = storage.CsvTable(USER_FILE, ["username", "password", "role"])
+
+# Initialize files if they don't exist (sekali per proses, bukan setiap rerun)
+@st.cache_resource
+def init_files():
+    FAQ_TABLE.ensure()
+    USERS_TABLE.ensure()
+    storage.CsvTable(LOG_FILE, LOG_COLUMNS).ensure()
+    storage.CsvTable(USER_QUESTIONS_FILE, ["question"]).ensure()
+
+init_files()
 
 # Helper functions
+# Hash disimpan sebagai string biasa ($2b$...), bukan literal b'...'
 def hash_password(password):
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
-
-def check_password(password, hashed_password):
-    if isinstance(hashed_password, str):
-        hashed_password = hashed_password.encode()
-    return bcrypt.checkpw(password.encode(), hashed_password)
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
 
+@tracing.traced("load_faq")
 def load_faq():
     try:
-        return pd.read_csv(DATA_FILE)
+        return FAQ_TABLE.rows()
     except Exception as e:
         st.error(f"Gagal memuat file FAQ: {e}")
+        import pandas as pd
         return pd.DataFrame({"tag": [],"question": [], "answer": []})
 
-def save_faq(df):
+# Tambah satu baris FAQ tanpa menulis ulang seluruh CSV; indeks ikut diperbarui
+@tracing.traced("append_faq")
+def append_faq(entry):
     try:
-        df.to_csv(DATA_FILE, index=False)
+        faq_index.append_csv_row(DATA_FILE, entry, **FAQ_INDEX_PARAMS)
     except Exception as e:
         st.error(f"Gagal menyimpan file FAQ: {e}")
 
-def load_users():
-    try:
-        return pd.read_csv(USER_FILE)
-    except Exception as e:
-        st.error(f"Gagal memuat file pengguna: {e}")
-        return pd.DataFrame({"username": [], "password": [], "role": []})
+# Log append-only, dibagi antar sesi dalam satu proses dan dikunci antar proses
+def audit_log():
+    return append_log.open_log(LOG_FILE, LOG_COLUMNS, segment_bytes=LOG_SEGMENT_BYTES)
 
-def save_users(df):
-    try:
-        df.to_csv(USER_FILE, index=False)
-    except Exception as e:
-        st.error(f"Gagal menyimpan file pengguna: {e}")
+def user_questions_log():
+    return append_log.open_log(USER_QUESTIONS_FILE, ["question"])
 
-def load_logs():
+@tracing.traced("load_logs_page")
+def load_logs_page(page):
+    # Halaman 0 berisi log terbaru
+    import pandas as pd
     try:
-        return pd.read_csv(LOG_FILE)
+        log = audit_log()
+        total = log.count()
+        end = max(total - page * LOG_PAGE_SIZE, 0)
+        start = max(end - LOG_PAGE_SIZE, 0)
+        rows = log.read_page(start, end - start)[::-1]
+        return pd.DataFrame(rows, columns=LOG_COLUMNS), total
     except Exception as e:
         st.error(f"Gagal memuat file log: {e}")
-        return pd.DataFrame({"username": [], "action": [], "details": []})
+        return pd.DataFrame({"username": [], "action": [], "details": []}), 0
 
+@tracing.traced("save_log")
 def save_log(username, action, details):
     try:
-        log_df = load_logs()
-        new_log = pd.DataFrame({"username": [username], "action": [action], "details": [details]})
-        log_df = pd.concat([log_df, new_log], ignore_index=True)
-        log_df.to_csv(LOG_FILE, index=False)
+        audit_log().append({"username": username, "action": action, "details": details})
     except Exception as e:
         st.error(f"Gagal menyimpan log: {e}")
 
-def load_user_questions():
+@tracing.traced("add_user_question")
+def add_user_question(question):
     try:
-        return pd.read_csv(USER_QUESTIONS_FILE)
+        log = user_questions_log()
+        log.append({"question": question})
+        log.flush()
     except Exception as e:
-        st.error(f"Gagal memuat file pertanyaan user: {e}")
-        return pd.DataFrame({"question": []})
+        st.error(f"Gagal menyimpan file pertanyaan user: {e}")
 
-def save_user_questions(df):
+# Hapus pertanyaan yang sudah dijawab; satu-satunya penulisan ulang log pertanyaan user
+def remove_user_questions(questions):
     try:
-        df.to_csv(USER_QUESTIONS_FILE, index=False)
+        log = user_questions_log()
+        questions = set(questions)
+        log.rewrite([row for row in log.iter_rows() if row.get("question") not in questions])
     except Exception as e:
         st.error(f"Gagal menyimpan file pertanyaan user: {e}")
 
-# @st.cache
-def compute_tfidf(questions):
-    vectorizer = TfidfVectorizer(stop_words="english")
-    return vectorizer.fit_transform(questions)
+# True bila pertanyaan baru diajukan, False bila sudah pernah diajukan
+def submit_user_question(question):
+    if SERVICE_URL:
+        try:
+            return faq_service.ServiceClient(SERVICE_URL).submit_question(question) == "submitted"
+        except faq_service.ServiceError as e:
+            st.warning(f"Layanan FAQ tidak tersedia, disimpan langsung: {e}")
+    if user_questions_log().contains("question", question):
+        return False
+    add_user_question(question)
+    return True
+
+# Indeks TF-IDF dibangun sekali dan hanya dibangun ulang bila faq_data.csv berubah
+@tracing.traced("load_faq_index")
+def load_faq_index():
+    return faq_index.get_csv_index(DATA_FILE, load_faq, **FAQ_INDEX_PARAMS)
+
+# Indeks mulai dimuat di latar belakang sekali per proses; sesi berikutnya memakai cache faq_index.
+# Dalam mode klien layanan indeks lokal hanya dimuat bila layanan gagal atau admin membukanya.
+@st.cache_resource
+def warm_up_index():
+    return bootstrap.warm_up("faq_index", lambda: load_faq_index().prepare())
+
+if not SERVICE_URL:
+    warm_up_index()
+
+# Pilihan topik: semua FAQ, deteksi otomatis lewat klasifikasi tag, atau satu tag tertentu
+TOPIK_SEMUA = "Semua topik"
+TOPIK_OTOMATIS = "Deteksi otomatis"
+
+# Daftar tag dari layanan (GET /tags) dalam mode klien, selain itu dari indeks lokal
+def load_tags():
+    if SERVICE_URL:
+        try:
+            return faq_service.ServiceClient(SERVICE_URL).tags()
+        except faq_service.ServiceError as e:
+            st.caption(f"Layanan FAQ tidak tersedia, memakai indeks lokal: {e}")
+    return load_faq_index().tags()
 
-def chatbot_response(user_input, faq_data):
-    if faq_data.empty:
+# (jawaban, saran); saran "mungkin maksud Anda" hanya diisi bila tidak ada jawaban
+@tracing.traced("chatbot_response", is_request=True)
+def chatbot_response(user_input, topik=TOPIK_SEMUA):
+    tag = None if topik in (TOPIK_SEMUA, TOPIK_OTOMATIS) else topik
+    if SERVICE_URL:
+        try:
+            result = faq_service.ServiceClient(SERVICE_URL).answer(user_input, tag, topik == TOPIK_OTOMATIS)
+            return result["answer"], result.get("suggestions") or []
+        except faq_service.ServiceError as e:
+            st.caption(f"Layanan FAQ tidak tersedia, memakai indeks lokal: {e}")
+    index = load_faq_index()
+    if index.empty:
         st.warning("Database FAQ kosong. Admin perlu menambahkan pertanyaan dan jawaban.")
-        return None
-    
-    questions = faq_data['question'].tolist() + [user_input]
-    tfidf_matrix = compute_tfidf(questions)
-    cosine_similarities = cosine_similarity(tfidf_matrix[-1], tfidf_matrix[:-1])
-    best_match_idx = cosine_similarities.argmax()
-    highest_similarity = cosine_similarities[0, best_match_idx]
-    
-    if highest_similarity < 0.3:
-        return None
-    
-    return faq_data.iloc[best_match_idx]['answer']
+        return None, []
+    started = time.perf_counter()
+    response, score, faq_id = answer_cache.cached_answer(index, user_input, tag=tag,
+                                                         classify=topik == TOPIK_OTOMATIS)
+    # Rerun Streamlit dengan input yang sama tidak dicatat dua kali
+    if st.session_state.get("analytics_last") != (user_input, topik):
+        st.session_state.analytics_last = (user_input, topik)
+        analytics.emit(answer_cache.normalize_query(user_input), score, faq_id, response is not None,
+                       (time.perf_counter() - started) * 1000)
+    return response, ([] if response is not None else index.suggestions(user_input))
 
+# Data pengguna diindeks per username dan hanya dimuat ulang bila users.csv berubah
+@tracing.traced("authenticate")
 def authenticate(username, password):
-    users_df = load_users()
-    user = users_df[users_df["username"] == username]
-    if not user.empty:
-        hashed_password = user.iloc[0]["password"]
-        if check_password(password, hashed_password):
-            return user.iloc[0]["role"]
-    return None
+    return user_store.open_store(USER_FILE).verify(username, password)
 
+# Pengguna baru ditambahkan sebagai satu baris; users.csv tidak ditulis ulang
+# Semua penulisan users.csv lewat user_store agar cache verifikasi pengguna itu ikut dibuang
 def register_user(username, password, role="user"):
-    users_df = load_users()
-    if username in users_df["username"].values:
+    store = user_store.open_store(USER_FILE)
+    if username in store:
         return False  # Username already exists
-    hashed_password = hash_password(password)
-    new_user = pd.DataFrame({"username": [username], "password": [hashed_password], "role": [role]})
-    users_df = pd.concat([users_df, new_user], ignore_index=True)
-    save_users(users_df)
-    return True
+    try:
+        return store.add(username, hash_password(password), role)
+    except Exception as e:
+        st.error(f"Gagal menyimpan file pengguna: {e}")
+        return False
 
 def reset_password(username, new_password):
-    users_df = load_users()
-    if username in users_df["username"].values:
-        hashed_password = hash_password(new_password)
-        users_df.loc[users_df["username"] == username, "password"] = hashed_password
-        save_users(users_df)
-        return True
-    return False
+    try:
+        return user_store.open_store(USER_FILE).set_password(username, hash_password(new_password))
+    except Exception as e:
+        st.error(f"Gagal menyimpan file pengguna: {e}")
+        return False
 
 # Session State untuk menyimpan state aplikasi
 if "logged_in" not in st.session_state:
@@ -163,6 +226,8 @@ def admin_login():
     if st.sidebar.button("Login", key="login_button"):
         if not username or not password:
             st.sidebar.error("Username dan password tidak boleh kosong.")
+        elif user_store.open_store(USER_FILE).is_locked(username):
+            st.sidebar.error("Terlalu banyak percobaan login gagal. Coba lagi beberapa menit lagi.")
         else:
             role = authenticate(username, password)
             if role == "admin":
@@ -186,23 +251,27 @@ def main():
     st.title("Chatbot FAQ dengan Rahmad Rudiansyah Siregar")
     st.write("Tanyakan sesuatu, dan saya akan mencoba menjawab!")
     # Tampilkan form untuk memasukkan pertanyaan
-    faq_df = load_faq()
+    topik = TOPIK_SEMUA
+    tags = load_tags()
+    if tags:
+        topik = st.selectbox("Topik", [TOPIK_SEMUA, TOPIK_OTOMATIS] + tags, key="topik")
     user_input = st.text_input("Anda:")
     tombol_tanya = st.button("Tanya")
     if user_input.strip() or tombol_tanya:
-        response = chatbot_response(user_input,faq_df)
+        response, saran = chatbot_response(user_input, topik)
+        bootstrap.mark("first_answer")
         if response:
             st.write(f"🤖 Bot : {response}")
         else:
             st.write("🤖 Bot : Saya belum tahu jawabannya. Anda bisa menambahkannya.")
+            if saran:
+                st.write("Mungkin maksud Anda:")
+                for pertanyaan in saran:
+                    st.write(f"- {pertanyaan}")
             # tanya_baru = st.text_input("Tambahkan Pertanyaan Anda")
             tanya_baru = st.button("Ajukan Pertanyaan")
             if tanya_baru:
-                 user_questions_df = load_user_questions()
-                 if user_input not in user_questions_df["question"].values:
-                    tambah_question = pd.DataFrame({"question": [user_input]})
-                    user_questions_df = pd.concat([user_questions_df, tambah_question], ignore_index=True)
-                    save_user_questions(user_questions_df)
+                 if submit_user_question(user_input):
                     st.success("Pertanyaan Anda telah diajukan. Terima kasih!")
                     st.session_state.user_input = ""
                  else:
@@ -211,6 +280,10 @@ def main():
 
     # Fitur admin (hanya untuk admin yang login)
     if st.session_state.logged_in and st.session_state.role == "admin":
+        # pandas hanya untuk tabel panel admin; halaman chat tidak perlu menunggu impornya
+        import pandas as pd
+        # Panel admin menelusuri dan mengubah file lokal, jadi selalu memakai indeks lokal
+        index = load_faq_index()
         with st.sidebar.expander("Manajemen FAQ"):
             st.write("Tambahkan pertanyaan dan jawaban ke FAQ:")
             new_tag = st.selectbox("Pilih Tag :",
@@ -224,11 +297,8 @@ def main():
             new_answer = st.text_area("Jawaban Baru", st.session_state.new_answer, key="input_new_answer")
             if st.button("Tambahkan ke FAQ",key="tambah_faq_button"):
                 if new_question.strip() and new_answer.strip():
-                    faq_df = load_faq()
-                    if new_question not in faq_df["question"].values:
-                        new_entry = pd.DataFrame({"tag": [new_tag], "question": [new_question], "answer": [new_answer]})
-                        faq_df = pd.concat([faq_df, new_entry], ignore_index=True)
-                        save_faq(faq_df)
+                    if not index.contains_question(new_question):
+                        append_faq({"tag": new_tag, "question": new_question, "answer": new_answer})
                         st.success("Pertanyaan dan jawaban berhasil ditambahkan ke FAQ!")
                         # Bersihkan input fields
                         new_question = ""
@@ -238,10 +308,17 @@ def main():
                     st.error("Pertanyaan dan jawaban tidak boleh kosong.")
         
         with st.sidebar.expander("FAQ Log"):
-            if st.button("Tampilkan FAQ Log",key="tampil_faq_log_button"):
-                if not faq_df.empty:
-                    logs = load_faq()
-                    st.dataframe(logs)
+            if st.checkbox("Tampilkan FAQ Log",key="tampil_faq_log_button"):
+                if not index.empty:
+                    # Hanya satu halaman yang dibaca dari indeks; filter dijalankan di sisi indeks
+                    cari = st.text_input("Cari pertanyaan/jawaban", key="cari_faq")
+                    tag_filter = st.selectbox("Filter tag", ["Semua tag"] + tags, key="filter_tag_faq")
+                    tag_filter = None if tag_filter == "Semua tag" else tag_filter
+                    cursors = admin_ui.keyset_cursors("faq", (cari, tag_filter), -1)
+                    rows, next_cursor = index.browse(cursors[-1], FAQ_PAGE_SIZE, cari, tag_filter)
+                    st.caption(f"Halaman {len(cursors)}, {len(rows)} baris")
+                    st.dataframe(pd.DataFrame(rows))
+                    admin_ui.keyset_nav("faq", cursors, next_cursor)
                 else:
                     st.write("Tidak ada data FAQ.")
                     
@@ -279,31 +356,84 @@ def main():
             
 
         with st.sidebar.expander("Pertanyaan dari User"):
-            user_questions_df = load_user_questions()
-            if not user_questions_df.empty:
-                st.write("Pertanyaan yang diajukan user:")
-                st.dataframe(user_questions_df)
-                selected_question = st.selectbox("Pilih Pertanyaan untuk Ditambahkan ke FAQ", user_questions_df["question"])
-                new_answer = st.text_input("Masukkan Jawaban untuk Pertanyaan Terpilih")
-                if st.button("Tambahkan ke FAQ",key="tambah_faq_user"):
-                    if new_answer.strip():
-                        faq_df = load_faq()
-                        new_entry = pd.DataFrame({"question": [selected_question], "answer": [new_answer]})
-                        faq_df = pd.concat([faq_df, new_entry], ignore_index=True)
-                        save_faq(faq_df)
-                        user_questions_df = user_questions_df[user_questions_df["question"] != selected_question]
-                        save_user_questions(user_questions_df)
-                        st.success("Pertanyaan dan jawaban berhasil ditambahkan ke FAQ!")
-                    else:
-                        st.error("Jawaban tidak boleh kosong.")
+            # Pertanyaan yang mirip dikelompokkan, urut dari klaster yang paling awal diajukan;
+            # hanya byte yang baru ditambahkan ke log yang dibaca
+            feed = near_duplicates.log_clusters(user_questions_log())
+            jumlah_klaster = feed.cluster_count()
+            if jumlah_klaster:
+                st.write(f"{feed.total} pertanyaan dalam {jumlah_klaster} klaster:")
+                cari = st.text_input("Cari pertanyaan user", key="cari_pertanyaan_user").casefold()
+                cursors = admin_ui.keyset_cursors("klaster", cari, -1)
+                klaster, next_cursor = feed.page(cursors[-1], CLUSTER_PAGE_SIZE, cari)
+                st.dataframe(pd.DataFrame({"pertanyaan": [c.representative for c in klaster],
+                                           "pengajuan": [c.count for c in klaster],
+                                           "variasi": [len(c.members) for c in klaster]}))
+                admin_ui.keyset_nav("klaster", cursors, next_cursor)
+                if not klaster:
+                    st.write("Tidak ada pertanyaan yang cocok.")
+                else:
+                    pilihan = st.selectbox("Pilih Pertanyaan untuk Ditambahkan ke FAQ", range(len(klaster)),
+                                           format_func=lambda i: f"{klaster[i].representative} ({klaster[i].count}x)")
+                    selected_question = klaster[pilihan].representative
+                    if len(klaster[pilihan].members) > 1:
+                        st.caption("Variasi lain: " + "; ".join(klaster[pilihan].members[1:]))
+                    new_answer = st.text_input("Masukkan Jawaban untuk Pertanyaan Terpilih")
+                    if st.button("Tambahkan ke FAQ",key="tambah_faq_user"):
+                        if new_answer.strip():
+                            append_faq({"question": selected_question, "answer": new_answer})
+                            # Seluruh klaster dianggap terjawab
+                            remove_user_questions(klaster[pilihan].members)
+                            st.success("Pertanyaan dan jawaban berhasil ditambahkan ke FAQ!")
+                        else:
+                            st.error("Jawaban tidak boleh kosong.")
             else:
                 st.write("Tidak ada pertanyaan dari user.")
 
+        with st.sidebar.expander("Statistik Cache Jawaban"):
+            st.json(answer_cache.answer_cache.stats())
+
         with st.sidebar.expander("Audit Log"):
-            if st.button("Tampilkan Log",key="tampil_log_button"):
-                logs = load_logs()
+            if st.checkbox("Tampilkan Log",key="tampil_log_button"):
+                halaman = st.number_input("Halaman (0 = terbaru)", min_value=0, step=1, key="halaman_log")
+                logs, total = load_logs_page(int(halaman))
+                st.caption(f"{total} entri log")
                 st.dataframe(logs)
 
+        with st.sidebar.expander("Analitik Pertanyaan"):
+            if analytics.ENABLED:
+                # Hanya event yang ditambahkan sejak pembaruan terakhir yang dibaca
+                agregat = analytics.refresh()
+                ringkasan = agregat.summary()
+                st.write(f"{ringkasan['total']} pertanyaan, {ringkasan['answer_rate']:.0%} terjawab, "
+                         f"rata-rata {ringkasan['avg_latency_ms']:.1f} ms")
+                st.write("Pertanyaan tak terjawab terbanyak:")
+                st.dataframe(pd.DataFrame(agregat.top_unanswered(20), columns=["pertanyaan", "jumlah"]))
+                st.write("FAQ paling sering menjawab:")
+                st.dataframe(pd.DataFrame(
+                    [(index.question_for(faq_id) or faq_id, jumlah) for faq_id, jumlah in agregat.top_faqs(20)],
+                    columns=["pertanyaan", "jumlah"]))
+                st.write("Sebaran skor terbaik:")
+                st.bar_chart(pd.DataFrame(agregat.score_histogram(), columns=["skor", "jumlah"]).set_index("skor"))
+                ambang = st.slider("Simulasi threshold", 0.0, 1.0, faq_index.THRESHOLDS[faq_index.MATCH_MODE],
+                                   analytics.SCORE_BIN, key="simulasi_threshold")
+                st.write(f"Perkiraan pertanyaan terjawab pada threshold {ambang:.2f}: "
+                         f"{agregat.answer_rate_at(ambang):.0%}")
+            else:
+                st.caption("Analitik nonaktif (CHATBOT_ANALYTICS=0).")
+
+        with st.sidebar.expander("Tracing"):
+            if tracing.ENABLED:
+                st.dataframe(pd.DataFrame(tracing.stage_stats()))
+                st.json(tracing.counters())
+                st.write("Rincian request terakhir:")
+                st.json(tracing.recent_requests()[:10])
+                st.download_button("Unduh metrik (Prometheus)", tracing.render_prometheus(),
+                                   file_name="chatbot_metrics.prom", key="unduh_metrik")
+            else:
+                st.caption("Tracing nonaktif. Jalankan dengan CHATBOT_TRACE=1 untuk mengaktifkan.")
+            st.write("Startup proses ini (ms):")
+            st.json(bootstrap.report())
+
         # Fitur login admin di sidebar
     if not st.session_state.logged_in:
         admin_login()
@@ -314,3 +444,4 @@ def main():
 
 if __name__ == "__main__":
     main()
+    bootstrap.mark("first_render")
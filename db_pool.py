@@ -0,0 +1,94 @@
+import logging
+import os
+import threading
+
+import mysql.connector
+from mysql.connector import pooling
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Konfigurasi koneksi MySQL (bisa diganti lewat environment variable)
+DB_CONFIG = {
+    "host": os.environ.get("CHATBOT_DB_HOST", "localhost"),
+    "user": os.environ.get("CHATBOT_DB_USER", "root"),
+    "password": os.environ.get("CHATBOT_DB_PASSWORD", ""),  # Ganti dengan password MySQL Anda
+    "database": os.environ.get("CHATBOT_DB_NAME", "chatbot_db"),
+}
+POOL_SIZE = int(os.environ.get("CHATBOT_DB_POOL_SIZE", 5))
+
+# Pool dan status skema disimpan di modul ini, jadi hanya dibuat sekali per proses
+# (skrip Streamlit sendiri dijalankan ulang setiap rerun)
+_pool = None
+_pool_lock = threading.Lock()
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name="chatbot_pool",
+                pool_size=POOL_SIZE,
+                pool_reset_session=True,
+                **DB_CONFIG,
+            )
+            logger.info(f"Pool koneksi database dibuat ({POOL_SIZE} koneksi).")
+        return _pool
+
+
+@tracing.traced("db.get_connection")
+def get_connection():
+    """Borrow a healthy connection from the pool; ``close()`` gives it back.
+
+    Returns None when the database cannot be reached, like the old
+    ``connect_to_database()``.
+    """
+    try:
+        conn = _get_pool().get_connection()
+    except pooling.PoolError as err:
+        # Semua koneksi sedang dipakai: buka koneksi langsung daripada menunggu
+        logger.warning(f"Pool koneksi habis, membuka koneksi langsung: {err}")
+        tracing.incr("db.pool_exhausted")
+        try:
+            return mysql.connector.connect(**DB_CONFIG)
+        except mysql.connector.Error as err:
+            logger.error(f"Error connecting to database: {err}")
+            return None
+    except mysql.connector.Error as err:
+        logger.error(f"Error connecting to database: {err}")
+        return None
+    try:
+        # Health check: sambung ulang koneksi yang diputus server (wait_timeout dsb.)
+        conn.ping(reconnect=True, attempts=2, delay=0)
+    except mysql.connector.Error as err:
+        logger.error(f"Koneksi dari pool tidak sehat: {err}")
+        conn.close()
+        return None
+    return conn
+
+
+def ensure_schema(statements):
+    """Run the DDL ``statements`` once per process; returns True when the schema is ready."""
+    global _schema_ready
+    if _schema_ready:
+        return True
+    with _schema_lock:
+        if _schema_ready:
+            return True
+        conn = get_connection()
+        if not conn:
+            return False
+        try:
+            cursor = conn.cursor()
+            for statement in statements:
+                cursor.execute(statement)
+            conn.commit()
+            _schema_ready = True
+            logger.info("Database initialized successfully!")
+        finally:
+            conn.close()
+    return True
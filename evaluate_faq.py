@@ -0,0 +1,111 @@
+"""Replay logged questions through the FAQ matcher without Streamlit.
+
+Contoh:
+    python evaluate_faq.py user_questions.csv requests.jsonl --threshold 0.35 -o hasil.csv
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import faq_index
+
+# Index milik proses worker, dimuat sekali oleh _init_worker
+_worker_index = None
+
+
+def read_questions(path):
+    if path.endswith(".jsonl"):
+        questions = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                for field in ("question", "query", "text", "title"):
+                    if record.get(field):
+                        questions.append(str(record[field]))
+                        break
+        return questions
+    df = pd.read_csv(path)
+    return df["question"].dropna().astype(str).tolist()
+
+
+def _load_index(data_file, vectorizer_params):
+    return faq_index.get_csv_index(data_file, lambda: pd.read_csv(data_file), **vectorizer_params)
+
+
+def _init_worker(data_file, vectorizer_params):
+    global _worker_index
+    _worker_index = _load_index(data_file, vectorizer_params)
+
+
+def _answer_chunk(args):
+    questions, threshold = args
+    return _worker_index.answer_batch(questions, threshold)
+
+
+def evaluate(questions, data_file, vectorizer_params, threshold, workers=1, chunk_size=1000):
+    # Bangun (dan simpan) indeks sekali di proses utama agar worker tinggal memuatnya
+    index = _load_index(data_file, vectorizer_params)
+    if workers <= 1 or len(questions) <= chunk_size:
+        return index.answer_batch(questions, threshold)
+    chunks = [(questions[i:i + chunk_size], threshold) for i in range(0, len(questions), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(data_file, vectorizer_params)) as pool:
+        for chunk_results in pool.map(_answer_chunk, chunks):
+            results.extend(chunk_results)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluasi offline jawaban chatbot FAQ.")
+    parser.add_argument("inputs", nargs="+", help="file .csv (kolom question) atau .jsonl")
+    parser.add_argument("--faq", default="faq_data.csv", help="file FAQ sumber (default: faq_data.csv)")
+    parser.add_argument("--threshold", type=float,
+                        help="default: threshold mode yang dipilih (faq_index.THRESHOLDS)")
+    parser.add_argument("--stop-words", default="english",
+                        help="stop_words TfidfVectorizer, 'none' untuk tanpa stop words "
+                             "(default: english, sama dengan chatbot_with_faq.py)")
+    parser.add_argument("--mode", choices=["word", "char"], default="word",
+                        help="word: TF-IDF per kata; char: n-gram karakter ter-hash (mengabaikan --stop-words)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("-o", "--output", help="tulis hasil per pertanyaan ke CSV ini")
+    args = parser.parse_args(argv)
+
+    if args.mode == "char":
+        vectorizer_params = faq_index.CHAR_MODE_PARAMS
+    else:
+        vectorizer_params = {} if args.stop_words.lower() == "none" else {"stop_words": args.stop_words}
+    if args.threshold is None:
+        args.threshold = faq_index.THRESHOLDS[args.mode]
+    questions = [q for path in args.inputs for q in read_questions(path)]
+    started = time.perf_counter()
+    results = evaluate(questions, args.faq, vectorizer_params, args.threshold,
+                       args.workers, args.chunk_size)
+    elapsed = time.perf_counter() - started
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["question", "answered", "score", "faq_id", "answer"])
+            for question, (answer, score, faq_id) in zip(questions, results):
+                writer.writerow([question, answer is not None, f"{score:.4f}", faq_id, answer])
+
+    answered = sum(answer is not None for answer, _, _ in results)
+    total = len(results)
+    rate = answered / total if total else 0.0
+    print(f"{total} pertanyaan, {answered} terjawab ({rate:.1%}) pada threshold {args.threshold} "
+          f"dalam {elapsed:.2f} detik", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
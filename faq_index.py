@@ -0,0 +1,756 @@
+import bisect
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import faq_snapshot
+import storage
+import tracing
+from inverted_index import InvertedIndex
+
+logger = logging.getLogger(__name__)
+
+# Batas minimal kemiripan agar sebuah FAQ dianggap cocok
+SIMILARITY_THRESHOLD = 0.3
+# Batas lebih rendah untuk saran "mungkin maksud Anda" saat tidak ada jawaban
+SUGGESTION_THRESHOLD = 0.15
+
+# Skor minimal centroid topik agar hasil klasifikasi tag dipakai untuk routing
+TAG_CLASSIFIER_THRESHOLD = 0.2
+
+# "inverted" (posting list + MaxScore) atau "dense" (skor semua baris sekaligus)
+SEARCH_STRATEGY = os.environ.get("FAQ_SEARCH_STRATEGY", "inverted")
+
+# "word" (TfidfVectorizer per kata) atau "char" (n-gram karakter ter-hash, tahan salah ketik)
+MATCH_MODE = os.environ.get("FAQ_MATCH_MODE", "word")
+# Parameter indeks untuk mode char; lihat text_features.HashedTfidfVectorizer
+CHAR_MODE_PARAMS = {"mode": "char"}
+# Threshold jawaban per mode. Skor n-gram karakter lebih rendah untuk pasangan yang sama
+# ("cutii pns": 0.47 per kata, 0.24 per n-gram; "ekinrja lupa pasword": tidak ada kata yang
+# cocok, 0.147 per n-gram). Nilai char dikalibrasi dengan kasus typo-char di benchmark_faq.py
+# (FAQ asli + 0-10k baris pengisi, 500 query): pada 0.14 terjawab 79-82% dan 70-74% di antaranya
+# tepat, dibanding 64-69% / 71-78% pada 0.2 dan 60-67% / 56-64% untuk mode kata pada 0.3; query
+# di luar topik tetap tidak dijawab (skor tertinggi ~0.07). Pertanyaan yang tidak ada di FAQ
+# ("cuti melahirkan": 0.39 ke "cuti sakit" per kata, 0.10 per n-gram) hanya menjadi saran
+THRESHOLDS = {"word": SIMILARITY_THRESHOLD, "char": 0.14}
+# Threshold saran per mode, di bawah threshold jawaban dan di atas skor query di luar topik
+SUGGESTION_THRESHOLDS = {"word": SUGGESTION_THRESHOLD, "char": 0.08}
+
+# Jumlah baris tambahan yang boleh memakai bobot IDF lama sebelum indeks di-fit ulang
+STALENESS_BUDGET = int(os.environ.get("FAQ_INDEX_STALENESS_BUDGET", 200))
+# Baris tambahan yang lebih tua dari ini (detik) juga memicu compaction
+COMPACT_INTERVAL = float(os.environ.get("FAQ_INDEX_COMPACT_INTERVAL", 300))
+
+# Cache indeks per proses: key -> (signature, FaqIndex)
+_INDEXES = {}
+_LOCK = threading.RLock()
+
+# Semua yang dibutuhkan untuk menilai query, diganti sekaligus agar query
+# tidak pernah melihat vectorizer baru dengan matriks lama
+# ``derived`` menampung struktur yang dibangun saat dibutuhkan (sub-indeks per tag,
+# centroid tag) dan ikut dibuang bersama state lama
+_ScoringState = namedtuple("_ScoringState", "vectorizer matrix delta n_fitted inverted derived")
+
+
+def _scoring_state(vectorizer, matrix, delta, n_fitted, inverted=None):
+    if inverted is None and matrix is not None:
+        inverted = InvertedIndex(matrix)
+        for i in range(delta.shape[0] if delta is not None else 0):
+            inverted.add(delta[i])
+    return _ScoringState(vectorizer, matrix, delta, n_fitted, inverted, {})
+
+
+class _LazyVectorizer:
+    """A snapshot's fitted vectorizer, rebuilt on first use so loading an index does not import sklearn."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._vectorizer = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._vectorizer is None:
+            with self._lock:
+                if self._vectorizer is None:
+                    self._vectorizer = self._factory()
+        return self._vectorizer
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def _full_matrix(state):
+    import scipy.sparse as sp
+    return state.matrix if state.delta is None else sp.vstack([state.matrix, state.delta]).tocsr()
+
+
+def index_path_for(data_file):
+    # faq_data.csv -> faq_data.faqsnap (disimpan di sebelah file sumber)
+    return faq_snapshot.snapshot_path_for(data_file)
+
+
+def frame_digest(faq_data):
+    import pandas as pd
+    digest = hashlib.sha1("\x1f".join(map(str, faq_data.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(faq_data, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def _text(value):
+    # Sel kosong dari CSV/SQL (None atau NaN) menjadi teks kosong, tanpa perlu pandas
+    return "" if value is None or (isinstance(value, float) and value != value) else str(value)
+
+
+def faq_key(question):
+    # Id FAQ tanpa kolom id: tetap sama walau baris lain ditambah, dihapus atau diurutkan ulang
+    text = " ".join(_text(question).casefold().split())
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _make_vectorizer(vectorizer_params):
+    # sklearn (~1 detik) baru diimpor saat indeks pertama dibangun atau dimuat,
+    # bukan saat modul ini diimpor
+    params = dict(vectorizer_params)
+    if params.pop("mode", "word") == "char":
+        import text_features
+        return text_features.HashedTfidfVectorizer(**params)
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(**params)
+
+
+@tracing.traced("faq_index.fit")
+def _fit(vectorizer_params, questions):
+    vectorizer = _make_vectorizer(vectorizer_params)
+    try:
+        # Baris matriks sudah dinormalisasi L2, jadi dot product == cosine
+        return vectorizer, vectorizer.fit_transform(questions)
+    except ValueError as e:
+        # Misalnya semua pertanyaan hanya berisi stop words
+        logger.warning(f"Gagal membangun indeks TF-IDF: {e}")
+        return None, None
+
+
+def _unrepresented(vectorizer, questions):
+    # Ada token di luar vocabulary_: kata itu hilang dari vektornya (bisa sampai vektor kosong)
+    vocabulary = getattr(vectorizer, "vocabulary_", None)
+    if vocabulary is None:
+        return False  # n-gram ter-hash (mode char) tidak punya kosakata tetap; n-gram baru tetap berbobot
+    analyzer = vectorizer.build_analyzer()
+    return any(term not in vocabulary for question in questions for term in analyzer(question))
+
+
+class FaqIndex:
+    """TF-IDF index over the FAQ questions, fitted once and reused per query.
+
+    Rows added with :meth:`add` are vectorized with the current vocabulary and
+    IDF weights; the index is refitted in the background once more than
+    ``staleness_budget`` rows are stale or the oldest stale row is older than
+    ``compact_interval`` seconds. A row with words the vocabulary does not
+    know would not be found by its own question, so it is refitted at once.
+    """
+
+    def __init__(self, faq_data=None, source_hash=None, **vectorizer_params):
+        # faq_data None: indeks kosong, mis. sebelum load() mengisinya dari snapshot (tanpa pandas)
+        self.columns = {} if faq_data is None else {col: faq_data[col].tolist() for col in faq_data.columns}
+        self.source_hash = source_hash or (None if faq_data is None else frame_digest(faq_data))
+        self.vectorizer_params = vectorizer_params
+        self.staleness_budget = STALENESS_BUDGET
+        self.compact_interval = COMPACT_INTERVAL
+        self.strategy = SEARCH_STRATEGY
+        self.version = 0
+        # (path, fungsi hash sumber) untuk menyimpan hasil compaction, None = tidak disimpan
+        self.persist = None
+        # Snapshot asal/tujuan indeks ini; file turunan (mis. embedding) disimpan di sebelahnya
+        self.snapshot_path = None
+        self._lock = threading.RLock()
+        self._compacting = False
+        self._stale_since = None
+        self._question_set = None
+        self._faq_rows = None
+        self._tag_rows = None
+        vectorizer, matrix = _fit(vectorizer_params, self._questions(len(self))) if len(self) else (None, None)
+        self._state = _scoring_state(vectorizer, matrix, None, len(self))
+
+    def __len__(self):
+        return len(self.columns.get("question", ()))
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    @property
+    def threshold(self):
+        # Threshold jawaban untuk mode pencocokan indeks ini (lihat THRESHOLDS)
+        return THRESHOLDS.get(self.vectorizer_params.get("mode", "word"), SIMILARITY_THRESHOLD)
+
+    @property
+    def suggestion_threshold(self):
+        return SUGGESTION_THRESHOLDS.get(self.vectorizer_params.get("mode", "word"), SUGGESTION_THRESHOLD)
+
+    def prepare(self):
+        """Build the vectorizer deferred by :meth:`load`, e.g. from a warm-up thread."""
+        vectorizer = self._state.vectorizer
+        if isinstance(vectorizer, _LazyVectorizer):
+            vectorizer.get()
+
+    @property
+    def cache_version(self):
+        # Berubah setiap kali isi indeks atau bobotnya berubah
+        return (self.source_hash, self.version)
+
+    @property
+    def stale_rows(self):
+        return len(self) - self._state.n_fitted
+
+    def _questions(self, stop, start=0):
+        return [_text(q) for q in self.columns.get("question", [])[start:stop]]
+
+    def contains_question(self, question):
+        with self._lock:
+            if self._question_set is None:
+                self._question_set = set(self.columns.get("question", []))
+            return question in self._question_set
+
+    def transform(self, text):
+        return self._state.vectorizer.transform([text])
+
+    def _dense_scores(self, state, query):
+        query = query.T
+        scores = state.matrix.dot(query).toarray().ravel()
+        if state.delta is not None:
+            scores = np.concatenate([scores, state.delta.dot(query).toarray().ravel()])
+        return scores
+
+    # -- partisi per tag -------------------------------------------------------
+
+    def _tag_rows_map(self):
+        with self._lock:
+            if self._tag_rows is None:
+                tag_rows = {}
+                for row, tag in enumerate(self.columns.get("tag", [])):
+                    if isinstance(tag, str) and tag.strip():
+                        tag_rows.setdefault(tag, []).append(row)
+                self._tag_rows = tag_rows
+            return self._tag_rows
+
+    def tags(self):
+        return sorted(self._tag_rows_map())
+
+    def _partition(self, state, tag):
+        # Sub-indeks untuk satu tag: (baris global, InvertedIndex atas baris-baris itu)
+        with self._lock:
+            partition = state.derived.get(("tag", tag))
+            if partition is None:
+                rows = [row for row in self._tag_rows_map().get(tag, []) if row < state.inverted.n_docs]
+                matrix = _full_matrix(state)[rows] if rows else None
+                partition = (rows, InvertedIndex(matrix) if matrix is not None else None)
+                state.derived[("tag", tag)] = partition
+            return partition
+
+    def _centroids(self, state):
+        # Centroid ternormalisasi per tag untuk klasifikasi topik yang ringan
+        with self._lock:
+            centroids = state.derived.get("centroids")
+            if centroids is None:
+                tag_rows = {tag: [row for row in rows if row < state.inverted.n_docs]
+                            for tag, rows in self._tag_rows_map().items()}
+                tags = [tag for tag, rows in tag_rows.items() if rows]
+                if tags:
+                    import scipy.sparse as sp
+                    from sklearn.preprocessing import normalize
+                    indicator = sp.lil_matrix((len(tags), state.inverted.n_docs))
+                    for i, tag in enumerate(tags):
+                        indicator[i, tag_rows[tag]] = 1.0
+                    centroids = (tags, normalize(indicator.tocsr().dot(_full_matrix(state))))
+                else:
+                    centroids = ([], None)
+                state.derived["centroids"] = centroids
+            return centroids
+
+    def classify_tag(self, user_input):
+        """Return ``(tag, score)`` of the closest tag centroid, or ``(None, 0.0)``."""
+        state = self._state
+        if state.vectorizer is None:
+            return None, 0.0
+        return self._classify(state, state.vectorizer.transform([user_input]))
+
+    def _classify(self, state, query):
+        tags, centroids = self._centroids(state)
+        if centroids is None:
+            return None, 0.0
+        scores = centroids.dot(query.T).toarray().ravel()
+        best = int(scores.argmax())
+        return tags[best], float(scores[best])
+
+    # -- pencarian -------------------------------------------------------------
+
+    def _search_global(self, state, query, k, threshold):
+        if self.strategy == "inverted":
+            return state.inverted.search(query, k, threshold)
+        scores = self._dense_scores(state, query)
+        rows = np.flatnonzero(scores >= threshold)
+        rows = rows[np.lexsort((rows, -scores[rows]))][:k]
+        return [(int(row), float(scores[row])) for row in rows]
+
+    def search(self, user_input, k=1, threshold=None, tag=None, classify=False, fallback_threshold=None):
+        """Return the top ``k`` ``(row, score)`` pairs scoring at least ``threshold``.
+
+        With ``tag`` (or ``classify=True``, which picks the tag from the
+        closest tag centroid) only that tag's rows are scored; when the best
+        of them is under ``fallback_threshold`` the whole index is searched.
+        Both default to :attr:`threshold`.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        fallback_threshold = self.threshold if fallback_threshold is None else fallback_threshold
+        self.maybe_compact()
+        state = self._state
+        if state.vectorizer is None:
+            return []
+        with tracing.span("faq_index.transform"):
+            query = state.vectorizer.transform([user_input])
+        with tracing.span("faq_index.score"):
+            if tag is None and classify:
+                tag, tag_score = self._classify(state, query)
+                if tag_score < TAG_CLASSIFIER_THRESHOLD:
+                    tag = None
+            if tag is not None:
+                rows, inverted = self._partition(state, tag)
+                if inverted is not None:
+                    results = [(rows[doc], score) for doc, score in inverted.search(query, k, threshold)]
+                    if results and results[0][1] >= fallback_threshold:
+                        return results
+            return self._search_global(state, query, k, threshold)
+
+    def match(self, user_input, tag=None, classify=False, threshold=None):
+        """Return ``(row, score)`` of the best FAQ, which may score under ``threshold``.
+
+        The search runs at ``threshold`` (default :attr:`threshold`) so
+        MaxScore can stop early. Only on a miss is the best sub-threshold
+        candidate looked up with a second, unbounded search, so the score
+        reported to analytics is the real best score; ``(None, 0.0)`` when no
+        question shares a term with the input.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        results = self.search(user_input, k=1, threshold=threshold, tag=tag, classify=classify,
+                              fallback_threshold=threshold)
+        if not results and threshold > 0:
+            results = self.search(user_input, k=1, threshold=0.0, tag=tag, classify=classify,
+                                  fallback_threshold=threshold)
+        return results[0] if results else (None, 0.0)
+
+    def lookup(self, user_input, tag=None, classify=False, threshold=None):
+        # (jawaban, skor, faq_id); jawaban None di bawah threshold, skor/faq_id tetap kandidat terbaik (lihat match)
+        threshold = self.threshold if threshold is None else threshold
+        row, score = self.match(user_input, tag, classify, threshold)
+        if row is None or score <= 0:
+            return None, 0.0, None
+        answer = self.columns["answer"][row] if score >= threshold else None
+        return answer, score, self.faq_id(row)
+
+    def faq_id(self, row):
+        # Kolom id dari tabel faq bila ada, selain itu hash pertanyaannya (faq_key)
+        if "id" in self.columns:
+            faq_id = self.columns["id"][row]
+            return faq_id.item() if hasattr(faq_id, "item") else faq_id
+        return faq_key(self.columns["question"][row])
+
+    def question_for(self, faq_id):
+        """Question of the row whose :meth:`faq_id` is ``faq_id`` (compared as text), or None."""
+        with self._lock:
+            if self._faq_rows is None:
+                self._faq_rows = {str(self.faq_id(row)): row for row in range(len(self))}
+            row = self._faq_rows.get(str(faq_id))
+        return None if row is None else self.columns["question"][row]
+
+    @tracing.traced("faq_index.answer_batch")
+    def answer_batch(self, questions, threshold=None, chunk_size=1024):
+        """Answer many questions with one sparse product per chunk.
+
+        Returns ``(answer, score, faq_id)`` per question. ``score`` and
+        ``faq_id`` describe the best match even when it is under
+        ``threshold`` (default :attr:`threshold`), in which case ``answer`` is None.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        state = self._state
+        if state.vectorizer is None:
+            return [(None, 0.0, None)] * len(questions)
+        import scipy.sparse as sp
+        questions = [_text(q) for q in questions]
+        results = []
+        for start in range(0, len(questions), chunk_size):
+            queries = state.vectorizer.transform(questions[start:start + chunk_size])
+            blocks = [queries.dot(m.T) for m in (state.matrix, state.delta) if m is not None]
+            scores = sp.hstack(blocks).tocsr() if len(blocks) > 1 else blocks[0].tocsr()
+            # Indeks terurut agar argmax memilih baris paling awal saat skor sama
+            scores.sort_indices()
+            best_rows = np.asarray(scores.argmax(axis=1)).ravel()
+            best_scores = scores.max(axis=1).toarray().ravel()
+            for row, score in zip(best_rows, best_scores):
+                if score <= 0:
+                    results.append((None, 0.0, None))
+                    continue
+                answer = self.columns["answer"][row] if score >= threshold else None
+                results.append((answer, float(score), self.faq_id(int(row))))
+        return results
+
+    def browse(self, after=-1, limit=50, search=None, tag=None):
+        """One page of FAQ rows positioned after row ``after`` (keyset pagination).
+
+        Returns ``(rows, next_after)``: each row is a dict of the FAQ columns
+        plus its ``row`` position, and ``next_after`` is the cursor for the
+        next page, or None on the last one. ``search`` is a case-insensitive
+        substring of the question or answer; ``tag`` only walks that tag's rows.
+        """
+        if tag:
+            tag_rows = self._tag_rows_map().get(tag, [])
+            candidates = (tag_rows[i] for i in range(bisect.bisect_right(tag_rows, after), len(tag_rows)))
+        else:
+            candidates = range(after + 1, len(self))
+        needle = search.casefold() if search else None
+        fields = [self.columns[col] for col in ("question", "answer") if col in self.columns]
+        page = []
+        for row in candidates:
+            if needle and not any(isinstance(values[row], str) and needle in values[row].casefold()
+                                  for values in fields):
+                continue
+            if len(page) == limit:
+                return page, page[-1]["row"]
+            page.append(dict({col: values[row] for col, values in self.columns.items()}, row=row))
+        return page, None
+
+    def suggestions(self, user_input, k=3, threshold=None):
+        # Pertanyaan FAQ yang mirip untuk ditawarkan sebagai "mungkin maksud Anda"
+        threshold = self.suggestion_threshold if threshold is None else threshold
+        return [self.columns["question"][row] for row, _ in self.search(user_input, k, threshold)]
+
+    def add(self, row):
+        """Append one FAQ row without refitting the vocabulary or the IDF weights."""
+        self.add_many([row])
+
+    @tracing.traced("faq_index.add")
+    def add_many(self, rows):
+        """Append FAQ rows with one transform for the whole batch (see :meth:`add`)."""
+        rows = list(rows)
+        if not rows:
+            return
+        with self._lock:
+            start = len(self)
+            new_tags = {}
+            for row in rows:
+                n_rows = len(self)
+                for col in set(self.columns) | set(row):
+                    values = self.columns.setdefault(col, [None] * n_rows)
+                    values.append(row.get(col))
+                if self._question_set is not None:
+                    self._question_set.add(row.get("question"))
+                if self._faq_rows is not None:
+                    self._faq_rows[str(self.faq_id(n_rows))] = n_rows
+                tag = row.get("tag")
+                if isinstance(tag, str) and tag.strip():
+                    new_tags.setdefault(tag, []).append(n_rows)
+            new_tag = False
+            if self._tag_rows is not None:
+                for tag, tag_rows in new_tags.items():
+                    new_tag = new_tag or tag not in self._tag_rows
+                    self._tag_rows.setdefault(tag, []).extend(tag_rows)
+            self.version += 1
+            state = self._state
+            if state.vectorizer is None:
+                # Belum ada kosakata sama sekali: fit langsung, korpusnya masih kecil
+                vectorizer, matrix = _fit(self.vectorizer_params, self._questions(len(self)))
+                self._state = _scoring_state(vectorizer, matrix, None, len(self))
+                return
+            import scipy.sparse as sp
+            questions = self._questions(len(self), start)
+            vectors = state.vectorizer.transform(questions).tocsr()
+            unknown = _unrepresented(state.vectorizer, questions)
+            delta = vectors if state.delta is None else sp.vstack([state.delta, vectors]).tocsr()
+            # Posting list ditambah dulu, baru state diganti; query lama tetap konsisten
+            for i in range(vectors.shape[0]):
+                state.inverted.add(vectors[i])
+            for tag, tag_rows in new_tags.items():
+                partition = state.derived.get(("tag", tag))
+                if partition is not None and partition[1] is not None:
+                    for row in tag_rows:
+                        partition[1].add(vectors[row - start])
+                        partition[0].append(row)
+                elif partition is not None:
+                    del state.derived[("tag", tag)]
+            if new_tag:
+                # Centroid lama tidak mengenal tag baru; bangun ulang saat dibutuhkan
+                state.derived.pop("centroids", None)
+            self._state = state._replace(delta=delta)
+            if self._stale_since is None:
+                self._stale_since = time.monotonic()
+        if unknown:
+            # Kata baru belum punya bobot: fit ulang sekarang agar FAQ ini langsung bisa dijawab
+            tracing.incr("faq_index.compact_unknown_terms")
+            self.compact()
+        else:
+            # Compaction berkala ada di jalur tulis: cek anggaran baris basi setiap batch
+            self.maybe_compact()
+
+    def maybe_compact(self):
+        stale_since = self._stale_since
+        if stale_since is None or self._compacting:
+            return
+        if (self.stale_rows > self.staleness_budget
+                or time.monotonic() - stale_since > self.compact_interval):
+            self.compact(background=True)
+
+    def compact(self, background=False):
+        """Refit the vocabulary and IDF weights over every row, including stale ones."""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        if background:
+            threading.Thread(target=self._compact, name="faq-index-compact", daemon=True).start()
+        else:
+            self._compact()
+
+    @tracing.traced("faq_index.compact")
+    def _compact(self):
+        again = False
+        try:
+            # _LOCK ikut dipegang agar hash file cocok dengan baris yang di-snapshot
+            with _LOCK, self._lock:
+                n_rows = len(self)
+                questions = self._questions(n_rows)
+                source_hash = self.persist[1]() if self.persist else None
+            vectorizer, matrix = _fit(self.vectorizer_params, questions)
+            with self._lock:
+                # Baris yang masuk selama fit ditransformasi dengan vectorizer baru
+                delta = None
+                if vectorizer is not None and len(self) > n_rows:
+                    questions = self._questions(len(self), n_rows)
+                    delta = vectorizer.transform(questions).tocsr()
+                    again = _unrepresented(vectorizer, questions)
+                self._state = _scoring_state(vectorizer, matrix, delta, n_rows)
+                self._stale_since = time.monotonic() if delta is not None else None
+                self.version += 1
+                if source_hash:
+                    self.source_hash = source_hash
+            if source_hash and delta is None:
+                self.save(self.persist[0])
+            logger.info(f"Indeks FAQ di-compact ({n_rows} baris).")
+        except Exception as e:
+            logger.error(f"Compaction indeks FAQ gagal: {e}")
+        finally:
+            self._compacting = False
+        if again:
+            # Baris dengan kata baru masuk selama fit berjalan
+            self.compact(background=True)
+
+    @tracing.traced("faq_index.save")
+    def save(self, path):
+        """Write the index as a binary snapshot (see faq_snapshot) next to its source."""
+        with self._lock:
+            state = self._state
+            columns = {col: list(values) for col, values in self.columns.items()}
+            header = {
+                "source_hash": self.source_hash,
+                "vectorizer_params": faq_snapshot.normalize_params(self.vectorizer_params),
+                "n_rows": len(self),
+                "n_fitted": state.n_fitted,
+                "fitted": state.vectorizer is not None,
+            }
+        arrays = {}
+        if state.vectorizer is not None:
+            vocabulary = getattr(state.vectorizer, "vocabulary_", None)
+            if vocabulary is not None:
+                vocabulary = sorted(vocabulary, key=vocabulary.get)
+                header["n_features"] = len(vocabulary)
+                arrays["vocabulary"] = faq_snapshot.encode_string_list(vocabulary)
+                arrays["idf"] = state.vectorizer.idf_
+            else:
+                # Mode char: ruang fitur ter-hash, tidak ada kosakata yang perlu disimpan. Hampir semua
+                # fitur tidak pernah muncul dan memiliki IDF maksimum yang sama; hanya sisanya disimpan
+                header["n_features"] = state.vectorizer.n_features
+                idf = state.vectorizer.idf_
+                header["idf_default"] = float(idf.max())
+                terms = np.flatnonzero(idf != idf.max()).astype(np.int32)
+                arrays["idf:terms"], arrays["idf:values"] = terms, idf[terms]
+            for prefix, matrix in (("matrix", state.matrix), ("delta", state.delta)):
+                if matrix is None:
+                    continue
+                # int32 bila muat, agar scipy tidak perlu menyalin array saat dimuat
+                index_dtype = np.int32 if matrix.nnz < 2 ** 31 else np.int64
+                arrays[f"{prefix}:indptr"] = matrix.indptr.astype(index_dtype)
+                arrays[f"{prefix}:indices"] = matrix.indices.astype(index_dtype)
+                arrays[f"{prefix}:data"] = matrix.data
+            full = _full_matrix(state)
+            for name, array in InvertedIndex(full).arrays().items():
+                arrays[f"postings:{name}"] = array
+        faq_snapshot.write_snapshot(path, header, columns, arrays)
+
+    @classmethod
+    @tracing.traced("faq_index.snapshot_load")
+    def load(cls, path, source_hash, **vectorizer_params):
+        # Hanya pakai snapshot bila dibangun dari data dan parameter yang sama
+        try:
+            snapshot = faq_snapshot.Snapshot(path)
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Snapshot indeks FAQ {path} tidak bisa dibaca: {e}")
+            return None
+        header = snapshot.header
+        if (header.get("source_hash") != source_hash
+                or header.get("vectorizer_params") != faq_snapshot.normalize_params(vectorizer_params)):
+            return None
+        if header["fitted"] and not snapshot.has_array("postings:terms"):
+            # Snapshot lama dengan posting list penuh per fitur: dibangun ulang dalam format ringkas
+            return None
+        index = cls(None, source_hash=source_hash, **vectorizer_params)
+        index.columns = snapshot.columns
+        index.snapshot_path = path
+        if header["fitted"]:
+            def fitted_vectorizer():
+                vectorizer = _make_vectorizer(vectorizer_params)
+                if snapshot.has_array("vocabulary"):
+                    vectorizer.vocabulary_ = {term: i for i, term in enumerate(snapshot.strings("vocabulary"))}
+                if snapshot.has_array("idf"):
+                    vectorizer.idf_ = snapshot.array("idf")
+                else:
+                    idf = np.full(n_features, header["idf_default"], dtype=snapshot.array("idf:values").dtype)
+                    idf[snapshot.array("idf:terms")] = snapshot.array("idf:values")
+                    vectorizer.idf_ = idf
+                return vectorizer
+
+            n_features = header["n_features"]
+
+            def matrix(prefix, n_rows):
+                import scipy.sparse as sp
+                if not snapshot.has_array(f"{prefix}:data"):
+                    return None
+                return sp.csr_matrix((snapshot.array(f"{prefix}:data"),
+                                      snapshot.array(f"{prefix}:indices"),
+                                      snapshot.array(f"{prefix}:indptr")), shape=(n_rows, n_features))
+
+            n_fitted = header["n_fitted"]
+            inverted = InvertedIndex.from_arrays(
+                header["n_rows"], n_features, snapshot.array("postings:terms"), snapshot.array("postings:indptr"),
+                snapshot.array("postings:docs"), snapshot.array("postings:weights"),
+                snapshot.array("postings:max_weight"))
+            index._state = _scoring_state(_LazyVectorizer(fitted_vectorizer), matrix("matrix", n_fitted),
+                                          matrix("delta", header["n_rows"] - n_fitted), n_fitted, inverted)
+            if index.stale_rows:
+                index._stale_since = time.monotonic()
+        return index
+
+
+@tracing.traced("faq_index.build")
+def _build(faq_data, source_hash, index_path, vectorizer_params):
+    index = FaqIndex(faq_data, source_hash=source_hash, **vectorizer_params)
+    index.snapshot_path = index_path
+    try:
+        index.save(index_path)
+    except OSError as e:
+        logger.warning(f"Gagal menyimpan indeks FAQ ke {index_path}: {e}")
+    logger.info(f"Indeks FAQ dibangun ulang ({len(index)} baris).")
+    return index
+
+
+def _file_signature(data_file):
+    try:
+        stat = os.stat(data_file)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+def _csv_key(data_file, vectorizer_params):
+    return ("csv", os.path.abspath(data_file), repr(sorted(vectorizer_params.items())))
+
+
+def get_csv_index(data_file, loader, **vectorizer_params):
+    """Return the index for ``data_file``, rebuilding it only when the file changed.
+
+    ``loader`` is called to read the CSV when the index has to be rebuilt.
+    """
+    signature = _file_signature(data_file)
+    key = _csv_key(data_file, vectorizer_params)
+    with _LOCK:
+        cached = _INDEXES.get(key)
+        if cached and signature is not None and cached[0] == signature:
+            return cached[1]
+
+        source_hash = file_digest(data_file) if signature is not None else None
+        if cached and source_hash is not None and cached[1].source_hash == source_hash:
+            index = cached[1]
+        else:
+            index_path = index_path_for(data_file)
+            index = FaqIndex.load(index_path, source_hash, **vectorizer_params) if source_hash else None
+            if index is None:
+                index = _build(loader(), source_hash, index_path, vectorizer_params)
+            index.persist = (index_path, lambda: file_digest(data_file))
+        _INDEXES[key] = (signature, index)
+        return index
+
+
+@tracing.traced("faq_index.append_csv_row")
+def append_csv_row(data_file, row, **vectorizer_params):
+    """Append one FAQ row to ``data_file`` and to its live index in O(1).
+
+    The cached index is only updated when it was in sync with the file before
+    the append; otherwise the next :func:`get_csv_index` rebuilds it.
+    """
+    key = _csv_key(data_file, vectorizer_params)
+    with _LOCK:
+        signature = _file_signature(data_file)
+        table = storage.CsvTable(data_file, list(row))
+        header = table.header()
+        table.insert(row)
+
+        cached = _INDEXES.get(key)
+        if cached and signature is not None and cached[0] == signature:
+            index = cached[1]
+            index.add({col: row.get(col) for col in header})
+            _INDEXES[key] = (_file_signature(data_file), index)
+
+
+def get_store_index(table, index_path, **vectorizer_params):
+    """Return the index for a ``storage`` table, reading it only when its version changed.
+
+    Unchanged tables cost one ``table.version()`` call. When a SQL table only
+    gained rows since the last call, just ``rows_after`` the last indexed id
+    is read and added; anything else (deletes, updates) reloads the table.
+    """
+    version = table.version()
+    key = ("store", table.key, os.path.abspath(index_path), repr(sorted(vectorizer_params.items())))
+    with _LOCK:
+        cached = _INDEXES.get(key)
+        if cached and version is not None and cached[0] == version:
+            return cached[1]
+        if (cached and version is not None and hasattr(table, "rows_after")
+                and table.appended_only(cached[0], version, len(cached[1]))):
+            index = cached[1]
+            rows = [dict(zip(table.columns, row)) for row in table.rows_after(cached[0][-1] or 0, table.columns)]
+            index.add_many(rows)
+            last_id = rows[-1]["id"] if rows else cached[0][-1]
+            _INDEXES[key] = (version[:-1] + (last_id,), index)
+            return index
+        faq_data = table.rows()
+        source_hash = frame_digest(faq_data)
+        index = FaqIndex.load(index_path, source_hash, **vectorizer_params)
+        if index is None:
+            index = _build(faq_data, source_hash, index_path, vectorizer_params)
+        if version is not None and hasattr(table, "rows_after") and "id" in faq_data.columns:
+            # Id terbesar yang benar-benar dibaca, bukan yang dilihat version()
+            last_id = int(faq_data["id"].max()) if len(faq_data) else None
+            version = version[:-1] + (last_id,)
+        _INDEXES[key] = (version, index)
+        return index
@@ -0,0 +1,337 @@
+"""Headless HTTP/JSON answering service on top of faq_index (stdlib asyncio only).
+
+    python faq_service.py --port 8080
+
+Endpoints::
+
+    POST /answer           {"question": "...", "tag": null, "classify": false}
+    POST /answer/batch     {"questions": ["...", ...]}
+    POST /submit_question  {"question": "..."}
+    GET  /tags, /health, /metrics
+
+Scoring runs in a thread pool so the event loop only parses and writes
+HTTP. The index is polled every ``CHATBOT_SERVICE_POLL_INTERVAL`` seconds
+and swapped in when faq_data.csv changes, so requests never wait on a
+rebuild. The Streamlit app talks to it through :class:`ServiceClient` when
+``CHATBOT_SERVICE_URL`` is set; ``/answer`` calls are then recorded by
+analytics here rather than in the app.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import analytics
+import answer_cache
+import append_log
+import faq_index
+import tracing
+
+logger = logging.getLogger(__name__)
+
+DATA_FILE = os.environ.get("CHATBOT_FAQ_FILE", "faq_data.csv")
+USER_QUESTIONS_FILE = os.environ.get("CHATBOT_USER_QUESTIONS_FILE", "user_questions.csv")
+# Sama dengan chatbot_with_faq.py agar snapshot indeks bisa dipakai bersama
+FAQ_INDEX_PARAMS = faq_index.CHAR_MODE_PARAMS if faq_index.MATCH_MODE == "char" else {"stop_words": "english"}
+SERVICE_WORKERS = int(os.environ.get("CHATBOT_SERVICE_WORKERS", 4))
+POLL_INTERVAL = float(os.environ.get("CHATBOT_SERVICE_POLL_INTERVAL", 2.0))
+# Batas waktu klien (detik) sebelum aplikasi kembali memakai indeks lokal
+SERVICE_TIMEOUT = float(os.environ.get("CHATBOT_SERVICE_TIMEOUT", 2.0))
+MAX_BODY = 1024 * 1024
+MAX_BATCH = 10000
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _text(body, field):
+    value = body.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise HttpError(400, f"'{field}' harus berupa teks yang tidak kosong")
+    return value
+
+
+def _optional_text(body, field):
+    # Kosong atau tidak ada berarti None; selain itu harus teks
+    value = body.get(field)
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        raise HttpError(400, f"'{field}' harus berupa teks atau null")
+    return value
+
+
+class FaqService:
+    def __init__(self, data_file=DATA_FILE, questions_file=USER_QUESTIONS_FILE,
+                 workers=SERVICE_WORKERS, poll_interval=POLL_INTERVAL):
+        self.data_file = data_file
+        self.questions_file = questions_file
+        self.poll_interval = poll_interval
+        self.index = None
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="faq-service")
+        self._submit_lock = threading.Lock()
+        self._requests = {}
+        self._routes = {
+            "/answer": ("POST", self.answer),
+            "/answer/batch": ("POST", self.answer_batch),
+            "/submit_question": ("POST", self.submit_question),
+            "/tags": ("GET", self.tags),
+            "/health": ("GET", self.health),
+            "/metrics": ("GET", self.metrics),
+        }
+
+    # -- indeks ----------------------------------------------------------------
+
+    def _read_faq(self):
+        import pandas as pd
+        try:
+            return pd.read_csv(self.data_file)
+        except Exception as e:
+            logger.error(f"Gagal memuat file FAQ: {e}")
+            return pd.DataFrame({"tag": [], "question": [], "answer": []})
+
+    def _load(self):
+        return faq_index.get_csv_index(self.data_file, self._read_faq, **FAQ_INDEX_PARAMS)
+
+    async def _watch(self):
+        # get_csv_index hanya membangun ulang bila signature file berubah
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                index = await loop.run_in_executor(self._executor, self._load)
+            except Exception:
+                logger.exception("Gagal memuat ulang indeks FAQ")
+                continue
+            if index is not self.index:
+                logger.info(f"Indeks FAQ diganti ({len(index)} baris).")
+                self.index = index
+
+    # -- handler (berjalan di thread pool) ---------------------------------------
+
+    def answer(self, body):
+        question = _text(body, "question")
+        tag = _optional_text(body, "tag")
+        index = self.index
+        with tracing.request("service.answer"):
+            started = time.perf_counter()
+            answer, score, faq_id = answer_cache.cached_answer(index, question, tag=tag,
+                                                               classify=bool(body.get("classify")))
+            analytics.emit(answer_cache.normalize_query(question), score, faq_id, answer is not None,
+                           (time.perf_counter() - started) * 1000)
+            result = {"answer": answer, "score": score, "faq_id": faq_id}
+            if answer is None:
+                result["suggestions"] = index.suggestions(question)
+        return result
+
+    def answer_batch(self, body):
+        questions = body.get("questions")
+        if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+            raise HttpError(400, "'questions' harus berupa daftar teks")
+        if len(questions) > MAX_BATCH:
+            raise HttpError(413, f"Maksimal {MAX_BATCH} pertanyaan per batch")
+        with tracing.request("service.answer_batch"):
+            results = self.index.answer_batch(questions)
+        return {"results": [{"answer": answer, "score": score, "faq_id": faq_id}
+                            for answer, score, faq_id in results]}
+
+    def submit_question(self, body):
+        question = _text(body, "question")
+        log = append_log.open_log(self.questions_file, ["question"])
+        with self._submit_lock:
+            if log.contains("question", question):
+                return {"status": "duplicate"}
+            log.append({"question": question})
+            log.flush()
+        return {"status": "submitted"}
+
+    def tags(self, body):
+        return {"tags": self.index.tags()}
+
+    def health(self, body):
+        return {"status": "ok", "faq_rows": len(self.index), "stale_rows": self.index.stale_rows}
+
+    def metrics(self, body):
+        lines = ["# TYPE faq_service_requests_total counter"]
+        for (path, status), count in sorted(self._requests.items()):
+            lines.append(f'faq_service_requests_total{{path="{path}",status="{status}"}} {count}')
+        lines.append("# TYPE faq_answer_cache gauge")
+        for name, value in answer_cache.answer_cache.stats().items():
+            lines.append(f'faq_answer_cache{{stat="{name}"}} {value}')
+        return "\n".join(lines) + "\n" + tracing.render_prometheus()
+
+    # -- HTTP ----------------------------------------------------------------------
+
+    async def dispatch(self, method, path, body):
+        route = self._routes.get(path)
+        if route is None:
+            return 404, {"error": f"Path {path} tidak dikenal"}
+        expected, handler = route
+        if method != expected:
+            return 405, {"error": f"Gunakan {expected} untuk {path}"}
+        if self.index is None:
+            return 503, {"error": "Indeks FAQ belum siap"}
+        # Hanya parsing body yang dipetakan ke 400; ValueError dari handler tetap 500
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {"error": "Body bukan JSON yang valid"}
+        if not isinstance(data, dict):
+            return 400, {"error": "Body harus berupa objek JSON"}
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, handler, data)
+        except HttpError as e:
+            return e.status, {"error": e.message}
+        except Exception:
+            logger.exception(f"Gagal memproses {path}")
+            return 500, {"error": "Kesalahan internal"}
+        return 200, result
+
+    async def _send(self, writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            content_type, data = "text/plain; version=0.0.4", payload.encode("utf-8")
+        else:
+            content_type, data = "application/json", json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    async def handle(self, reader, writer):
+        # Satu koneksi bisa membawa banyak request (HTTP/1.1 keep-alive)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._send(writer, 400, {"error": "Request line tidak valid"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY:
+                    await self._send(writer, 413 if length > MAX_BODY else 400,
+                                     {"error": "Content-Length tidak valid"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                path = target.split("?", 1)[0]
+                status, payload = await self.dispatch(method, path, body)
+                key = (path if path in self._routes else "other", status)
+                self._requests[key] = self._requests.get(key, 0) + 1
+                await self._send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host, port):
+        loop = asyncio.get_running_loop()
+        self.index = await loop.run_in_executor(self._executor, self._load)
+        server = await asyncio.start_server(self.handle, host, port)
+        watcher = asyncio.create_task(self._watch())
+        logger.info(f"Layanan FAQ berjalan di http://{host}:{port} ({len(self.index)} FAQ).")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self._executor.shutdown(wait=False)
+
+
+class ServiceError(Exception):
+    pass
+
+
+class ServiceClient:
+    """Blocking client for the service, used by the Streamlit app."""
+
+    def __init__(self, base_url, timeout=SERVICE_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, path, payload):
+        request = urllib.request.Request(
+            self.base_url + path, data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST")
+        return self._send(path, request)
+
+    def _get(self, path):
+        return self._send(path, urllib.request.Request(self.base_url + path, method="GET"))
+
+    def _send(self, path, request):
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except (OSError, ValueError) as e:
+            # URLError dan HTTPError adalah turunan OSError
+            raise ServiceError(f"Layanan FAQ {self.base_url}{path} gagal: {e}") from e
+
+    def answer(self, question, tag=None, classify=False):
+        """``{"answer", "score", "faq_id"}``, plus ``"suggestions"`` when there is no answer."""
+        return self._post("/answer", {"question": question, "tag": tag, "classify": classify})
+
+    def submit_question(self, question):
+        # "submitted", atau "duplicate" bila pertanyaan sudah pernah diajukan
+        return self._post("/submit_question", {"question": question})["status"]
+
+    def tags(self):
+        return self._get("/tags")["tags"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Layanan HTTP/JSON untuk menjawab pertanyaan FAQ.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--faq", default=DATA_FILE, help="file CSV FAQ (default: faq_data.csv)")
+    parser.add_argument("--questions", default=USER_QUESTIONS_FILE,
+                        help="file CSV pertanyaan user (default: user_questions.csv)")
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    service = FaqService(args.faq, args.questions, args.workers, args.poll_interval)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
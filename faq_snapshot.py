@@ -0,0 +1,226 @@
+"""Compact binary snapshot of a FAQ index, opened read-only with mmap.
+
+Layout::
+
+    b"FAQSNAP1" | uint32 header length | JSON header | padding | arrays...
+
+Every array starts on a 64-byte boundary and is described in the header by
+its offset, dtype and length, so loading is a matter of wrapping the mapped
+file with ``numpy.frombuffer`` -- nothing is copied or parsed up front.
+Several processes opening the same snapshot share it through the page cache.
+Text columns (questions, answers, tags, vocabulary) are stored as one UTF-8
+blob plus an int64 offsets array and are decoded on access.
+"""
+import abc
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"FAQSNAP1"
+SNAPSHOT_VERSION = 1
+_ALIGN = 64
+
+
+def snapshot_path_for(data_file):
+    # faq_data.csv -> faq_data.faqsnap (disimpan di sebelah file sumber)
+    root, _ = os.path.splitext(data_file)
+    return f"{root}.faqsnap"
+
+
+def normalize_params(params):
+    # Parameter dibandingkan dalam bentuk JSON (tuple -> list dsb.)
+    return json.loads(json.dumps(params, sort_keys=True))
+
+
+class MappedColumn(abc.ABC):
+    """Read-only column backed by the mapped file, with appended values kept in memory."""
+
+    def __init__(self):
+        self._extra = []
+
+    @abc.abstractmethod
+    def _base_len(self):
+        """Number of values stored in the mapped file."""
+
+    @abc.abstractmethod
+    def _get_base(self, i):
+        """Value ``i`` of the mapped file."""
+
+    def __len__(self):
+        return self._base_len() + len(self._extra)
+
+    def _get(self, i):
+        n_base = self._base_len()
+        return self._get_base(i) if i < n_base else self._extra[i - n_base]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._get(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._get(i)
+
+    def __iter__(self):
+        return (self._get(i) for i in range(len(self)))
+
+    def append(self, value):
+        self._extra.append(value)
+
+
+class MappedStrings(MappedColumn):
+    def __init__(self, blob, offsets, nulls):
+        super().__init__()
+        self._blob = blob
+        self._offsets = offsets
+        self._nulls = nulls
+
+    def _base_len(self):
+        return len(self._offsets) - 1
+
+    def _get_base(self, i):
+        if self._nulls[i]:
+            return None
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+
+class MappedInts(MappedColumn):
+    def __init__(self, values):
+        super().__init__()
+        self._values = values
+
+    def _base_len(self):
+        return len(self._values)
+
+    def _get_base(self, i):
+        return int(self._values[i])
+
+
+def _encode_strings(values):
+    nulls = np.zeros(len(values), dtype=np.uint8)
+    chunks = []
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    position = 0
+    for i, value in enumerate(values):
+        if value is None or (isinstance(value, float) and value != value):
+            nulls[i] = 1
+            encoded = b""
+        else:
+            encoded = str(value).encode("utf-8")
+        chunks.append(encoded)
+        position += len(encoded)
+        offsets[i + 1] = position
+    return np.frombuffer(b"".join(chunks), dtype=np.uint8), offsets, nulls
+
+
+def _is_int_column(values):
+    return len(values) > 0 and all(
+        isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values)
+
+
+def write_snapshot(path, header, columns, arrays):
+    """Atomically write a snapshot.
+
+    ``columns`` maps column name -> list of values, ``arrays`` maps name ->
+    numpy array; ``header`` is stored as JSON next to the array directory.
+    """
+    blobs = dict(arrays)
+    column_kinds = {}
+    for name, values in columns.items():
+        values = list(values)
+        if _is_int_column(values):
+            column_kinds[name] = "int"
+            blobs[f"col:{name}"] = np.asarray(values, dtype=np.int64)
+        else:
+            column_kinds[name] = "str"
+            blob, offsets, nulls = _encode_strings(values)
+            blobs[f"col:{name}:blob"] = blob
+            blobs[f"col:{name}:offsets"] = offsets
+            blobs[f"col:{name}:nulls"] = nulls
+
+    directory = {}
+    position = 0
+    for name, array in blobs.items():
+        array = np.ascontiguousarray(array)
+        blobs[name] = array
+        directory[name] = {"offset": position, "dtype": array.dtype.str, "length": int(array.size)}
+        position += array.nbytes
+        position += -position % _ALIGN
+
+    header = dict(header, snapshot_version=SNAPSHOT_VERSION, columns=column_kinds, arrays=directory)
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = len(MAGIC) + 4 + len(header_bytes)
+    data_start += -data_start % _ALIGN
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in blobs.items():
+            f.seek(data_start + directory[name]["offset"])
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Snapshot:
+    """A mapped snapshot: ``header``, ``array(name)`` and ``columns``."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} bukan snapshot FAQ")
+            try:
+                (header_length,) = struct.unpack("<I", f.read(4))
+            except struct.error:
+                raise ValueError(f"Header snapshot {path} terpotong") from None
+            self.header = json.loads(f.read(header_length).decode("utf-8"))
+            if self.header.get("snapshot_version") != SNAPSHOT_VERSION:
+                raise ValueError(f"Versi snapshot {path} tidak didukung")
+            data_start = len(MAGIC) + 4 + header_length
+            self._data_start = data_start + (-data_start % _ALIGN)
+            # File yang terpotong (mis. disk penuh saat disalin) ditolak di sini, bukan saat array dibaca
+            data_end = max((entry["offset"] + entry["length"] * np.dtype(entry["dtype"]).itemsize
+                            for entry in self.header["arrays"].values()), default=0)
+            if os.fstat(f.fileno()).st_size < self._data_start + data_end:
+                raise ValueError(f"Snapshot {path} terpotong")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def array(self, name):
+        entry = self.header["arrays"][name]
+        if not entry["length"]:
+            return np.zeros(0, dtype=np.dtype(entry["dtype"]))
+        return np.frombuffer(self._mmap, dtype=np.dtype(entry["dtype"]), count=entry["length"],
+                             offset=self._data_start + entry["offset"])
+
+    def has_array(self, name):
+        return name in self.header["arrays"]
+
+    @property
+    def columns(self):
+        columns = {}
+        for name, kind in self.header["columns"].items():
+            if kind == "int":
+                columns[name] = MappedInts(self.array(f"col:{name}"))
+            else:
+                columns[name] = MappedStrings(self.array(f"col:{name}:blob"),
+                                              self.array(f"col:{name}:offsets"),
+                                              self.array(f"col:{name}:nulls"))
+        return columns
+
+    def strings(self, name):
+        # Daftar string (misalnya kosakata) yang disimpan dipisah baris baru
+        text = self.array(name).tobytes().decode("utf-8")
+        return text.split("\n") if text else []
+
+
+def encode_string_list(values):
+    if any("\n" in value for value in values):
+        raise ValueError("string daftar tidak boleh mengandung baris baru")
+    return np.frombuffer("\n".join(values).encode("utf-8"), dtype=np.uint8)
@@ -0,0 +1,138 @@
+import numpy as np
+
+
+class InvertedIndex:
+    """Posting lists over the rows of an L2-normalized TF-IDF matrix.
+
+    Queries only touch the posting lists of their own terms. Terms are
+    visited in order of their maximum possible contribution (MaxScore): once
+    the remaining terms together cannot lift an unseen document over the
+    threshold, they only update documents that are already candidates, and
+    the search stops as soon as no candidate can still reach the threshold.
+    """
+
+    def __init__(self, matrix=None, n_features=0):
+        self.n_docs = 0
+        self.n_features = n_features
+        self._indptr = np.zeros(n_features + 1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.int64)
+        self._weights = np.zeros(0)
+        self._max_weight = np.zeros(n_features)
+        # Posting tambahan untuk dokumen yang masuk lewat add(): term -> ([doc], [bobot])
+        self._extra = {}
+        if matrix is not None:
+            self._build(matrix)
+
+    def _build(self, matrix):
+        csc = matrix.tocsc()
+        csc.sort_indices()
+        self.n_docs, self.n_features = csc.shape
+        self._indptr = csc.indptr.astype(np.int64)
+        self._docs = csc.indices.astype(np.int64)
+        self._weights = csc.data
+        self._max_weight = np.zeros(self.n_features)
+        nonempty = np.flatnonzero(np.diff(self._indptr))
+        if len(nonempty):
+            self._max_weight[nonempty] = np.maximum.reduceat(self._weights, self._indptr[nonempty])
+
+    @classmethod
+    def from_arrays(cls, n_docs, n_features, terms, indptr, docs, weights, max_weight):
+        """Rebuild an index from :meth:`arrays` (for example mapped from a snapshot).
+
+        ``docs`` and ``weights`` are used as they are; only the per-term
+        tables are expanded back to ``n_features`` entries in memory.
+        """
+        index = cls(n_features=n_features)
+        index.n_docs = n_docs
+        counts = np.zeros(n_features, dtype=np.int64)
+        counts[terms] = np.diff(indptr)
+        np.cumsum(counts, out=index._indptr[1:])
+        index._docs, index._weights = docs, weights
+        index._max_weight[terms] = max_weight
+        return index
+
+    def arrays(self):
+        """Posting lists of the terms that have any, for :meth:`from_arrays`.
+
+        With a hashed feature space most terms never occur, so the per-term
+        ``indptr`` and ``max_weight`` are stored for the used terms only.
+        """
+        if self._extra:
+            raise ValueError("posting tambahan belum digabung")
+        terms = np.flatnonzero(np.diff(self._indptr))
+        return {"terms": terms.astype(np.int32 if self.n_features < 2 ** 31 else np.int64),
+                "indptr": np.append(self._indptr[terms], self._indptr[-1]),
+                "docs": self._docs, "weights": self._weights, "max_weight": self._max_weight[terms]}
+
+    def add(self, vector):
+        """Append one document (a 1 x n_features sparse row) and return its id."""
+        doc_id = self.n_docs
+        vector = vector.tocsr()
+        for term, weight in zip(vector.indices, vector.data):
+            docs, weights = self._extra.setdefault(int(term), ([], []))
+            docs.append(doc_id)
+            weights.append(weight)
+            if weight > self._max_weight[term]:
+                self._max_weight[term] = weight
+        self.n_docs += 1
+        return doc_id
+
+    def postings(self, term):
+        start, end = self._indptr[term], self._indptr[term + 1]
+        docs, weights = self._docs[start:end], self._weights[start:end]
+        extra = self._extra.get(term)
+        if extra:
+            docs = np.concatenate([docs, np.asarray(extra[0], dtype=np.int64)])
+            weights = np.concatenate([weights, np.asarray(extra[1])])
+        return docs, weights
+
+    def search(self, query, k=1, threshold=0.0):
+        """Return up to ``k`` ``(doc_id, score)`` pairs scoring at least ``threshold``."""
+        query = query.tocsr()
+        if not query.nnz:
+            return []
+        terms, query_weights = query.indices, query.data
+        upper_bounds = query_weights * self._max_weight[terms]
+        order = np.argsort(-upper_bounds, kind="stable")
+        terms, query_weights, upper_bounds = terms[order], query_weights[order], upper_bounds[order]
+        # remaining[i] = skor maksimum yang masih bisa diberikan term ke-i dst.
+        remaining = np.append(np.cumsum(upper_bounds[::-1])[::-1], 0.0)
+        if remaining[0] < threshold or remaining[0] <= 0:
+            return []
+
+        candidates = np.zeros(0, dtype=np.int64)
+        scores = np.zeros(0)
+        # Term "esensial": dokumen baru masih bisa mencapai threshold lewat term ini
+        n_essential = 0
+        while n_essential < len(terms) and remaining[n_essential] >= max(threshold, 1e-12):
+            n_essential += 1
+        if n_essential:
+            docs, contributions = [], []
+            for term, weight in zip(terms[:n_essential], query_weights[:n_essential]):
+                term_docs, term_weights = self.postings(term)
+                docs.append(term_docs)
+                contributions.append(weight * term_weights)
+            candidates, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(contributions))
+
+        for i in range(n_essential, len(terms)):
+            # Buang kandidat yang tidak mungkin lagi mencapai threshold
+            keep = scores + remaining[i] >= threshold
+            if not keep.all():
+                candidates, scores = candidates[keep], scores[keep]
+            if not len(candidates):
+                return []
+            term_docs, term_weights = self.postings(terms[i])
+            pos = np.searchsorted(candidates, term_docs)
+            pos[pos == len(candidates)] = 0
+            hit = candidates[pos] == term_docs
+            scores[pos[hit]] += query_weights[i] * term_weights[hit]
+
+        keep = scores >= threshold
+        candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        # Skor tertinggi dulu; bila sama, baris yang lebih awal menang (seperti argmax)
+        order = np.lexsort((candidates, -scores))
+        return [(int(candidates[i]), float(scores[i])) for i in order]
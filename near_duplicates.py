@@ -0,0 +1,237 @@
+"""Near-duplicate clustering of submitted questions with MinHash + LSH.
+
+Each question is normalized (see ``answer_cache.normalize_query``), cut into
+character shingles and reduced to a MinHash signature. Signatures are split
+into bands; questions sharing a band bucket are candidates, and candidates
+whose estimated Jaccard similarity reaches ``threshold`` are merged into one
+cluster. Adding a question therefore only touches the questions in its own
+buckets instead of every earlier submission.
+
+Every cluster is keyed by the smallest key (row number, pending id...) of its
+members, so it keeps its place while new questions join it and admin views
+can page through clusters with an ``after`` cursor.
+"""
+import itertools
+import os
+import threading
+import zlib
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from answer_cache import normalize_query
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+# Perkiraan Jaccard minimal agar dua pertanyaan dianggap sama
+DUPLICATE_THRESHOLD = 0.5
+_PRIME = (1 << 32) + 15
+
+Cluster = namedtuple("Cluster", ["key", "representative", "members", "count"])
+
+_FEEDS = {}
+_LOCK = threading.Lock()
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    text = normalize_query(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """Incremental MinHash/LSH index grouping texts into near-duplicate clusters."""
+
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS, threshold=DUPLICATE_THRESHOLD,
+                 shingle_size=SHINGLE_SIZE, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm harus habis dibagi bands")
+        rng = np.random.default_rng(seed)
+        # a < 2**31 dan x < 2**32, jadi a * x + b tidak melewati uint64
+        self._a = rng.integers(1, 1 << 31, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self._signatures = {}
+        self._buckets = [{} for _ in range(bands)]
+        self._parent = {}
+        # Per akar: anggota klaster; per teks: kunci; kunci akar terurut untuk paging
+        self._members = {}
+        self._keys = {}
+        self._order = []
+        self._roots = {}
+        self._shared = 0
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def __contains__(self, text):
+        return text in self._signatures
+
+    def signature(self, text):
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles(text, self.shingle_size)),
+                             dtype=np.uint64)
+        if not len(hashes):
+            return None
+        return ((self._a * hashes + self._b) % _PRIME).min(axis=1)
+
+    def _band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _find(self, text):
+        root = text
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[text] != root:
+            self._parent[text], text = root, self._parent[text]
+        return root
+
+    def _union(self, a, b):
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a == root_b:
+            return
+        # Akar dengan kunci terkecil dipertahankan agar kunci klaster tidak berubah
+        if self._keys[root_b] < self._keys[root_a]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        members_a, members_b = self._members[root_a], self._members.pop(root_b)
+        self._shared += 1 - (len(members_a) > 1) - (len(members_b) > 1)
+        if len(members_b) > len(members_a):
+            members_a, members_b = members_b, members_a
+        members_a.extend(members_b)
+        self._members[root_a] = members_a
+        key = self._keys[root_b]
+        del self._order[bisect_left(self._order, key)]
+        del self._roots[key]
+
+    def _candidates(self, signature):
+        seen = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            for other in self._buckets[band].get(key, ()):
+                if other not in seen:
+                    seen.add(other)
+                    if np.mean(self._signatures[other] == signature) >= self.threshold:
+                        yield other
+
+    def add(self, text, key=None):
+        """Add ``text``; ``key`` (default: insertion order) orders the clusters and must be unique."""
+        if text in self._signatures:
+            return
+        if key is None:
+            key = len(self._signatures)
+        signature = self.signature(text)
+        self._parent[text] = text
+        self._signatures[text] = signature
+        self._members[text] = [text]
+        self._keys[text] = key
+        insort(self._order, key)
+        self._roots[key] = text
+        if signature is None:
+            return  # teks kosong: klaster sendiri
+        for other in self._candidates(signature):
+            self._union(other, text)
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, []).append(text)
+
+    def cluster_count(self, min_members=1):
+        if min_members <= 1:
+            return len(self._order)
+        if min_members == 2:
+            return self._shared
+        return sum(len(members) >= min_members for members in self._members.values())
+
+    def iter_groups(self, after=None):
+        """``(key, members)`` of every cluster whose key is greater than ``after``, in key order."""
+        start = 0 if after is None else bisect_right(self._order, after)
+        for key in itertools.islice(self._order, start, None):
+            yield key, self._members[self._roots[key]]
+
+
+def _valid(question):
+    return isinstance(question, str) and bool(question.strip())
+
+
+class QuestionClusters:
+    """Clusters of a mostly append-only source, fed only the rows added since the last sync.
+
+    ``generation`` identifies the source state the rows were read from (an
+    inode, a row count...); callers :meth:`reset` when it no longer holds.
+    ``cursor`` is where the next read starts.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self, generation=None):
+        self.index = NearDuplicateIndex()
+        self.counts = Counter()
+        self.total = 0
+        self.generation = generation
+        self.cursor = None
+        self.seen = 0
+
+    def extend(self, rows, cursor):
+        """Add ``(key, question)`` rows; a question's first key becomes its cluster key candidate."""
+        for key, question in rows:
+            self.seen += 1
+            if _valid(question):
+                self.counts[question] += 1
+                self.total += 1
+                self.index.add(question, key)
+        self.cursor = cursor
+
+    def cluster_count(self, min_members=1):
+        with self.lock:
+            return self.index.cluster_count(min_members)
+
+    def page(self, after=None, limit=20, search=None, min_members=1):
+        """Up to ``limit`` clusters with a key greater than ``after``, oldest first.
+
+        Returns ``(clusters, next_after)``; ``next_after`` is None on the last
+        page. ``search`` keeps clusters with a member containing it
+        (case-insensitive); the scan stops as soon as the page is full.
+        """
+        search = search.casefold() if search else None
+        clusters = []
+        with self.lock:
+            for key, members in self.index.iter_groups(after):
+                if len(members) < min_members:
+                    continue
+                if search and not any(search in text.casefold() for text in members):
+                    continue
+                if len(clusters) == limit:
+                    return clusters, clusters[-1].key
+                members = sorted(members, key=lambda text: -self.counts[text])
+                clusters.append(Cluster(key, members[0], members, sum(self.counts[text] for text in members)))
+        return clusters, None
+
+
+def open_clusters(key):
+    with _LOCK:
+        feed = _FEEDS.get(key)
+        if feed is None:
+            feed = _FEEDS[key] = QuestionClusters()
+        return feed
+
+
+def log_clusters(log, column="question"):
+    """Clusters of ``column`` over an AppendLog, synced with only the bytes appended since the last call.
+
+    Cluster keys are row numbers. Returns the :class:`QuestionClusters`;
+    read it with :meth:`QuestionClusters.page`.
+    """
+    feed = open_clusters(("log", os.path.abspath(log.path)))
+    with feed.lock:
+        rows, cursor, restarted = log.read_since(feed.cursor)
+        if restarted:
+            # File diganti (rewrite/rotasi): hitung ulang dari awal
+            feed.reset()
+        start = feed.seen
+        feed.extend(((start + i, row.get(column)) for i, row in enumerate(rows)), cursor)
+        return feed
@@ -0,0 +1,345 @@
+"""Optional second stage: re-rank TF-IDF candidates with a local embedding model.
+
+Off unless ``CHATBOT_RERANK_MODEL`` names a sentence-transformers model
+(``pip install sentence-transformers``; it runs on CPU), for example
+``sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2``.
+
+The lexical index proposes the top ``CHATBOT_RERANK_TOP_K`` candidates at a
+low threshold, and the candidate whose question embedding is closest to the
+query embedding wins when its cosine reaches ``CHATBOT_RERANK_THRESHOLD``.
+FAQ embeddings are computed once in the background, quantized to int8
+(per-row scale) or float16 and stored in a faq_snapshot file that is
+memory-mapped next to the index snapshot (``faq_data.faqsnap`` ->
+``faq_data.embeddings.faqsnap``), so each app keeps its own file; rows
+appended later are embedded on their own. Per request
+only the query is embedded, by one thread that encodes every query arriving
+within ``CHATBOT_RERANK_BATCH_WINDOW_MS`` as one batch. When the embedding
+is not ready within ``CHATBOT_RERANK_BUDGET_MS`` (model still loading, CPU
+busy) the plain lexical answer is used.
+"""
+import concurrent.futures
+import importlib.util
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+import faq_index
+import faq_snapshot
+import tracing
+
+logger = logging.getLogger(__name__)
+
+MODEL = os.environ.get("CHATBOT_RERANK_MODEL")
+ENABLED = bool(MODEL)
+# Kosong: diturunkan dari snapshot indeks FAQ, satu file per aplikasi/sumber data
+RERANK_FILE = os.environ.get("CHATBOT_RERANK_FILE")
+# "int8" (skala per baris, 4x lebih kecil dari float32) atau "float16"
+DTYPE = os.environ.get("CHATBOT_RERANK_DTYPE", "int8")
+TOP_K = int(os.environ.get("CHATBOT_RERANK_TOP_K", 20))
+# Skor TF-IDF minimal kandidat; jauh di bawah SIMILARITY_THRESHOLD agar parafrase ikut
+CANDIDATE_THRESHOLD = float(os.environ.get("CHATBOT_RERANK_CANDIDATE_THRESHOLD", 0.05))
+# Kemiripan kosinus embedding minimal agar kandidat dipakai sebagai jawaban
+THRESHOLD = float(os.environ.get("CHATBOT_RERANK_THRESHOLD", 0.6))
+BUDGET_MS = float(os.environ.get("CHATBOT_RERANK_BUDGET_MS", 50))
+BATCH_WINDOW_MS = float(os.environ.get("CHATBOT_RERANK_BATCH_WINDOW_MS", 2))
+MAX_BATCH = int(os.environ.get("CHATBOT_RERANK_MAX_BATCH", 32))
+BUILD_CHUNK = 256
+
+_rerankers = {}
+_batcher = None
+_reranker_lock = threading.Lock()
+
+
+class SentenceEncoder:
+    """sentence-transformers model on CPU, loaded on first use; returns L2-normalized float32 rows."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                started = time.perf_counter()
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+                logger.info(f"Model embedding {self.model_name} dimuat "
+                            f"({time.perf_counter() - started:.1f} detik).")
+        return self._model
+
+    def encode(self, texts):
+        model = self._model or self._load()
+        vectors = model.encode(list(texts), batch_size=64, normalize_embeddings=True,
+                               convert_to_numpy=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def quantize(vectors, dtype=DTYPE):
+    """``(values, scales)`` for float32 rows; ``scales`` is None for float16."""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype != "int8":
+        raise ValueError(f"dtype embedding {dtype!r} tidak didukung")
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def question_hashes(questions):
+    import pandas as pd
+    return pd.util.hash_array(np.asarray(["" if q is None else str(q) for q in questions], dtype=object))
+
+
+class Embeddings:
+    """Quantized FAQ question embeddings mapped from a faq_snapshot file."""
+
+    def __init__(self, values, scales, hashes, model, dtype):
+        self.values = values
+        self.scales = scales
+        self.hashes = hashes
+        self.model = model
+        self.dtype = dtype
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def rows(self, rows):
+        vectors = self.values[rows].astype(np.float32)
+        if self.scales is not None:
+            vectors *= self.scales[rows, None]
+        return vectors
+
+    @classmethod
+    def load(cls, path):
+        try:
+            snapshot = faq_snapshot.Snapshot(path)
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Embedding FAQ {path} tidak bisa dibaca: {e}")
+            return None
+        header = snapshot.header
+        hashes = snapshot.array("hashes")
+        values = snapshot.array("values").reshape(len(hashes), header["dim"])
+        scales = snapshot.array("scales") if snapshot.has_array("scales") else None
+        return cls(values, scales, hashes, header["model"], header["dtype"])
+
+    def save(self, path):
+        arrays = {"values": self.values.reshape(-1), "hashes": self.hashes}
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        header = {"kind": "embeddings", "model": self.model, "dtype": self.dtype,
+                  "dim": int(self.values.shape[1]) if self.values.ndim == 2 else 0}
+        faq_snapshot.write_snapshot(path, header, {}, arrays)
+
+
+class QueryBatcher:
+    """One thread embedding queued queries; everything queued within ``window`` seconds shares a batch."""
+
+    def __init__(self, encoder, max_batch=MAX_BATCH, window=BATCH_WINDOW_MS / 1000):
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.window = window
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, text):
+        future = concurrent.futures.Future()
+        self._queue.put((text, future))
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+                    self._thread.start()
+        return future
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(items) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    items.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Permintaan yang sudah menyerah (melewati budget) tidak ikut di-encode
+            items = [(text, future) for text, future in items if future.set_running_or_notify_cancel()]
+            if not items:
+                continue
+            try:
+                with tracing.span("rerank.encode_batch"):
+                    vectors = self.encoder.encode([text for text, _ in items])
+                tracing.incr("rerank.batched_queries", len(items))
+                for (_, future), vector in zip(items, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                logger.exception("Gagal meng-encode pertanyaan")
+                for _, future in items:
+                    future.set_exception(e)
+
+
+def embeddings_path_for(index_path):
+    # faq_data.faqsnap -> faq_data.embeddings.faqsnap
+    root, ext = os.path.splitext(index_path)
+    return f"{root}.embeddings{ext}"
+
+
+class Reranker:
+    """Embedding re-ranking for one FAQ source; ``path`` None keeps the embeddings in memory only."""
+
+    def __init__(self, encoder, path=None, model=MODEL, dtype=DTYPE, top_k=TOP_K,
+                 threshold=THRESHOLD, budget_ms=BUDGET_MS, batcher=None):
+        self.encoder = encoder
+        self.path = path
+        self.model = model
+        self.dtype = dtype
+        self.top_k = top_k
+        self.threshold = threshold
+        self.budget = budget_ms / 1000
+        self.batcher = batcher or QueryBatcher(encoder)
+        self._embeddings = Embeddings.load(path) if path else None
+        # (indeks, jumlah baris, embeddings yang cocok atau None) dari pemeriksaan terakhir
+        self._checked = None
+        self._building = False
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        """Load the model in the background so the first queries are not lost to fallback."""
+        self.batcher.submit("")
+
+    def embeddings(self, index):
+        """Embeddings covering every row of ``index``, or None while they are (re)built."""
+        n_rows = len(index)
+        checked = self._checked
+        if checked is not None and checked[0] is index and checked[1] == n_rows:
+            return checked[2]
+        with self._lock:
+            hashes = question_hashes(index.columns.get("question", []))
+            embeddings = self._embeddings
+            current = (embeddings is not None and embeddings.model == self.model
+                       and embeddings.dtype == self.dtype and len(embeddings) == n_rows
+                       and (embeddings.hashes == hashes).all())
+            if current:
+                self._checked = (index, n_rows, embeddings)
+                return embeddings
+            self._checked = (index, n_rows, None)
+            if not self._building:
+                self._building = True
+                questions = list(index.columns.get("question", []))
+                threading.Thread(target=self._build, args=(questions, hashes),
+                                 name="rerank-build", daemon=True).start()
+            return None
+
+    @tracing.traced("rerank.build")
+    def _build(self, questions, hashes):
+        try:
+            old = self._embeddings
+            # Baris lama yang tidak berubah dipakai lagi; hanya baris baru yang di-encode
+            keep = 0
+            if old is not None and old.model == self.model and old.dtype == self.dtype:
+                n_old = min(len(old), len(hashes))
+                matches = old.hashes[:n_old] == hashes[:n_old]
+                keep = n_old if matches.all() else int(np.argmin(matches))
+            new = [self.encoder.encode(questions[start:start + BUILD_CHUNK])
+                   for start in range(keep, len(questions), BUILD_CHUNK)]
+            values, scales = quantize(np.vstack(new), self.dtype) if new else (None, None)
+            if keep:
+                values = old.values[:keep] if values is None else np.vstack([old.values[:keep], values])
+                if old.scales is not None:
+                    scales = old.scales[:keep] if scales is None else np.concatenate([old.scales[:keep], scales])
+            if values is None:
+                values = np.zeros((0, 0), dtype=np.int8 if self.dtype == "int8" else np.float16)
+            embeddings = Embeddings(values, scales, np.asarray(hashes, dtype=np.uint64), self.model, self.dtype)
+            if self.path:
+                try:
+                    embeddings.save(self.path)
+                    embeddings = Embeddings.load(self.path) or embeddings
+                except OSError as e:
+                    logger.warning(f"Gagal menyimpan embedding FAQ ke {self.path}: {e}")
+            logger.info(f"Embedding FAQ siap ({len(questions)} baris, {len(questions) - keep} di-encode).")
+            self._embeddings = embeddings
+        except Exception:
+            logger.exception("Gagal membangun embedding FAQ")
+        finally:
+            with self._lock:
+                self._building = False
+                self._checked = None
+
+    def rerank(self, index, query, tag=None, classify=False):
+        """Return ``(result, final)``.
+
+        ``result`` is ``(answer, score, faq_id, rerank_score)`` for the
+        candidate picked by embedding similarity, or None to keep the lexical
+        answer. ``score`` is the candidate's TF-IDF score, comparable with
+        the index thresholds; ``rerank_score`` is its embedding cosine.
+        ``final`` is False when the
+        embedding stage was skipped for a transient reason (budget exceeded,
+        embeddings still building), so the caller should not cache it.
+        """
+        deadline = time.perf_counter() + self.budget
+        candidates = index.search(query, k=self.top_k, threshold=CANDIDATE_THRESHOLD, tag=tag,
+                                  classify=classify, fallback_threshold=index.threshold)
+        if not candidates:
+            return None, True
+        embeddings = self.embeddings(index)
+        if embeddings is None:
+            tracing.incr("rerank.fallback_no_embeddings")
+            return None, False
+        future = self.batcher.submit(query)
+        try:
+            vector = future.result(timeout=max(deadline - time.perf_counter(), 0))
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            tracing.incr("rerank.fallback_budget")
+            return None, False
+        except Exception:
+            tracing.incr("rerank.fallback_error")
+            return None, False
+        with tracing.span("rerank.score"):
+            rows = np.array([row for row, _ in candidates])
+            scores = [score for _, score in candidates]
+            similarities = embeddings.rows(rows) @ vector
+            best = int(np.argmax(similarities))
+        tracing.incr("rerank.reranked")
+        if similarities[best] < self.threshold:
+            return None, True
+        row = int(rows[best])
+        return (index.columns["answer"][row], float(scores[best]), index.faq_id(row),
+                float(similarities[best])), True
+
+
+def reranker(index):
+    """The process-wide :class:`Reranker` for ``index``'s source, or None when disabled.
+
+    Model and query batcher are shared; the embeddings file is
+    ``CHATBOT_RERANK_FILE`` or derived from ``index.snapshot_path``.
+    """
+    global _batcher, ENABLED
+    if not ENABLED:
+        return None
+    path = RERANK_FILE or (embeddings_path_for(index.snapshot_path) if index.snapshot_path else None)
+    key = os.path.abspath(path) if path else None
+    reranker_ = _rerankers.get(key)
+    if reranker_ is None:
+        with _reranker_lock:
+            reranker_ = _rerankers.get(key)
+            if reranker_ is None:
+                warm_up = _batcher is None
+                if warm_up:
+                    # Cek tanpa mengimpor: torch + transformers butuh beberapa detik
+                    if importlib.util.find_spec("sentence_transformers") is None:
+                        logger.warning("CHATBOT_RERANK_MODEL diisi tetapi sentence-transformers belum terpasang; "
+                                       "re-ranking semantik dinonaktifkan.")
+                        ENABLED = False
+                        return None
+                    _batcher = QueryBatcher(SentenceEncoder(MODEL))
+                reranker_ = _rerankers[key] = Reranker(_batcher.encoder, path, batcher=_batcher)
+                if warm_up:
+                    reranker_.warm_up()
+    return reranker_
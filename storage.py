@@ -0,0 +1,454 @@
+"""Table storage shared by both apps: CSV files, SQLite or MySQL.
+
+Every table offers the same row-level operations -- ``rows``, ``insert``,
+``insert_many``, ``delete`` and ``update`` -- plus
+``version()``, an opaque token that changes with every write so callers
+(see ``faq_index.get_store_index``) can skip reloading unchanged data.
+
+CSV tables append rows in place and rewrite the file through a temporary
+file + ``os.replace`` for everything else, so a crash never leaves a
+half-written CSV behind. SQL tables run each write in a transaction that
+also bumps the table's counter in ``table_versions``.
+"""
+import abc
+import csv
+import io
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: hanya dikunci antar-thread dalam satu proses
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Penghitung versi per tabel untuk backend SQL
+VERSIONS_TABLE = "table_versions"
+# Baris kedua per tabel di VERSIONS_TABLE, hanya naik untuk DELETE/UPDATE (bukan INSERT)
+REWRITES_SUFFIX = ":rewrites"
+_IDENTIFIER = re.compile(r"^\w+$")
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+class StorageError(Exception):
+    """The backend could not be reached or a write was rolled back."""
+
+
+def _identifier(name):
+    # Nama tabel/kolom selalu berasal dari kode, tapi tetap diperiksa sebelum masuk ke SQL
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Nama tidak valid: {name!r}")
+    return name
+
+
+def _like_pattern(text):
+    # % _ dan \ di teks pencarian dicocokkan apa adanya, bukan sebagai wildcard
+    return "%" + re.sub(r"([\\%_])", r"\\\1", text) + "%"
+
+
+def _cell(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return value
+
+
+# -- CSV -------------------------------------------------------------------------
+
+class CsvTable:
+    """One CSV file. Appends are O(1); deletes and updates are atomic rewrites."""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.key = ("csv", os.path.abspath(path))
+        self._lock = threading.RLock()
+        self._lock_path = f"{path}.lock"
+
+    @contextmanager
+    def _file_lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def ensure(self):
+        """Create the file with its header when it does not exist yet."""
+        if not os.path.exists(self.path):
+            with self._file_lock():
+                if not os.path.exists(self.path):
+                    self._write_rows([])
+
+    def version(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def header(self):
+        try:
+            with open(self.path, newline="", encoding="utf-8") as f:
+                return next(csv.reader(f), None) or self.columns
+        except FileNotFoundError:
+            return self.columns
+
+    def rows(self):
+        import pandas as pd
+        try:
+            return pd.read_csv(self.path)
+        except (FileNotFoundError, pd.errors.EmptyDataError):
+            return pd.DataFrame({col: [] for col in self.columns})
+
+    def insert(self, row):
+        self.insert_many([row])
+
+    def insert_many(self, rows):
+        with self._file_lock():
+            header = self.header()
+            out = io.StringIO()
+            writer = csv.writer(out, lineterminator="\n")
+            with open(self.path, "ab+") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    writer.writerow(header)
+                else:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        out.write("\n")
+                writer.writerows([_cell(row.get(col)) for col in header] for row in rows)
+                f.seek(0, os.SEEK_END)
+                f.write(out.getvalue().encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _write_rows(self, frame):
+        # Ditulis ke file sementara lalu di-rename: pembaca melihat file lama atau baru, tidak pernah setengahnya
+        import pandas as pd
+        if not isinstance(frame, pd.DataFrame):
+            frame = pd.DataFrame(list(frame), columns=self.columns)
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            frame.to_csv(f, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def delete(self, column, values):
+        with self._file_lock():
+            frame = self.rows()
+            keep = ~frame[column].isin(list(values))
+            removed = int((~keep).sum())
+            if removed:
+                self._write_rows(frame[keep])
+            return removed
+
+    def update(self, column, key, changes):
+        with self._file_lock():
+            frame = self.rows()
+            match = frame[column] == key
+            if not match.any():
+                return 0
+            for col, value in changes.items():
+                frame.loc[match, col] = value
+            self._write_rows(frame)
+            return int(match.sum())
+
+
+# -- SQL -------------------------------------------------------------------------
+
+class _Transaction:
+    """Writes inside :meth:`SqlStore.transaction`; every touched table gets its version bumped."""
+
+    def __init__(self, store, cursor):
+        self.store = store
+        self.cursor = cursor
+        self.touched = set()
+        self.rewritten = set()
+
+    def insert_many(self, table, rows, ignore=False):
+        rows = list(rows)
+        if not rows:
+            return 0
+        columns = list(rows[0])
+        placeholders = ", ".join([self.store.placeholder] * len(columns))
+        verb = self.store.insert_ignore if ignore else "INSERT"
+        self.cursor.executemany(
+            f"{verb} INTO {_identifier(table)} ({', '.join(map(_identifier, columns))}) VALUES ({placeholders})",
+            [tuple(_cell(row.get(col)) for col in columns) for row in rows])
+        self.touched.add(table)
+        return len(rows)
+
+    def delete(self, table, column, values):
+        values = list(values)
+        if not values:
+            return 0
+        placeholders = ", ".join([self.store.placeholder] * len(values))
+        self.cursor.execute(
+            f"DELETE FROM {_identifier(table)} WHERE {_identifier(column)} IN ({placeholders})", values)
+        self.touched.add(table)
+        self.rewritten.add(table)
+        return self.cursor.rowcount
+
+    def delete_all(self, table):
+        self.cursor.execute(f"DELETE FROM {_identifier(table)}")
+        self.touched.add(table)
+        self.rewritten.add(table)
+
+    def update(self, table, column, key, changes):
+        assignments = ", ".join(f"{_identifier(col)} = {self.store.placeholder}" for col in changes)
+        self.cursor.execute(
+            f"UPDATE {_identifier(table)} SET {assignments} WHERE {_identifier(column)} = {self.store.placeholder}",
+            list(changes.values()) + [key])
+        self.touched.add(table)
+        self.rewritten.add(table)
+        return self.cursor.rowcount
+
+
+class SqlStore(abc.ABC):
+    """Connection handling, schema and transactions shared by the SQLite and MySQL backends."""
+
+    placeholder = "%s"
+    insert_ignore = "INSERT IGNORE"
+    # Backslash harus di-escape di literal string MySQL, tidak di SQLite
+    like_escape = "ESCAPE '\\\\'"
+    versions_ddl = (f"CREATE TABLE IF NOT EXISTS {VERSIONS_TABLE} "
+                    "(name VARCHAR(64) PRIMARY KEY, version BIGINT NOT NULL)")
+    bump_version = (f"INSERT INTO {VERSIONS_TABLE} (name, version) VALUES (%s, 1) "
+                    "ON DUPLICATE KEY UPDATE version = version + 1")
+
+    @abc.abstractmethod
+    def _connect(self):
+        """A new DB-API connection, or None when the database cannot be reached."""
+
+    def connect(self):
+        conn = self._connect()
+        if conn is None:
+            logger.error("Database tidak dapat dihubungi")
+            raise StorageError("Database tidak dapat dihubungi")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self.connect()
+        try:
+            yield conn
+        except StorageError:
+            raise
+        except Exception as e:
+            logger.error(f"Query database gagal: {e}")
+            raise StorageError(str(e)) from e
+        finally:
+            conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Run writes in one transaction: committed together or rolled back together."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            tx = _Transaction(self, cursor)
+            try:
+                yield tx
+                for table in sorted(tx.touched):
+                    cursor.execute(self.bump_version, (table,))
+                for table in sorted(tx.rewritten):
+                    cursor.execute(self.bump_version, (table + REWRITES_SUFFIX,))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Transaksi dibatalkan: {e}")
+                raise StorageError(str(e)) from e
+
+    def query(self, sql, params=()):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql.replace("%s", self.placeholder), params)
+            return cursor.fetchall()
+
+    def read_frame(self, sql, params=()):
+        import pandas as pd
+        with self.connection() as conn:
+            return pd.read_sql(sql.replace("%s", self.placeholder), conn, params=list(params))
+
+    @abc.abstractmethod
+    def ensure_schema(self, statements):
+        """Run the ``CREATE TABLE IF NOT EXISTS`` statements plus the versions table.
+
+        Raises :class:`StorageError` when the database cannot be reached or a statement fails.
+        """
+
+    def table(self, name, columns):
+        return SqlTable(self, name, columns)
+
+
+class SqlTable:
+    """One table with an ``id`` key; reads use keyset queries on ``id``."""
+
+    def __init__(self, store, name, columns):
+        self.store = store
+        self.name = _identifier(name)
+        self.columns = [_identifier(col) for col in columns]
+        self.key = (store.key, name)
+
+    def version(self):
+        # (semua tulisan, DELETE/UPDATE saja, id terbesar); id ikut agar INSERT dari luar aplikasi terdeteksi
+        counters = dict(self.store.query(f"SELECT name, version FROM {VERSIONS_TABLE} WHERE name IN (%s, %s)",
+                                         (self.name, self.name + REWRITES_SUFFIX)))
+        max_id = self.store.query(f"SELECT MAX(id) FROM {self.name}") if "id" in self.columns else [(None,)]
+        return (counters.get(self.name, 0), counters.get(self.name + REWRITES_SUFFIX, 0), max_id[0][0])
+
+    def appended_only(self, since, version, count):
+        """Whether the table only gained rows after ``since``'s max id by the time of ``version``.
+
+        ``count`` is how many rows the caller read at ``since``; comparing it
+        with the rows up to that id also catches deletes made outside the app.
+        """
+        if since[1] != version[1]:
+            return False
+        if since[2] is None:
+            return count == 0
+        return self.count(upto_id=since[2]) == count
+
+    def rows(self):
+        order = " ORDER BY id" if "id" in self.columns else ""
+        return self.store.read_frame(f"SELECT {', '.join(self.columns)} FROM {self.name}{order}")
+
+    def count(self, upto_id=None):
+        if upto_id is None:
+            return self.store.query(f"SELECT COUNT(*) FROM {self.name}")[0][0]
+        return self.store.query(f"SELECT COUNT(*) FROM {self.name} WHERE id <= %s", (upto_id,))[0][0]
+
+    def rows_after(self, after_id, columns):
+        return self.store.query(
+            f"SELECT {', '.join(map(_identifier, columns))} FROM {self.name} WHERE id > %s ORDER BY id",
+            (after_id,))
+
+    def select(self, columns, column, values):
+        values = list(values)
+        if not values:
+            return []
+        placeholders = ", ".join(["%s"] * len(values))
+        return self.store.query(
+            f"SELECT {', '.join(map(_identifier, columns))} FROM {self.name} "
+            f"WHERE {_identifier(column)} IN ({placeholders})", values)
+
+    def page(self, after_id, limit, search=None, search_columns=("question", "answer")):
+        """``(frame, next_id)``: up to ``limit`` rows with ``id > after_id``; ``next_id`` is None on the last page."""
+        sql = f"SELECT {', '.join(self.columns)} FROM {self.name} WHERE id > %s"
+        params = [after_id]
+        if search:
+            sql += " AND (" + " OR ".join(f"{_identifier(col)} LIKE %s {self.store.like_escape}"
+                                         for col in search_columns) + ")"
+            params += [_like_pattern(search)] * len(search_columns)
+        # Satu baris ekstra untuk mengetahui apakah masih ada halaman berikutnya
+        sql += " ORDER BY id LIMIT %s"
+        params.append(limit + 1)
+        frame = self.store.read_frame(sql, params)
+        next_id = int(frame["id"].iloc[limit - 1]) if len(frame) > limit else None
+        return frame.head(limit), next_id
+
+    def insert(self, row, ignore=False):
+        return self.insert_many([row], ignore)
+
+    def insert_many(self, rows, ignore=False):
+        with self.store.transaction() as tx:
+            return tx.insert_many(self.name, rows, ignore)
+
+    def delete(self, column, values):
+        with self.store.transaction() as tx:
+            return tx.delete(self.name, column, values)
+
+    def update(self, column, key, changes):
+        with self.store.transaction() as tx:
+            return tx.update(self.name, column, key, changes)
+
+
+class MysqlStore(SqlStore):
+    """MySQL through the shared connection pool in db_pool."""
+
+    key = "mysql"
+
+    def _connect(self):
+        import db_pool
+        return db_pool.get_connection()
+
+    def ensure_schema(self, statements):
+        import db_pool
+        import mysql.connector
+        try:
+            ready = db_pool.ensure_schema(list(statements) + [self.versions_ddl])
+        except mysql.connector.Error as e:
+            logger.error(f"Inisialisasi skema gagal: {e}")
+            raise StorageError(str(e)) from e
+        if not ready:
+            raise StorageError("Database tidak dapat dihubungi")
+
+
+class SqliteStore(SqlStore):
+    """A local SQLite file; handy for single-server installs without MySQL."""
+
+    placeholder = "?"
+    insert_ignore = "INSERT OR IGNORE"
+    like_escape = "ESCAPE '\\'"
+    bump_version = (f"INSERT INTO {VERSIONS_TABLE} (name, version) VALUES (?, 1) "
+                    "ON CONFLICT(name) DO UPDATE SET version = version + 1")
+
+    def __init__(self, path):
+        self.path = path
+        self.key = ("sqlite", os.path.abspath(path))
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    def _connect(self):
+        try:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            return conn
+        except sqlite3.Error as e:
+            logger.error(f"Error connecting to database: {e}")
+            return None
+
+    def ensure_schema(self, statements):
+        # DDL ditulis untuk MySQL; AUTO_INCREMENT diterjemahkan ke padanan SQLite
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            with self.connection() as conn:
+                for statement in list(statements) + [self.versions_ddl]:
+                    conn.execute(statement.replace("INT AUTO_INCREMENT PRIMARY KEY",
+                                                   "INTEGER PRIMARY KEY AUTOINCREMENT"))
+                conn.commit()
+            self._schema_ready = True
+            logger.info("Database initialized successfully!")
+
+
+def open_sql_store(url=None):
+    """Return the process-wide SQL store for ``url``.
+
+    ``url`` (default: ``CHATBOT_STORAGE``, else ``mysql``) is ``mysql`` or
+    ``sqlite:<path>``.
+    """
+    url = url or os.environ.get("CHATBOT_STORAGE", "mysql")
+    with _STORES_LOCK:
+        store = _STORES.get(url)
+        if store is None:
+            if url == "mysql":
+                store = MysqlStore()
+            elif url.startswith("sqlite:"):
+                store = SqliteStore(url[len("sqlite:"):])
+            else:
+                raise ValueError(f"Backend penyimpanan tidak dikenal: {url}")
+            _STORES[url] = store
+        return store
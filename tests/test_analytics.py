@@ -0,0 +1,92 @@
+"""Incremental analytics aggregates against a fresh full read of the events file."""
+import json
+import os
+import random
+
+import analytics
+
+
+def events(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        ok = rng.random() < 0.6
+        yield {"t": i, "q": f"pertanyaan {rng.randrange(15)}", "score": round(rng.random(), 4),
+               "faq_id": rng.randrange(5) if ok else None, "ok": ok, "ms": round(rng.random() * 10, 3)}
+
+
+def append(path, rows):
+    with open(path, "ab") as f:
+        for row in rows:
+            f.write(json.dumps(row).encode("utf-8") + b"\n")
+
+
+def fresh(path, tmp_path):
+    aggregator = analytics.Aggregator(str(path), checkpoint_path=str(tmp_path / "fresh.checkpoint.json"))
+    aggregator.update()
+    return aggregator._state()
+
+
+def test_incremental_updates_match_a_full_read(tmp_path):
+    path = tmp_path / "events.jsonl"
+    aggregator = analytics.Aggregator(str(path))
+    rows = list(events(300))
+    for start in range(0, 300, 70):
+        append(path, rows[start:start + 70])
+        aggregator.update()
+    # Baris terakhir yang belum lengkap menunggu update berikutnya
+    with open(path, "ab") as f:
+        f.write(b'{"t": 1, "q": "setengah')
+
+    assert aggregator.update() == 0
+    assert aggregator._state() == fresh(path, tmp_path)
+    assert aggregator.total == 300
+
+
+def test_checkpoint_resumes_from_its_offset(tmp_path):
+    path = tmp_path / "events.jsonl"
+    append(path, events(100))
+    analytics.Aggregator(str(path)).update()
+    append(path, events(50, seed=1))
+
+    resumed = analytics.Aggregator(str(path))
+    assert resumed.offset > 0
+    assert resumed.update() == 50
+    assert resumed._state() == fresh(path, tmp_path)
+
+
+def test_truncated_file_is_read_again_from_the_start(tmp_path):
+    path = tmp_path / "events.jsonl"
+    aggregator = analytics.Aggregator(str(path))
+    append(path, events(200))
+    aggregator.update()
+    with open(path, "wb"):
+        pass
+    append(path, events(20, seed=2))
+
+    aggregator.update()
+    assert aggregator.total == 20
+    assert aggregator._state() == fresh(path, tmp_path)
+
+
+def test_replaced_file_is_read_again_from_the_start(tmp_path):
+    path = tmp_path / "events.jsonl"
+    aggregator = analytics.Aggregator(str(path))
+    append(path, events(50))
+    aggregator.update()
+    replacement = tmp_path / "events.new"
+    append(replacement, events(80, seed=3))
+    os.replace(replacement, path)
+
+    aggregator.update()
+    assert aggregator.total == 80
+    assert aggregator._state() == fresh(path, tmp_path)
+
+
+def test_answer_rate_at_counts_scores_from_the_threshold_bin(tmp_path):
+    path = tmp_path / "events.jsonl"
+    append(path, [{"q": "a", "score": s, "ok": s >= 0.3, "ms": 1} for s in (0.0, 0.12, 0.3, 0.31, 0.9)])
+    aggregator = analytics.Aggregator(str(path))
+    aggregator.update()
+
+    assert aggregator.answer_rate_at(0.3) == 3 / 5
+    assert aggregator.answer_rate_at(0.1) == 4 / 5
@@ -0,0 +1,93 @@
+"""AnswerCache invalidation and eviction, and the scores cached_answer reports."""
+import pandas as pd
+import pytest
+
+import answer_cache
+import faq_index
+
+FAQ = pd.DataFrame({
+    "tag": ["cuti", "cuti", "gaji"],
+    "question": ["cuti tahunan pns", "cuti sakit pns", "gaji pokok pns"],
+    "answer": ["A", "B", "C"],
+})
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = answer_cache.AnswerCache(ttl=10)
+    cache.put("cuti", ("h", 0), "A")
+
+    clock.now += 10
+    assert cache.get("cuti", ("h", 0)) == "A"
+    clock.now += 0.5
+    assert cache.get("cuti", ("h", 0)) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = answer_cache.AnswerCache(max_size=2)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    assert cache.get("a", 1) == "A"
+
+    cache.put("c", 1, "C")
+
+    assert cache.get("b", 1) is None
+    assert (cache.get("a", 1), cache.get("c", 1)) == ("A", "C")
+
+
+@pytest.mark.parametrize("new_version", [("h", 1), ("other", 0)])
+def test_new_index_version_or_source_drops_every_entry(new_version):
+    cache = answer_cache.AnswerCache()
+    cache.put("a", ("h", 0), "A")
+    cache.put("b", ("h", 0), "B")
+
+    assert cache.get("a", new_version) is None
+    assert cache.get("b", ("h", 0)) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_cached_answer_follows_index_updates():
+    index = faq_index.FaqIndex(FAQ, stop_words="english")
+    cache = answer_cache.AnswerCache()
+    assert answer_cache.cached_answer(index, "Cuti sakit PNS?", cache=cache)[0] == "B"
+    assert answer_cache.cached_answer(index, "cuti sakit pns", cache=cache)[0] == "B"
+    assert cache.stats()["hits"] == 1
+
+    index.add({"tag": "gaji", "question": "tunjangan kinerja pns", "answer": "D"})
+
+    assert answer_cache.cached_answer(index, "tunjangan kinerja pns", cache=cache)[0] == "D"
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_miss_reports_the_real_best_score_below_the_suggestion_threshold():
+    import benchmark_faq
+
+    corpus = benchmark_faq.make_corpus(400, seed=7)
+    index = faq_index.FaqIndex(corpus, stop_words="english")
+    low = []
+    for query in benchmark_faq.make_queries(corpus, 400, distinct=400, unknown_ratio=0.5, seed=8):
+        best = index.search(query, threshold=0.0)
+        if best and best[0][1] < faq_index.SUGGESTION_THRESHOLD:
+            low.append((query, best[0]))
+    assert low
+
+    for query, (row, score) in low:
+        answer, reported, faq_id = answer_cache.cached_answer(index, query, cache=answer_cache.AnswerCache())
+        assert answer is None
+        assert reported == pytest.approx(score)
+        assert faq_id == index.faq_id(row)
@@ -0,0 +1,109 @@
+"""AppendLog against a plain CSV read of everything written."""
+import csv
+import os
+
+import pytest
+
+import append_log
+
+COLUMNS = ["username", "action", "details"]
+
+
+def row(i):
+    # Sebagian baris berisi koma, kutip dan baris baru agar offset dihitung per record, bukan per baris
+    details = f"event {i}" if i % 7 else f'multi "{i}",\nbaris {i}'
+    return {"username": f"user{i % 3}", "action": "Login", "details": details}
+
+
+def read_all(log):
+    directory = os.path.dirname(log.path)
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                   if name.startswith("audit.0") and name.endswith(".csv"))
+    rows = []
+    for path in paths + [log.path]:
+        if os.path.exists(path):
+            with open(path, newline="", encoding="utf-8") as f:
+                rows.extend(csv.DictReader(f))
+    return rows
+
+
+@pytest.fixture
+def log(tmp_path):
+    return append_log.AppendLog(str(tmp_path / "audit.csv"), COLUMNS, segment_bytes=2000, flush_rows=10)
+
+
+def write(log, start, stop):
+    for i in range(start, stop):
+        log.append(row(i))
+    log.flush()
+
+
+def test_rotation_keeps_every_row_in_order(log):
+    write(log, 0, 700)
+
+    assert len(log._segments()) > 3
+    expected = [row(i) for i in range(700)]
+    assert read_all(log) == expected
+    assert list(log.iter_rows()) == expected
+    assert log.count() == 700
+
+
+@pytest.mark.parametrize("offset", [0, 1, 255, 256, 257, 399, 690, 699, 700])
+def test_read_page_at_any_offset(log, offset):
+    write(log, 0, 700)
+
+    assert log.read_page(offset, 25) == [row(i) for i in range(offset, min(offset + 25, 700))]
+
+
+def test_count_and_pages_follow_other_writers(tmp_path):
+    path = str(tmp_path / "audit.csv")
+    writer = append_log.AppendLog(path, COLUMNS, flush_rows=1)
+    reader = append_log.AppendLog(path, COLUMNS)
+    write(writer, 0, 300)
+    assert reader.count() == 300
+    write(writer, 300, 600)
+
+    # Indeks offset yang tersimpan milik proses lain ikut dipakai
+    assert reader.count() == 600
+    assert reader.read_page(520, 3) == [row(i) for i in range(520, 523)]
+
+
+def test_read_since_returns_only_new_rows(log):
+    write(log, 0, 50)
+    rows, cursor, restarted = log.read_since()
+    assert restarted and rows == [row(i) for i in range(50)]
+
+    write(log, 50, 60)
+    rows, cursor, restarted = log.read_since(cursor)
+    assert not restarted and rows == [row(i) for i in range(50, 60)]
+
+    rows, cursor, restarted = log.read_since(cursor)
+    assert (rows, restarted) == ([], False)
+
+
+def test_read_since_starts_over_after_rotation_and_rewrite(log):
+    write(log, 0, 10)
+    _, cursor, _ = log.read_since()
+    write(log, 10, 700)
+
+    rows, cursor, restarted = log.read_since(cursor)
+    assert restarted and rows == [row(i) for i in range(700)]
+
+    log.rewrite([row(1000)])
+    rows, cursor, restarted = log.read_since(cursor)
+    assert restarted
+    assert rows[-1] == row(1000)
+
+
+def test_contains_sees_new_rows_and_rewrites(tmp_path):
+    log = append_log.AppendLog(str(tmp_path / "questions.csv"), ["question"], flush_rows=100)
+    log.append({"question": "cuti pns"})
+    assert log.contains("question", "cuti pns")
+    assert not log.contains("question", "gaji pokok")
+
+    log.append({"question": "gaji pokok"})
+    assert log.contains("question", "gaji pokok")
+
+    log.rewrite([{"question": "gaji pokok"}])
+    assert not log.contains("question", "cuti pns")
+    assert log.contains("question", "gaji pokok")
@@ -0,0 +1,122 @@
+"""FaqIndex behaviour between refits."""
+import pandas as pd
+import pytest
+
+import answer_cache
+import faq_index
+import storage
+
+FAQ = pd.DataFrame({
+    "tag": ["cuti", "cuti", "gaji", "gaji"],
+    "question": ["cuti tahunan pns", "cuti sakit pns", "gaji pokok pns", "tunjangan keluarga pns"],
+    "answer": ["A", "B", "C", "D"],
+})
+
+
+@pytest.fixture
+def index():
+    index = faq_index.FaqIndex(FAQ, stop_words="english")
+    # Anggaran basi besar: hanya kata baru yang boleh memicu fit ulang
+    index.staleness_budget = 10_000
+    index.compact_interval = 10_000
+    return index
+
+
+def test_added_row_with_unknown_words_is_answered_at_once(index):
+    index.add({"tag": "kepegawaian", "question": "kenaikan pangkat reguler golongan", "answer": "E"})
+
+    assert index.stale_rows == 0
+    answer, score, _ = answer_cache.cached_answer(index, "kenaikan pangkat reguler golongan",
+                                                  cache=answer_cache.AnswerCache())
+    assert answer == "E"
+    assert score == pytest.approx(1.0)
+
+
+def test_added_row_with_known_words_stays_stale(index):
+    index.add({"tag": "cuti", "question": "cuti sakit tahunan", "answer": "E"})
+
+    assert index.stale_rows == 1
+    assert index.match("cuti sakit tahunan")[0] is not None
+
+
+def test_store_append_with_unknown_words_is_answered_at_once(tmp_path):
+    store = storage.SqliteStore(str(tmp_path / "faq.db"))
+    store.ensure_schema(["CREATE TABLE IF NOT EXISTS faq (id INT AUTO_INCREMENT PRIMARY KEY, "
+                         "question TEXT, answer TEXT)"])
+    table = store.table("faq", ["id", "question", "answer"])
+    table.insert_many([{"question": q, "answer": a} for q, a in zip(FAQ["question"], FAQ["answer"])])
+    index_path = str(tmp_path / "faq.faqsnap")
+    index = faq_index.get_store_index(table, index_path)
+    index.staleness_budget = 10_000
+
+    table.insert({"question": "ekinerja login gagal", "answer": "E"})
+    updated = faq_index.get_store_index(table, index_path)
+
+    assert updated is index
+    answer, _, faq_id = answer_cache.cached_answer(updated, "ekinerja login gagal", cache=answer_cache.AnswerCache())
+    assert (answer, faq_id) == ("E", 5)
+
+
+def dense_scores(index, query):
+    state = index._state
+    return (faq_index._full_matrix(state) @ state.vectorizer.transform([query]).T).toarray().ravel()
+
+
+def dense_top_k(scores, k, threshold, rows=None):
+    # Rujukan: cosine terhadap seluruh matriks, diurutkan skor menurun lalu baris menaik
+    candidates = range(len(scores)) if rows is None else rows
+    ranked = sorted((-scores[row], row) for row in candidates if scores[row] >= threshold and scores[row] > 0)
+    return [(row, -score) for score, row in ranked[:k]]
+
+
+def assert_same_results(results, expected, scores):
+    assert [score for _, score in results] == pytest.approx([score for _, score in expected])
+    # Baris dengan skor sama (mis. urutan kata dibalik) boleh bertukar tempat
+    assert [scores[row] for row, _ in results] == pytest.approx([score for _, score in results])
+
+
+@pytest.fixture(scope="module")
+def corpus_index():
+    import benchmark_faq
+
+    corpus = benchmark_faq.make_corpus(500, seed=3)
+    index = faq_index.FaqIndex(corpus, stop_words="english")
+    index.staleness_budget = 10_000
+    index.compact_interval = 10_000
+    # Baris delta (belum di-fit) ikut diperiksa; kata-katanya sudah ada di kosakata
+    index.add_many({"tag": row.tag, "question": " ".join(reversed(row.question.split())), "answer": row.answer}
+                   for row in corpus.iloc[:100].itertuples())
+    queries = benchmark_faq.make_queries(corpus, 60, distinct=60, seed=4)
+    return index, queries
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.1, 0.3, 0.6])
+@pytest.mark.parametrize("k", [1, 5])
+def test_inverted_top_k_matches_dense_cosine(corpus_index, threshold, k):
+    index, queries = corpus_index
+    assert index.stale_rows == 100
+    for query in queries:
+        index.strategy = "inverted"
+        inverted = index.search(query, k=k, threshold=threshold)
+        index.strategy = "dense"
+        dense = index.search(query, k=k, threshold=threshold)
+        index.strategy = "inverted"
+        scores = dense_scores(index, query)
+        assert_same_results(inverted, dense_top_k(scores, k, threshold), scores)
+        assert_same_results(dense, dense_top_k(scores, k, threshold), scores)
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.2, 0.4])
+def test_tag_partition_matches_dense_cosine_over_the_tag(corpus_index, threshold):
+    index, queries = corpus_index
+    tags = index.columns["tag"]
+    for tag in sorted(set(tags))[:4]:
+        rows = [row for row, value in enumerate(tags) if value == tag]
+        for query in queries:
+            # fallback_threshold 0: pencarian global hanya bila tag ini tidak punya hasil sama sekali
+            results = index.search(query, k=3, threshold=threshold, tag=tag, fallback_threshold=0.0)
+            scores = dense_scores(index, query)
+            expected = dense_top_k(scores, 3, threshold, rows)
+            if expected:
+                assert {row for row, _ in results} <= set(rows)
+            assert_same_results(results, expected or dense_top_k(scores, 3, threshold), scores)
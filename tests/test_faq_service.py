@@ -0,0 +1,112 @@
+"""faq_service request validation and a round trip through ServiceClient over real HTTP."""
+import asyncio
+import json
+
+import pandas as pd
+import pytest
+
+import analytics
+import faq_index
+import faq_service
+
+FAQ = pd.DataFrame({
+    "tag": ["cuti", "cuti", "gaji"],
+    "question": ["cuti tahunan pns", "cuti sakit pns", "gaji pokok pns"],
+    "answer": ["12 hari", "surat dokter", "lihat PP"],
+})
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "ENABLED", False)
+    faq_index._INDEXES.clear()
+    data_file = tmp_path / "faq_data.csv"
+    FAQ.to_csv(data_file, index=False)
+    service = faq_service.FaqService(str(data_file), str(tmp_path / "user_questions.csv"), workers=2)
+    service.index = service._load()
+    yield service
+    service._executor.shutdown()
+    faq_index._INDEXES.clear()
+
+
+def call(service, method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else b""
+    return asyncio.run(service.dispatch(method, path, data))
+
+
+def test_answer_and_batch(service):
+    status, result = call(service, "POST", "/answer", {"question": "Cuti sakit PNS?", "tag": None})
+    assert status == 200
+    assert result["answer"] == "surat dokter"
+    assert result["faq_id"] == faq_index.faq_key("cuti sakit pns")
+
+    status, result = call(service, "POST", "/answer/batch", {"questions": ["gaji pokok pns", "resep rendang"]})
+    assert status == 200
+    assert [r["answer"] for r in result["results"]] == ["lihat PP", None]
+
+
+def test_miss_returns_suggestions(service):
+    status, result = call(service, "POST", "/answer", {"question": "resep rendang"})
+
+    assert status == 200
+    assert result["answer"] is None
+    assert "suggestions" in result
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/answer", {"question": ""}),
+    ("/answer", {"question": ["cuti"]}),
+    ("/answer", {"question": "cuti pns", "tag": ["cuti"]}),
+    ("/answer", {"question": "cuti pns", "tag": 3}),
+    ("/answer/batch", {"questions": "cuti pns"}),
+    ("/answer/batch", {"questions": ["cuti pns", None]}),
+    ("/answer/batch", {"questions": ["cuti pns", {"q": 1}]}),
+    ("/submit_question", {"question": 5}),
+])
+def test_invalid_fields_are_bad_requests(service, path, body):
+    status, result = call(service, "POST", path, body)
+
+    assert status == 400
+    assert "error" in result
+
+
+def test_malformed_requests(service, monkeypatch):
+    assert asyncio.run(service.dispatch("POST", "/answer", b"{bukan json"))[0] == 400
+    assert asyncio.run(service.dispatch("POST", "/answer", b"[1, 2]"))[0] == 400
+    assert call(service, "GET", "/answer")[0] == 405
+    assert call(service, "GET", "/tidak-ada")[0] == 404
+    monkeypatch.setattr(faq_service, "MAX_BATCH", 1)
+    assert call(service, "POST", "/answer/batch", {"questions": ["a", "b"]})[0] == 413
+    service.index = None
+    assert call(service, "GET", "/health")[0] == 503
+
+
+def test_client_round_trip(service):
+    async def run():
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = faq_service.ServiceClient(f"http://127.0.0.1:{port}")
+        loop = asyncio.get_running_loop()
+        try:
+            async with server:
+                return await asyncio.gather(
+                    loop.run_in_executor(None, client.answer, "cuti tahunan pns", "cuti"),
+                    loop.run_in_executor(None, client.tags),
+                    loop.run_in_executor(None, client.submit_question, "kapan gaji ke-13 cair?"),
+                )
+        finally:
+            server.close()
+
+    answer, tags, status = asyncio.run(run())
+
+    assert answer["answer"] == "12 hari"
+    assert tags == ["cuti", "gaji"]
+    assert status == "submitted"
+    assert service._requests[("/answer", 200)] == 1
+
+
+def test_client_wraps_http_errors(service):
+    client = faq_service.ServiceClient("http://127.0.0.1:9", timeout=0.5)
+
+    with pytest.raises(faq_service.ServiceError):
+        client.tags()
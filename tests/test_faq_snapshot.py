@@ -0,0 +1,124 @@
+"""Saving an index as a .faqsnap and loading it back."""
+import os
+
+import pandas as pd
+import pytest
+
+import benchmark_faq
+import faq_index
+import faq_snapshot
+from inverted_index import InvertedIndex
+
+QUERIES = ["cuti tahunan", "gaji pokok pns", "cara mengajukan kenaikan pangkat", "resep nasi goreng"]
+
+
+@pytest.fixture(params=[{"stop_words": "english"}, faq_index.CHAR_MODE_PARAMS], ids=["word", "char"])
+def params(request):
+    return request.param
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "faq_data.csv"
+    benchmark_faq.make_corpus(300, seed=5).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    faq_index._INDEXES.clear()
+    yield
+    faq_index._INDEXES.clear()
+
+
+def get_index(data_file, params):
+    return faq_index.get_csv_index(data_file, lambda: pd.read_csv(data_file), **params)
+
+
+def results(index):
+    return [index.search(query, k=5, threshold=0.0) for query in QUERIES]
+
+
+def test_reloaded_snapshot_gives_the_same_results(tmp_path, params):
+    corpus = benchmark_faq.make_corpus(300, seed=5)
+    index = faq_index.FaqIndex(corpus, **params)
+    index.add({"tag": "cuti", "question": "cuti tahunan pegawai", "answer": "x"})
+    path = str(tmp_path / "index.faqsnap")
+    index.save(path)
+
+    loaded = faq_index.FaqIndex.load(path, index.source_hash, **params)
+
+    assert loaded is not None
+    assert list(loaded.columns["question"]) == list(index.columns["question"])
+    assert loaded.stale_rows == index.stale_rows
+    for got, expected in zip(results(loaded), results(index)):
+        assert [row for row, _ in got] == [row for row, _ in expected]
+        assert [score for _, score in got] == pytest.approx([score for _, score in expected], abs=1e-6)
+
+
+def test_snapshot_is_used_instead_of_a_rebuild(data_file, params, monkeypatch):
+    built = results(get_index(data_file, params))
+    faq_index._INDEXES.clear()
+    monkeypatch.setattr(faq_index, "_build", lambda *args: pytest.fail("snapshot tidak dipakai"))
+
+    assert results(get_index(data_file, params)) == built
+
+
+def test_stale_snapshot_is_rebuilt(data_file, params):
+    get_index(data_file, params)
+    faq_index._INDEXES.clear()
+    frame = pd.read_csv(data_file)
+    frame.loc[0, "question"] = "kenaikan pangkat reguler golongan"
+    frame.to_csv(data_file, index=False)
+
+    index = get_index(data_file, params)
+
+    assert index.columns["question"][0] == "kenaikan pangkat reguler golongan"
+    assert index.search("kenaikan pangkat reguler golongan")[0][0] == 0
+
+
+@pytest.mark.parametrize("damage", ["garbage", "truncated", "empty"])
+def test_corrupt_snapshot_is_rebuilt(data_file, params, damage):
+    expected = results(get_index(data_file, params))
+    snapshot = faq_index.index_path_for(data_file)
+    with open(snapshot, "rb") as f:
+        data = f.read()
+    with open(snapshot, "wb") as f:
+        f.write({"garbage": b"not a snapshot" * 100, "truncated": data[:len(data) // 2], "empty": b""}[damage])
+    faq_index._INDEXES.clear()
+
+    assert faq_index.FaqIndex.load(snapshot, faq_index.file_digest(data_file), **params) is None
+    assert results(get_index(data_file, params)) == expected
+
+
+def test_char_snapshot_only_stores_features_in_use(tmp_path):
+    index = faq_index.FaqIndex(benchmark_faq.make_corpus(300, seed=5), **faq_index.CHAR_MODE_PARAMS)
+    path = str(tmp_path / "index.faqsnap")
+    index.save(path)
+
+    snapshot = faq_snapshot.Snapshot(path)
+    n_terms = len(snapshot.array("postings:terms"))
+    assert n_terms < snapshot.header["n_features"] // 10
+    assert len(snapshot.array("postings:max_weight")) == n_terms
+    assert len(snapshot.array("postings:indptr")) == n_terms + 1
+    assert len(snapshot.array("idf:values")) < snapshot.header["n_features"] // 10
+    assert os.path.getsize(path) < 1024 * 1024
+
+    loaded = faq_index.FaqIndex.load(path, index.source_hash, **faq_index.CHAR_MODE_PARAMS)
+    assert (loaded._state.vectorizer.idf_ == index._state.vectorizer.idf_).all()
+    assert (loaded._state.inverted._indptr == index._state.inverted._indptr).all()
+    assert (loaded._state.inverted._max_weight == index._state.inverted._max_weight).all()
+
+
+def test_snapshot_with_dense_postings_is_rebuilt(data_file, params, monkeypatch):
+    # Format lama: indptr dan max_weight disimpan untuk setiap fitur, tanpa postings:terms
+    monkeypatch.setattr(InvertedIndex, "arrays", lambda self: {
+        "indptr": self._indptr, "docs": self._docs, "weights": self._weights, "max_weight": self._max_weight})
+    expected = results(get_index(data_file, params))
+    monkeypatch.undo()
+    faq_index._INDEXES.clear()
+
+    assert faq_index.FaqIndex.load(faq_index.index_path_for(data_file), faq_index.file_digest(data_file),
+                                   **params) is None
+    assert results(get_index(data_file, params)) == expected
+    assert faq_snapshot.Snapshot(faq_index.index_path_for(data_file)).has_array("postings:terms")
@@ -0,0 +1,210 @@
+"""Moderation of pending questions and the db_pool helpers, against SQLite instead of MySQL."""
+import importlib
+import os
+import sqlite3
+import sys
+
+import pytest
+from mysql.connector import pooling
+
+import db_pool
+import storage
+
+
+class CountingConnection:
+    """sqlite3 connection that counts commits and executed statements, like a pooled MySQL one."""
+
+    def __init__(self, path, counts):
+        self._conn = sqlite3.connect(path)
+        self._counts = counts
+
+    def cursor(self):
+        counts = self._counts
+        cursor = self._conn.cursor()
+
+        class Cursor:
+            def execute(self, sql, params=()):
+                counts["execute"] += 1
+                return cursor.execute(sql, params)
+
+            def __getattr__(self, name):
+                return getattr(cursor, name)
+
+        return Cursor()
+
+    def commit(self):
+        self._counts["commit"] += 1
+        self._conn.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    # Skrip Streamlit diimpor dalam "bare mode" dengan SQLite sebagai CHATBOT_STORAGE
+    workdir = tmp_path_factory.mktemp("sql_app")
+    old_cwd, old_storage = os.getcwd(), os.environ.get("CHATBOT_STORAGE")
+    os.environ["CHATBOT_STORAGE"] = f"sqlite:{workdir / 'chatbot.sqlite'}"
+    os.chdir(workdir)
+    try:
+        sys.modules.pop("chatbot_tfidf_sql_admin", None)
+        module = importlib.import_module("chatbot_tfidf_sql_admin")
+        module.warm_up_index().result()
+        yield module
+    finally:
+        os.chdir(old_cwd)
+        if old_storage is None:
+            os.environ.pop("CHATBOT_STORAGE", None)
+        else:
+            os.environ["CHATBOT_STORAGE"] = old_storage
+        sys.modules.pop("chatbot_tfidf_sql_admin", None)
+
+
+@pytest.fixture
+def tables(app):
+    with app.STORE.transaction() as tx:
+        tx.delete_all("faq")
+        tx.delete_all("pending")
+    return app.FAQ_TABLE, app.PENDING_TABLE
+
+
+def questions(table):
+    return sorted(table.rows()["question"])
+
+
+def add_pending(app, *pairs):
+    for question, answer in pairs:
+        app.add_pending(question, answer)
+
+
+def test_bulk_approve_moves_every_row_in_one_commit(app, tables, monkeypatch):
+    faq, pending = tables
+    add_pending(app, ("cuti pns", "12 hari"), ("gaji guru", "lihat PP"), ("pensiun dini", "usia 50"))
+    counts = {"execute": 0, "commit": 0}
+    monkeypatch.setattr(app.STORE, "_connect", lambda: CountingConnection(app.STORE.path, counts))
+
+    app.moderate_questions(approve=[("cuti pns", "12 hari"), ("gaji guru", "lihat PP")])
+    monkeypatch.undo()
+
+    assert counts["commit"] == 1
+    assert questions(faq) == ["cuti pns", "gaji guru"]
+    assert questions(pending) == ["pensiun dini"]
+
+
+def test_failure_mid_batch_rolls_back_insert_and_delete(app, tables):
+    faq, pending = tables
+    add_pending(app, ("cuti pns", "12 hari"), ("gaji guru", "lihat PP"))
+    version = faq.version()
+
+    # Baris kedua tidak bisa di-bind oleh sqlite3: baris pertama sudah masuk, lalu dibatalkan
+    app.moderate_questions(approve=[("cuti pns", "12 hari"), ("gaji guru", object())])
+
+    assert questions(faq) == []
+    assert questions(pending) == ["cuti pns", "gaji guru"]
+    assert faq.version() == version
+
+
+def test_reject_only_deletes_from_pending(app, tables):
+    faq, pending = tables
+    add_pending(app, ("cuti pns", "12 hari"), ("gaji guru", "lihat PP"))
+
+    app.moderate_questions(reject=["gaji guru"])
+
+    assert questions(faq) == []
+    assert questions(pending) == ["cuti pns"]
+
+
+def test_approve_and_reject_overlap(app, tables):
+    # Seperti "Setujui klaster": perwakilan disetujui, semua anggota klaster dihapus dari pending
+    faq, pending = tables
+    add_pending(app, ("cuti pns", "12 hari"), ("cuti pns?", "12"), ("gaji guru", "lihat PP"))
+
+    app.moderate_questions(approve=[("cuti pns", "12 hari")], reject=["cuti pns", "cuti pns?"])
+
+    assert questions(faq) == ["cuti pns"]
+    assert questions(pending) == ["gaji guru"]
+
+
+def test_approving_an_existing_faq_is_ignored(app, tables):
+    faq, pending = tables
+    add_pending(app, ("cuti pns", "12 hari"))
+    app.moderate_questions(approve=[("cuti pns", "12 hari")])
+    add_pending(app, ("cuti pns", "jawaban lain"))
+
+    app.moderate_questions(approve=[("cuti pns", "jawaban lain")])
+
+    assert faq.rows()["answer"].tolist() == ["12 hari"]
+    assert questions(pending) == []
+
+
+@pytest.fixture
+def fake_pool(tmp_path, monkeypatch):
+    counts = {"execute": 0, "commit": 0, "direct": 0}
+    path = str(tmp_path / "pool.sqlite")
+
+    class Pool:
+        exhausted = False
+
+        def get_connection(self):
+            if self.exhausted:
+                raise pooling.PoolError("Failed getting connection; pool exhausted")
+            conn = CountingConnection(path, counts)
+            conn.ping = lambda **kwargs: None
+            return conn
+
+    def connect(**config):
+        counts["direct"] += 1
+        return CountingConnection(path, counts)
+
+    pool = Pool()
+    monkeypatch.setattr(db_pool, "_pool", pool)
+    monkeypatch.setattr(db_pool, "_schema_ready", False)
+    monkeypatch.setattr(db_pool.mysql.connector, "connect", connect)
+    return pool, counts
+
+
+def test_ensure_schema_runs_ddl_once_per_process(fake_pool):
+    _, counts = fake_pool
+    ddl = ["CREATE TABLE IF NOT EXISTS faq (id INTEGER PRIMARY KEY, question TEXT)"]
+
+    assert db_pool.ensure_schema(ddl)
+    assert db_pool.ensure_schema(ddl)
+
+    assert counts["execute"] == 1
+    assert counts["commit"] == 1
+
+
+def test_sqlite_store_ensure_schema_runs_once(tmp_path, monkeypatch):
+    store = storage.SqliteStore(str(tmp_path / "store.sqlite"))
+    counts = {"execute": 0, "commit": 0}
+    monkeypatch.setattr(store, "_connect", lambda: CountingConnection(store.path, counts))
+    ddl = ["CREATE TABLE IF NOT EXISTS faq (id INT AUTO_INCREMENT PRIMARY KEY, question TEXT)"]
+
+    store.ensure_schema(ddl)
+    store.ensure_schema(ddl)
+
+    assert counts["commit"] == 1
+
+
+def test_get_connection_falls_back_when_pool_exhausted(fake_pool):
+    pool, counts = fake_pool
+    pool.exhausted = True
+
+    conn = db_pool.get_connection()
+
+    assert conn is not None
+    assert counts["direct"] == 1
+    conn.close()
+
+
+def test_get_connection_returns_none_when_fallback_fails(fake_pool, monkeypatch):
+    pool, _ = fake_pool
+    pool.exhausted = True
+
+    def refuse(**config):
+        raise db_pool.mysql.connector.Error("Can't connect to MySQL server")
+
+    monkeypatch.setattr(db_pool.mysql.connector, "connect", refuse)
+
+    assert db_pool.get_connection() is None
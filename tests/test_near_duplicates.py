@@ -0,0 +1,69 @@
+"""MinHash/LSH clustering of submitted questions."""
+import near_duplicates
+
+
+def members(clusters):
+    return sorted(sorted(cluster.members) for cluster in clusters)
+
+
+def feed(questions):
+    clusters = near_duplicates.QuestionClusters()
+    clusters.extend(enumerate(questions), len(questions))
+    return clusters
+
+
+def test_near_duplicates_share_a_cluster_and_other_questions_do_not():
+    clusters = feed(["Bagaimana cara mengajukan cuti tahunan PNS?",
+                     "bagaimana cara mengajukan cuti tahunan pns",
+                     "Bagaimana cara mengajukan cuti tahunan bagi PNS?",
+                     "Kapan gaji ke-13 dibayarkan?"])
+
+    page, next_after = clusters.page(limit=10)
+
+    assert next_after is None
+    assert members(page) == [
+        ["Bagaimana cara mengajukan cuti tahunan PNS?", "Bagaimana cara mengajukan cuti tahunan bagi PNS?",
+         "bagaimana cara mengajukan cuti tahunan pns"],
+        ["Kapan gaji ke-13 dibayarkan?"],
+    ]
+    assert clusters.cluster_count() == 2
+    assert clusters.cluster_count(min_members=2) == 1
+
+
+def test_representative_is_the_most_submitted_phrasing_and_key_the_first_row():
+    clusters = feed(["Kapan gaji ke-13 dibayarkan?",
+                     "cuti tahunan pns berapa hari",
+                     "cuti tahunan PNS berapa hari?",
+                     "cuti tahunan PNS berapa hari?"])
+
+    page, _ = clusters.page(limit=10, min_members=2)
+
+    assert len(page) == 1
+    assert page[0].key == 1
+    assert page[0].representative == "cuti tahunan PNS berapa hari?"
+    assert page[0].count == 3
+
+
+def test_pages_follow_cluster_keys_and_search():
+    questions = ["cuti tahunan pns", "gaji ke-13 kapan cair", "cara login ekinerja", "syarat kenaikan pangkat",
+                 "tunjangan keluarga anak", "jadwal absen apel pagi", "mutasi antar instansi daerah"]
+    clusters = feed(questions)
+    assert clusters.cluster_count() == 7
+
+    seen, after = [], -1
+    while after is not None:
+        page, after = clusters.page(after, limit=3)
+        seen.extend(cluster.key for cluster in page)
+    assert seen == list(range(7))
+
+    page, after = clusters.page(limit=3, search="KENAIKAN")
+    assert [cluster.key for cluster in page] == [3]
+    assert after is None
+
+
+def test_empty_questions_are_skipped():
+    clusters = feed(["", "   ", None, "cuti pns"])
+
+    assert clusters.total == 1
+    assert clusters.seen == 4
+    assert clusters.cluster_count() == 1
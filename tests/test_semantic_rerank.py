@@ -0,0 +1,152 @@
+"""Embedding re-ranking with a stub encoder instead of a sentence-transformers model."""
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import faq_index
+import semantic_rerank
+
+FAQ = pd.DataFrame({
+    "tag": ["cuti", "cuti", "gaji"],
+    "question": ["cuti tahunan pns", "cuti sakit pns", "gaji pokok pns"],
+    "answer": ["A", "B", "C"],
+})
+# Kata -> dimensi "makna"; demam dan sakit dianggap sama oleh encoder tiruan ini
+CONCEPTS = {"tahunan": 0, "sakit": 1, "demam": 1, "gaji": 2}
+
+
+class Encoder:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        vectors = np.zeros((len(texts), 4), dtype=np.float32)
+        for i, text in enumerate(texts):
+            dims = {CONCEPTS[word] for word in text.split() if word in CONCEPTS} or {3}
+            vectors[i, list(dims)] = 1.0
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def wait_for_embeddings(reranker, index):
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        embeddings = reranker.embeddings(index)
+        if embeddings is not None:
+            return embeddings
+        time.sleep(0.01)
+    pytest.fail("embedding tidak selesai dibangun")
+
+
+@pytest.fixture
+def index():
+    return faq_index.FaqIndex(FAQ, stop_words="english")
+
+
+@pytest.fixture
+def encoder():
+    return Encoder()
+
+
+@pytest.fixture
+def make_reranker(tmp_path, encoder):
+    def make(**kwargs):
+        kwargs.setdefault("budget_ms", 5000)
+        return semantic_rerank.Reranker(encoder, str(tmp_path / "faq.embeddings.faqsnap"), model="stub",
+                                        batcher=semantic_rerank.QueryBatcher(encoder), **kwargs)
+    return make
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("int8", 0.01), ("float16", 0.001)])
+def test_quantized_embeddings_survive_save_and_load(tmp_path, dtype, tolerance):
+    vectors = np.random.default_rng(0).normal(size=(50, 16)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors[7] = 0.0
+    values, scales = semantic_rerank.quantize(vectors, dtype)
+    hashes = semantic_rerank.question_hashes([f"q{i}" for i in range(50)])
+    path = str(tmp_path / "emb.faqsnap")
+
+    semantic_rerank.Embeddings(values, scales, hashes, "stub", dtype).save(path)
+    loaded = semantic_rerank.Embeddings.load(path)
+
+    assert (loaded.model, loaded.dtype, len(loaded)) == ("stub", dtype, 50)
+    assert (loaded.hashes == hashes).all()
+    rows = np.arange(50)
+    assert loaded.rows(rows) == pytest.approx(vectors, abs=tolerance)
+    assert (loaded.rows(rows) @ vectors[3])[3] == pytest.approx(1.0, abs=2 * tolerance)
+
+
+def test_unknown_dtype_is_rejected():
+    with pytest.raises(ValueError):
+        semantic_rerank.quantize(np.ones((1, 2), dtype=np.float32), "int4")
+
+
+def test_rerank_picks_the_closest_candidate(index, make_reranker):
+    reranker = make_reranker()
+    assert reranker.embeddings(index) is None
+    wait_for_embeddings(reranker, index)
+
+    # TF-IDF: "cuti tahunan" dan "cuti sakit" sama kuat; embedding memilih "cuti sakit"
+    result, final = reranker.rerank(index, "cuti pns demam")
+
+    lexical = dict(index.search("cuti pns demam", k=3, threshold=0.0))
+    assert final
+    assert result == ("B", pytest.approx(lexical[1]), index.faq_id(1), pytest.approx(1.0))
+
+
+def test_rerank_keeps_the_lexical_answer_when_nothing_is_close(index, make_reranker):
+    reranker = make_reranker()
+    wait_for_embeddings(reranker, index)
+
+    assert reranker.rerank(index, "cuti pns") == (None, True)
+    assert reranker.rerank(index, "resep rendang") == (None, True)
+
+
+def test_rerank_falls_back_while_embeddings_are_built(index, make_reranker):
+    assert make_reranker().rerank(index, "cuti pns demam") == (None, False)
+
+
+def test_only_new_rows_are_encoded_and_the_file_is_reused(index, make_reranker, encoder):
+    wait_for_embeddings(make_reranker(), index)
+    assert encoder.encoded == list(FAQ["question"])
+
+    del encoder.encoded[:]
+    index.add({"tag": "cuti", "question": "cuti demam berdarah", "answer": "D"})
+    reranker = make_reranker()
+    embeddings = wait_for_embeddings(reranker, index)
+
+    assert encoder.encoded == ["cuti demam berdarah"]
+    assert len(embeddings) == 4
+    assert reranker.rerank(index, "cuti sakit berdarah")[0][0] in ("B", "D")
+
+
+def test_each_index_snapshot_gets_its_own_embeddings_file(tmp_path, monkeypatch, encoder):
+    monkeypatch.setattr(semantic_rerank, "ENABLED", True)
+    monkeypatch.setattr(semantic_rerank, "RERANK_FILE", None)
+    monkeypatch.setattr(semantic_rerank, "_batcher", semantic_rerank.QueryBatcher(encoder))
+    monkeypatch.setattr(semantic_rerank, "_rerankers", {})
+    csv_index, sql_index, other = (faq_index.FaqIndex(FAQ, stop_words="english") for _ in range(3))
+    csv_index.snapshot_path = str(tmp_path / "faq_data.faqsnap")
+    sql_index.snapshot_path = str(tmp_path / "faq_db.faqsnap")
+    other.snapshot_path = csv_index.snapshot_path
+
+    csv_reranker = semantic_rerank.reranker(csv_index)
+
+    assert csv_reranker.path == str(tmp_path / "faq_data.embeddings.faqsnap")
+    assert semantic_rerank.reranker(sql_index).path == str(tmp_path / "faq_db.embeddings.faqsnap")
+    assert semantic_rerank.reranker(other) is csv_reranker
+    assert semantic_rerank.embeddings_path_for("faq_data.faqsnap") == "faq_data.embeddings.faqsnap"
+
+
+def test_disabled_or_unsaved_index(monkeypatch, encoder, index):
+    monkeypatch.setattr(semantic_rerank, "ENABLED", False)
+    assert semantic_rerank.reranker(index) is None
+
+    monkeypatch.setattr(semantic_rerank, "ENABLED", True)
+    monkeypatch.setattr(semantic_rerank, "RERANK_FILE", None)
+    monkeypatch.setattr(semantic_rerank, "_batcher", semantic_rerank.QueryBatcher(encoder))
+    monkeypatch.setattr(semantic_rerank, "_rerankers", {})
+    # Indeks tanpa snapshot: embedding hanya disimpan di memori
+    assert semantic_rerank.reranker(index).path is None
@@ -0,0 +1,182 @@
+"""CsvTable writes and SQL table versions, the counters in table_versions that index reloads rely on."""
+import pandas as pd
+import pytest
+
+import db_pool
+import storage
+
+COLUMNS = ["id", "question", "answer"]
+SCHEMA = ["CREATE TABLE IF NOT EXISTS faq (id INT AUTO_INCREMENT PRIMARY KEY, question TEXT, answer TEXT)"]
+
+
+@pytest.fixture
+def csv_table(tmp_path):
+    table = storage.CsvTable(str(tmp_path / "faq.csv"), ["tag", "question", "answer"])
+    table.ensure()
+    return table
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = storage.SqliteStore(str(tmp_path / "store.sqlite"))
+    store.ensure_schema(SCHEMA)
+    return store
+
+
+@pytest.fixture
+def table(store):
+    return store.table("faq", COLUMNS)
+
+
+def test_csv_insert_delete_and_update(csv_table):
+    csv_table.insert({"tag": "cuti", "question": "cuti pns", "answer": "12 hari"})
+    csv_table.insert_many([{"tag": "gaji", "question": 'gaji "ke-13", kapan?', "answer": "Juni\natau Juli"},
+                           {"tag": "cuti", "question": "cuti sakit", "answer": None}])
+
+    frame = csv_table.rows()
+    assert frame["question"].tolist() == ["cuti pns", 'gaji "ke-13", kapan?', "cuti sakit"]
+    assert frame["answer"][1] == "Juni\natau Juli"
+    assert pd.isna(frame["answer"][2])
+
+    assert csv_table.update("question", "cuti pns", {"answer": "14 hari"}) == 1
+    assert csv_table.update("question", "tidak ada", {"answer": "x"}) == 0
+    assert csv_table.delete("tag", ["gaji"]) == 1
+    assert csv_table.delete("tag", ["gaji"]) == 0
+
+    frame = csv_table.rows()
+    assert frame["question"].tolist() == ["cuti pns", "cuti sakit"]
+    assert frame["answer"][0] == "14 hari"
+
+
+def test_csv_version_changes_with_every_write(csv_table):
+    versions = [csv_table.version()]
+    csv_table.insert({"tag": "cuti", "question": "cuti pns", "answer": "12 hari"})
+    versions.append(csv_table.version())
+    csv_table.update("question", "cuti pns", {"answer": "14 hari"})
+    versions.append(csv_table.version())
+    csv_table.delete("question", ["cuti pns"])
+    versions.append(csv_table.version())
+
+    assert len(set(versions)) == len(versions)
+    assert csv_table.version() == versions[-1]
+
+
+def test_csv_missing_file_reads_as_empty(tmp_path):
+    table = storage.CsvTable(str(tmp_path / "belum_ada.csv"), ["question", "answer"])
+
+    assert table.version() is None
+    assert table.rows().empty
+    assert list(table.rows().columns) == ["question", "answer"]
+
+
+def test_sql_inserts_bump_only_the_write_counter(table):
+    start = table.version()
+    assert start == (0, 0, None)
+
+    table.insert({"question": "cuti pns", "answer": "12 hari"})
+    table.insert_many([{"question": "gaji pns", "answer": "PP"}, {"question": "pensiun", "answer": "58"}])
+
+    assert table.version() == (2, 0, 3)
+
+
+def test_sql_deletes_and_updates_bump_the_rewrite_counter(table):
+    table.insert_many([{"question": "cuti pns", "answer": "12 hari"}, {"question": "gaji pns", "answer": "PP"}])
+
+    assert table.update("question", "cuti pns", {"answer": "14 hari"}) == 1
+    assert table.version() == (2, 1, 2)
+    assert table.delete("question", ["gaji pns"]) == 1
+    assert table.version() == (3, 2, 1)
+
+
+def test_rolled_back_write_leaves_the_version_alone(store, table):
+    table.insert({"question": "cuti pns", "answer": "12 hari"})
+    version = table.version()
+
+    with pytest.raises(storage.StorageError):
+        with store.transaction() as tx:
+            tx.insert_many("faq", [{"question": "gaji pns", "answer": "PP"}])
+            tx.insert_many("faq", [{"question": "pensiun", "answer": object()}])
+
+    assert table.version() == version
+    assert table.rows()["question"].tolist() == ["cuti pns"]
+
+
+def test_appended_only_tells_appends_from_rewrites(store, table):
+    table.insert_many([{"question": "cuti pns", "answer": "12 hari"}, {"question": "gaji pns", "answer": "PP"}])
+    since = table.version()
+
+    table.insert({"question": "pensiun", "answer": "58"})
+    assert table.appended_only(since, table.version(), 2)
+
+    table.delete("question", ["pensiun"])
+    assert not table.appended_only(since, table.version(), 2)
+
+
+def test_appended_only_catches_deletes_outside_the_app(store, table):
+    table.insert_many([{"question": "cuti pns", "answer": "12 hari"}, {"question": "gaji pns", "answer": "PP"}])
+    since = table.version()
+    # Langsung lewat koneksi, tanpa menaikkan table_versions
+    with store.connection() as conn:
+        conn.execute("DELETE FROM faq WHERE question = 'cuti pns'")
+        conn.commit()
+    table.insert({"question": "pensiun", "answer": "58"})
+
+    assert table.version()[1] == since[1]
+    assert not table.appended_only(since, table.version(), 2)
+
+
+def test_empty_table_is_appended_only_when_nothing_was_read(table):
+    since = table.version()
+    table.insert({"question": "cuti pns", "answer": "12 hari"})
+
+    assert table.appended_only(since, table.version(), 0)
+
+
+def test_page_search_treats_like_wildcards_literally(table):
+    table.insert_many([{"question": "diskon 50% gaji", "answer": "a"}, {"question": "diskon 500 gaji", "answer": "b"},
+                       {"question": "kode_a", "answer": "c"}, {"question": "kodeXa", "answer": "d"},
+                       {"question": "jalur C:\\data", "answer": "e"}, {"question": "jalur C:data", "answer": "f"}])
+
+    def search(text):
+        frame, _ = table.page(0, 10, text)
+        return frame["question"].tolist()
+
+    assert search("50%") == ["diskon 50% gaji"]
+    assert search("kode_a") == ["kode_a"]
+    assert search("C:\\data") == ["jalur C:\\data"]
+
+
+def test_page_follows_ids(table):
+    table.insert_many([{"question": f"pertanyaan {i}", "answer": "x"} for i in range(5)])
+
+    frame, next_id = table.page(0, 2)
+    assert frame["id"].tolist() == [1, 2] and next_id == 2
+    frame, next_id = table.page(next_id, 2)
+    assert frame["id"].tolist() == [3, 4] and next_id == 4
+    frame, next_id = table.page(next_id, 2)
+    assert frame["id"].tolist() == [5] and next_id is None
+
+
+def test_unreachable_sqlite_database_raises(tmp_path):
+    store = storage.SqliteStore(str(tmp_path / "tidak_ada" / "store.sqlite"))
+
+    with pytest.raises(storage.StorageError):
+        store.ensure_schema(SCHEMA)
+
+
+def test_mysql_schema_failure_raises(monkeypatch):
+    monkeypatch.setattr(db_pool, "_schema_ready", False)
+    monkeypatch.setattr(db_pool, "get_connection", lambda: None)
+
+    with pytest.raises(storage.StorageError):
+        storage.MysqlStore().ensure_schema(SCHEMA)
+
+
+def test_mysql_ddl_error_raises(monkeypatch):
+    def failing(statements):
+        raise db_pool.mysql.connector.ProgrammingError("syntax error")
+
+    monkeypatch.setattr(db_pool, "ensure_schema", failing)
+
+    with pytest.raises(storage.StorageError):
+        storage.MysqlStore().ensure_schema(SCHEMA)
@@ -0,0 +1,124 @@
+"""Stage timings, counters and the reports built from them."""
+import pytest
+
+import tracing
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", True)
+    monkeypatch.setattr(tracing, "TRACE_FILE", None)
+    tracing.reset()
+    yield
+    tracing.reset()
+
+
+def stats():
+    return {row["tahap"]: row for row in tracing.stage_stats()}
+
+
+def test_disabled_tracing_is_a_no_op(monkeypatch):
+    monkeypatch.setattr(tracing, "ENABLED", False)
+    tracing.reset()
+
+    def func():
+        return 1
+
+    assert tracing.traced("stage")(func) is func
+    assert tracing.span("stage") is tracing.request("stage")
+    with tracing.span("stage"):
+        tracing.incr("event")
+    assert (tracing.stage_stats(), tracing.counters()) == ([], {})
+
+
+def test_traced_and_span_record_every_call(enabled):
+    @tracing.traced("hitung")
+    def hitung(x):
+        return x * 2
+
+    assert [hitung(i) for i in range(3)] == [0, 2, 4]
+    with tracing.span("tahap"):
+        pass
+    with pytest.raises(ValueError):
+        with tracing.span("tahap"):
+            raise ValueError
+
+    assert stats()["hitung"]["jumlah"] == 3
+    assert stats()["tahap"]["jumlah"] == 2
+    assert hitung.__name__ == "hitung"
+
+
+def test_histogram_quantile_and_sorting(enabled):
+    for _ in range(19):
+        tracing.record("cepat", 0.0002)
+    tracing.record("cepat", 0.3)
+    tracing.record("lambat", 2.0)
+
+    rows = tracing.stage_stats()
+    assert [row["tahap"] for row in rows] == ["lambat", "cepat"]
+    cepat = stats()["cepat"]
+    assert cepat["jumlah"] == 20
+    assert cepat["p95_ms"] == 0.5
+    assert cepat["maks_ms"] == 300.0
+
+
+def test_counters(enabled):
+    tracing.incr("cache.hit")
+    tracing.incr("cache.hit", 2)
+    tracing.incr("cache.miss")
+
+    assert tracing.counters() == {"cache.hit": 3, "cache.miss": 1}
+
+
+def test_request_collects_its_stages(enabled):
+    @tracing.traced("jawab", is_request=True)
+    def jawab():
+        with tracing.span("cari"):
+            pass
+        with tracing.span("format"):
+            pass
+
+    jawab()
+    with tracing.span("di luar request"):
+        pass
+    with tracing.request("kedua"):
+        pass
+
+    recent = tracing.recent_requests()
+    assert [entry["request"] for entry in recent] == ["kedua", "jawab"]
+    assert [stage for stage, _ in recent[1]["stages"]] == ["cari", "format"]
+    assert recent[0]["stages"] == []
+
+
+def test_recent_requests_are_bounded(enabled):
+    for i in range(tracing.RECENT_REQUESTS + 5):
+        with tracing.request(f"r{i}"):
+            pass
+
+    recent = tracing.recent_requests()
+    assert len(recent) == tracing.RECENT_REQUESTS
+    assert recent[0]["request"] == f"r{tracing.RECENT_REQUESTS + 4}"
+
+
+def test_render_prometheus(enabled):
+    tracing.record('tahap "a"', 0.002)
+    tracing.record('tahap "a"', 20.0)
+    tracing.incr("cache.hit", 4)
+
+    lines = tracing.render_prometheus().splitlines()
+
+    assert 'chatbot_stage_duration_seconds_bucket{stage="tahap \\"a\\"",le="0.0025"} 1' in lines
+    assert 'chatbot_stage_duration_seconds_bucket{stage="tahap \\"a\\"",le="10.0"} 1' in lines
+    assert 'chatbot_stage_duration_seconds_bucket{stage="tahap \\"a\\"",le="+Inf"} 2' in lines
+    assert 'chatbot_stage_duration_seconds_sum{stage="tahap \\"a\\""} 20.002000' in lines
+    assert 'chatbot_stage_duration_seconds_count{stage="tahap \\"a\\""} 2' in lines
+    assert 'chatbot_events_total{event="cache.hit"} 4' in lines
+
+
+def test_dump_writes_the_prometheus_text(enabled, tmp_path):
+    tracing.incr("cache.hit")
+    path = tmp_path / "metrics.prom"
+
+    tracing.dump(str(path))
+
+    assert path.read_text(encoding="utf-8") == tracing.render_prometheus()
@@ -0,0 +1,92 @@
+"""UserStore login checks, lockout and cache eviction on writes."""
+import bcrypt
+import pytest
+
+import user_store
+
+
+def hashed(password):
+    # Biaya rendah agar tes cepat; verifikasi tidak bergantung pada jumlah round
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=4)).decode()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(user_store, "_dummy_hash", hashed("dummy").encode())
+    store = user_store.UserStore(str(tmp_path / "users.csv"))
+    store.table.ensure()
+    store.add("admin", hashed("rahasia"), "admin")
+    return store
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    calls = []
+    checkpw = bcrypt.checkpw
+
+    def counting(password, hashed_password):
+        calls.append(hashed_password)
+        return checkpw(password, hashed_password)
+
+    monkeypatch.setattr(user_store.bcrypt, "checkpw", counting)
+    return calls
+
+
+def test_verify_returns_role_only_for_the_right_password(store):
+    assert store.verify("admin", "rahasia") == "admin"
+    assert store.verify("admin", "salah") is None
+
+
+def test_legacy_bytes_literal_hashes_still_verify(tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text(f"username,password,role\nlama,b'{hashed('pw')}',user\n", encoding="utf-8")
+
+    assert user_store.UserStore(str(path)).verify("lama", "pw") == "user"
+
+
+def test_successful_login_is_cached_until_the_password_changes(store, checks):
+    assert store.verify("admin", "rahasia") == "admin"
+    assert store.verify("admin", "rahasia") == "admin"
+    assert len(checks) == 1
+
+    assert store.set_password("admin", hashed("baru"))
+
+    assert store.verify("admin", "rahasia") is None
+    assert store.verify("admin", "baru") == "admin"
+
+
+def test_repeated_failures_lock_the_account(store):
+    for _ in range(user_store.MAX_FAILURES):
+        assert store.verify("admin", "salah") is None
+
+    assert store.is_locked("admin")
+    assert store.verify("admin", "rahasia") is None
+
+
+def test_unknown_users_are_hashed_and_throttled_like_known_ones(store, checks):
+    assert store.verify("tidak-ada", "apa saja") is None
+    assert checks == [user_store._dummy_hash]
+
+    for _ in range(user_store.MAX_FAILURES - 1):
+        store.verify("tidak-ada", "apa saja")
+    assert store.is_locked("tidak-ada")
+
+    # Setelah terkunci tidak ada bcrypt sama sekali, sama seperti username yang ada
+    del checks[:]
+    store.verify("tidak-ada", "apa saja")
+    assert checks == []
+
+
+def test_add_rejects_a_taken_username(store):
+    assert not store.add("admin", hashed("lain"), "user")
+    assert store.add("budi", hashed("pw"), "user")
+    assert store.verify("budi", "pw") == "user"
+
+
+def test_external_file_changes_are_picked_up(store, tmp_path):
+    other = user_store.UserStore(store.path)
+    assert other.verify("admin", "rahasia") == "admin"
+
+    store.set_password("admin", hashed("baru"))
+
+    assert other.verify("admin", "baru") == "admin"
@@ -0,0 +1,68 @@
+"""Typo-tolerant character n-gram features for the FAQ index.
+
+``HashedTfidfVectorizer`` hashes ``char_wb`` n-grams into a fixed feature
+space, so there is no vocabulary to fit or store: misspellings such as
+"ekinrja" or "cutii" still share most of their n-grams with the correct
+word, and new FAQ rows never fall outside the feature space. Only the IDF
+weights are fitted. Counts and weights are float32 and the number of
+columns is bounded by ``n_features``, so memory grows with the corpus text
+and not with the number of distinct n-grams.
+"""
+import re
+import unicodedata
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+
+CHAR_NGRAM_RANGE = (3, 5)
+HASH_FEATURES = 2 ** 18
+
+# Kata fungsi bahasa Indonesia yang tidak membantu membedakan pertanyaan
+INDONESIAN_STOP_WORDS = frozenset("""
+ada adalah agar akan aku anda apa apakah atau bagaimana bagi bahwa bapak beberapa begitu belum
+berapa bisa boleh bu cara dalam dan dapat dari dengan di dia ibu ini itu jadi jika juga kalau
+kami kamu kapan karena ke kenapa kepada ketika kita lagi lah mana masih mau melalui mengapa
+menjadi mereka mohon nya oleh pada para pak saat saja sama sampai saya sebagai sebelum sedang
+sehingga sekarang selama semua sendiri seperti siapa sudah supaya tanya tentang terhadap tersebut
+tetapi tidak untuk yaitu yakni yang
+""".split())
+
+_WORD = re.compile(r"\w+")
+
+
+def strip_stop_words(text):
+    # Huruf kecil, tanda baca dibuang, kata fungsi dihapus sebelum dipotong menjadi n-gram
+    words = _WORD.findall(unicodedata.normalize("NFKC", str(text)).casefold())
+    return " ".join(word for word in words if word not in INDONESIAN_STOP_WORDS)
+
+
+class HashedTfidfVectorizer:
+    """TF-IDF over hashed ``char_wb`` n-grams; the vectorizer for ``mode="char"``."""
+
+    def __init__(self, ngram_range=CHAR_NGRAM_RANGE, n_features=HASH_FEATURES, stop_words="indonesian"):
+        if stop_words not in (None, "indonesian"):
+            raise ValueError(f"stop_words {stop_words!r} tidak didukung untuk mode char")
+        self.n_features = n_features
+        self._hasher = HashingVectorizer(
+            analyzer="char_wb", ngram_range=tuple(ngram_range), n_features=n_features,
+            alternate_sign=False, norm=None, dtype=np.float32,
+            preprocessor=strip_stop_words if stop_words else None)
+        self._tfidf = TfidfTransformer(sublinear_tf=True)
+
+    @property
+    def idf_(self):
+        return self._tfidf.idf_
+
+    @idf_.setter
+    def idf_(self, idf):
+        self._tfidf.idf_ = np.asarray(idf, dtype=np.float32)
+
+    def fit_transform(self, texts):
+        counts = self._hasher.transform(texts)
+        if not counts.nnz:
+            # Sama dengan TfidfVectorizer saat semua teks kosong/stop words
+            raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+        return self._tfidf.fit_transform(counts).astype(np.float32, copy=False)
+
+    def transform(self, texts):
+        return self._tfidf.transform(self._hasher.transform(texts)).astype(np.float32, copy=False)
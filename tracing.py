@@ -0,0 +1,265 @@
+"""Per-stage timings and counters for the chatbot hot path.
+
+Tracing is off unless ``CHATBOT_TRACE=1``. When it is off, :func:`traced`
+returns the function unchanged and :func:`span` returns a shared no-op
+context manager, so instrumented code pays one attribute lookup at most.
+
+When it is on, every stage keeps a count, a sum, a max and a latency
+histogram; stages recorded while a :func:`request` is active are also
+collected into a per-request breakdown (logged, and the last few kept for
+the admin panel). :func:`render_prometheus` returns everything in the
+Prometheus text format; with ``CHATBOT_TRACE_FILE`` set the same text is
+dumped to that file every ``CHATBOT_TRACE_DUMP_INTERVAL`` seconds.
+"""
+import atexit
+import bisect
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("CHATBOT_TRACE", "").lower() in ("1", "true", "yes", "on")
+TRACE_FILE = os.environ.get("CHATBOT_TRACE_FILE")
+DUMP_INTERVAL = float(os.environ.get("CHATBOT_TRACE_DUMP_INTERVAL", 15))
+# Batas atas bucket histogram (detik)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Jumlah rincian request terakhir yang disimpan untuk panel admin
+RECENT_REQUESTS = 50
+
+_stages = {}
+_counters = {}
+_recent = deque(maxlen=RECENT_REQUESTS)
+_lock = threading.Lock()
+_dump_timer = None
+# Daftar (tahap, detik) milik request yang sedang berjalan di thread/task ini
+_current = contextvars.ContextVar("tracing_request", default=None)
+
+
+class _Stage:
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def quantile(self, q):
+        # Perkiraan dari histogram: batas atas bucket tempat kuantil jatuh
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+def record(stage, seconds):
+    """Add one observation of ``stage``; normally called through :func:`span`."""
+    if not ENABLED:
+        return
+    with _lock:
+        entry = _stages.get(stage)
+        if entry is None:
+            entry = _stages[stage] = _Stage()
+        entry.count += 1
+        entry.total += seconds
+        entry.max = max(entry.max, seconds)
+        entry.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+    breakdown = _current.get()
+    if breakdown is not None:
+        breakdown.append((stage, seconds))
+    _schedule_dump()
+
+
+def incr(counter, n=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[counter] = _counters.get(counter, 0) + n
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class _Request(_Span):
+    __slots__ = ("token",)
+
+    def __enter__(self):
+        self.token = _current.set([])
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        stages = _current.get()
+        _current.reset(self.token)
+        record(self.stage, elapsed)
+        entry = {
+            "request": self.stage,
+            "time": time.strftime("%H:%M:%S"),
+            "total_ms": round(elapsed * 1000, 3),
+            "stages": [(stage, round(seconds * 1000, 3)) for stage, seconds in stages],
+        }
+        with _lock:
+            _recent.append(entry)
+        logger.debug(f"{self.stage} {entry['total_ms']} ms: "
+                     + ", ".join(f"{stage} {ms} ms" for stage, ms in entry["stages"]))
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage):
+    """Context manager timing ``stage``; a shared no-op when tracing is off."""
+    return _Span(stage) if ENABLED else _NULL_SPAN
+
+
+def request(name):
+    """Like :func:`span`, and also collects the stages run inside it."""
+    return _Request(name) if ENABLED else _NULL_SPAN
+
+
+def traced(stage=None, is_request=False):
+    """Decorator timing every call; returns ``func`` itself when tracing is off."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+        name = stage or func.__qualname__
+        make_span = _Request if is_request else _Span
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with make_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# -- laporan -----------------------------------------------------------------
+
+def stage_stats():
+    """One dict per stage, slowest total first, for the admin panel."""
+    with _lock:
+        rows = [{
+            "tahap": stage,
+            "jumlah": entry.count,
+            "total_ms": round(entry.total * 1000, 3),
+            "rata2_ms": round(entry.total / entry.count * 1000, 3),
+            "p95_ms": round(entry.quantile(0.95) * 1000, 3),
+            "maks_ms": round(entry.max * 1000, 3),
+        } for stage, entry in _stages.items()]
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+
+def recent_requests():
+    # Terbaru lebih dulu
+    with _lock:
+        return list(reversed(_recent))
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _recent.clear()
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus():
+    lines = [
+        "# HELP chatbot_stage_duration_seconds Durasi tiap tahap pemrosesan.",
+        "# TYPE chatbot_stage_duration_seconds histogram",
+    ]
+    with _lock:
+        for stage, entry in sorted(_stages.items()):
+            label = _label(stage)
+            cumulative = 0
+            for bound, n in zip(BUCKETS, entry.buckets):
+                cumulative += n
+                lines.append(f'chatbot_stage_duration_seconds_bucket{{stage="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'chatbot_stage_duration_seconds_bucket{{stage="{label}",le="+Inf"}} {entry.count}')
+            lines.append(f'chatbot_stage_duration_seconds_sum{{stage="{label}"}} {entry.total:.6f}')
+            lines.append(f'chatbot_stage_duration_seconds_count{{stage="{label}"}} {entry.count}')
+        lines.append("# HELP chatbot_events_total Penghitung kejadian.")
+        lines.append("# TYPE chatbot_events_total counter")
+        for counter, value in sorted(_counters.items()):
+            lines.append(f'chatbot_events_total{{event="{_label(counter)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def dump(path=None):
+    """Write :func:`render_prometheus` to ``path`` (default ``CHATBOT_TRACE_FILE``) atomically."""
+    path = path or TRACE_FILE
+    if not path:
+        return
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def _dump_in_background():
+    global _dump_timer
+    with _lock:
+        _dump_timer = None
+    try:
+        dump()
+    except OSError as e:
+        logger.warning(f"Gagal menulis metrik ke {TRACE_FILE}: {e}")
+
+
+def _schedule_dump():
+    global _dump_timer
+    if not TRACE_FILE or _dump_timer is not None:
+        return
+    with _lock:
+        if _dump_timer is None:
+            _dump_timer = threading.Timer(DUMP_INTERVAL, _dump_in_background)
+            _dump_timer.daemon = True
+            _dump_timer.start()
+
+
+@atexit.register
+def _dump_at_exit():
+    if ENABLED and TRACE_FILE:
+        try:
+            dump()
+        except OSError:
+            pass
@@ -0,0 +1,187 @@
+import csv
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+
+import bcrypt
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Gagal login sebanyak MAX_FAILURES dalam FAILURE_WINDOW detik -> dikunci LOCKOUT_SECONDS
+MAX_FAILURES = 5
+FAILURE_WINDOW = 300
+LOCKOUT_SECONDS = 300
+# Login yang berhasil diingat sebentar agar bcrypt tidak dihitung ulang
+VERIFIED_TTL = 300
+BCRYPT_WORKERS = min(4, os.cpu_count() or 1)
+USER_COLUMNS = ["username", "password", "role"]
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+# bcrypt melepas GIL dan berjalan langsung di thread sesi; semaphore ini membatasi
+# berapa hash yang dihitung bersamaan agar serbuan login tidak memakan semua CPU
+_hashing = threading.BoundedSemaphore(BCRYPT_WORKERS)
+# Kunci acak per proses untuk cache verifikasi; password tidak pernah disimpan
+_cache_key = secrets.token_bytes(32)
+# Hash pengganti untuk username yang tidak ada, dibuat saat pertama dibutuhkan
+_dummy_hash = None
+_dummy_lock = threading.Lock()
+
+
+def normalize_hash(stored):
+    """Return a bcrypt hash as bytes, whatever form users.csv stored it in.
+
+    ``hash_password`` used to return bytes, which ``to_csv`` wrote as the
+    literal ``b'$2b$...'``; newer rows hold the plain ``$2b$...`` string.
+    """
+    if isinstance(stored, bytes):
+        return stored
+    stored = str(stored).strip()
+    if len(stored) >= 3 and stored[0] == "b" and stored[1] in "'\"" and stored[-1] == stored[1]:
+        stored = stored[2:-1]
+    return stored.encode()
+
+
+def dummy_hash():
+    # Username tak dikenal tetap menjalani bcrypt dengan biaya yang sama, agar waktu
+    # respons tidak membocorkan username mana yang terdaftar
+    global _dummy_hash
+    if _dummy_hash is None:
+        with _dummy_lock:
+            if _dummy_hash is None:
+                _dummy_hash = bcrypt.hashpw(secrets.token_bytes(16), bcrypt.gensalt())
+    return _dummy_hash
+
+
+class UserStore:
+    """users.csv held as a dict keyed by username, reloaded when the file changes.
+
+    Writes go through :meth:`add` and :meth:`set_password`, which evict the user's cached verification themselves instead of
+    relying on the file signature changing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.table = storage.CsvTable(path, USER_COLUMNS)
+        self._users = {}
+        self._signature = None
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._locked_until = {}
+        self._verified = {}
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if signature == self._signature:
+            return
+        users = {}
+        if signature is not None:
+            with open(self.path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    username = row.get("username")
+                    if username and row.get("password"):
+                        users[username] = (normalize_hash(row["password"]), row.get("role") or None)
+        self._users, self._signature = users, signature
+        self._verified.clear()
+        logger.info(f"Data pengguna dimuat ulang ({len(users)} pengguna).")
+
+    def get(self, username):
+        with self._lock:
+            self._refresh()
+            return self._users.get(username)
+
+    def __contains__(self, username):
+        return self.get(username) is not None
+
+    def _evict(self, username):
+        with self._lock:
+            self._verified.pop(username, None)
+
+    def add(self, username, hashed, role="user"):
+        """Append a user; False when the username is taken."""
+        if username in self:
+            return False
+        self.table.insert({"username": username, "password": hashed, "role": role})
+        self._evict(username)
+        return True
+
+    def set_password(self, username, hashed):
+        """Store a new bcrypt hash; False when the user does not exist."""
+        try:
+            updated = self.table.update("username", username, {"password": hashed})
+        finally:
+            self._evict(username)
+        return updated > 0
+
+    def is_locked(self, username):
+        with self._lock:
+            return self._locked_until.get(username, 0) > time.monotonic()
+
+    def _record_failure(self, username):
+        with self._lock:
+            now = time.monotonic()
+            failures = [t for t in self._failures.get(username, []) if now - t < FAILURE_WINDOW]
+            failures.append(now)
+            if len(failures) >= MAX_FAILURES:
+                self._locked_until[username] = now + LOCKOUT_SECONDS
+                failures = []
+                logger.warning(f"Login untuk {username} dikunci sementara setelah {MAX_FAILURES} kegagalan.")
+            self._failures[username] = failures
+
+    def _cache_token(self, username, password, hashed):
+        return hmac.new(_cache_key, b"\0".join([username.encode(), password.encode(), hashed]),
+                        hashlib.sha256).digest()
+
+    def verify(self, username, password):
+        """Return the user's role when the password matches, otherwise None.
+
+        Unknown usernames go through the same lockout and a bcrypt check
+        against a dummy hash, so they are throttled like wrong passwords and
+        cannot be told apart by timing.
+        """
+        if self.is_locked(username):
+            return None
+        user = self.get(username)
+        if user is None:
+            with _hashing:
+                bcrypt.checkpw(password.encode(), dummy_hash())
+            self._record_failure(username)
+            return None
+        hashed, role = user
+        token = self._cache_token(username, password, hashed)
+        with self._lock:
+            cached = self._verified.get(username)
+            if cached and hmac.compare_digest(cached[0], token) and cached[1] > time.monotonic():
+                return role
+        try:
+            with _hashing:
+                ok = bcrypt.checkpw(password.encode(), hashed)
+        except ValueError as e:
+            logger.error(f"Hash password {username} tidak valid: {e}")
+            ok = False
+        if not ok:
+            self._record_failure(username)
+            return None
+        with self._lock:
+            self._failures.pop(username, None)
+            self._verified[username] = (token, time.monotonic() + VERIFIED_TTL)
+        return role
+
+
+def open_store(path):
+    """Return the process-wide UserStore for ``path``."""
+    with _STORES_LOCK:
+        store = _STORES.get(path)
+        if store is None:
+            store = _STORES[path] = UserStore(path)
+        return store